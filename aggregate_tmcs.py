@@ -0,0 +1,203 @@
+# aggregate_tmcs.py - compute the per-TMC output records of process_csv_file.py for all TMCs at once
+#
+# process_csv_file.process_one_tmc_id processes the intermediate records of one TMC at a time: it sorts them,
+# then makes several filtering and summing passes over them to compute the TMC's total length,
+# length-weighted speed limit and number of lanes, and list of towns. This module computes the same
+# values for every TMC in a single set of NumPy array operations: the records are sorted by TMC and
+# from_meas once, and the per-TMC sums are computed with np.bincount over the TMC "group" numbers.
+#
+# The results are identical to those of process_one_tmc_id, including in the last bit of each floating-point value:
+#     1. Within each TMC, records are ordered by from_meas, ties being broken by input order (a stable sort).
+#     2. np.bincount accumulates its weights sequentially, in input order, starting from 0.0, as do
+#        pydash.collections.reduce_ and the Python loops in process_one_tmc_id.
+#     3. The partial speed limit (and number of lanes) of each record is computed as value * (calc_len / total_length),
+#        in that order, as in process_one_tmc_id.
+#     4. The final rounding (to a multiple of 5 MPH, or up to an integer) is performed by the same Python expressions.
+#     5. Records with speed_lim of 0 or 99, and records with num_lanes of 0, are excluded; a TMC with no usable
+#        records for either attribute gets a value of -1 for that attribute, and is added to the list of problem
+#        TMCs (once for each such attribute, speed limit first), in the order in which the TMCs are processed.
+#
+# 10/18/2026
+
+import math
+
+import numpy as np
+
+import ma_towns
+
+# Values of speed_lim that don't indicate a speed limit: 0 - no speed limit event; 99 - MassDOT's "no value"
+unusable_speed_limits = [0, 99]
+
+# Fields of the intermediate records used in the aggregation
+aggregation_fields = ['tmc', 'tmctype', 'route_id', 'roadnum', 'direction', 'firstnm',
+                      'from_meas', 'to_meas', 'calc_len', 'speed_lim', 'num_lanes', 'town_id']
+
+# records_to_columns: Convert a list of intermediate records (dicts) into a dict of NumPy arrays
+#
+# Parameter: records - list of dicts, e.g., as returned by process_csv_file.load_csv
+# Return value: dict of NumPy arrays, one for each of the aggregation_fields
+#
+def records_to_columns(records):
+    retval = {}
+    for name in ['tmc', 'tmctype', 'route_id', 'roadnum', 'direction', 'firstnm']:
+        retval[name] = np.array([rec[name] for rec in records], dtype=object)
+    # for
+    for name in ['from_meas', 'to_meas', 'calc_len']:
+        retval[name] = np.array([rec[name] for rec in records], dtype=np.float64)
+    # for
+    for name in ['speed_lim', 'num_lanes', 'town_id']:
+        retval[name] = np.array([rec[name] for rec in records], dtype=np.int64)
+    # for
+    return retval
+# def records_to_columns()
+
+# group_numbers: Number the TMCs in order of their first appearance
+#
+# Parameter: tmc - array of TMC IDs, one per record
+# Return value: tuple of (group number of each record, list of TMC IDs in group-number order)
+#
+def group_numbers(tmc):
+    index = {}
+    group = np.empty(len(tmc), dtype=np.int64)
+    tmc_ids = []
+    for i, tmc_id in enumerate(tmc.tolist()):
+        g = index.get(tmc_id)
+        if g is None:
+            g = len(tmc_ids)
+            index[tmc_id] = g
+            tmc_ids.append(tmc_id)
+        # end_if
+        group[i] = g
+    # for
+    return group, tmc_ids
+# def group_numbers()
+
+# _weighted_attribute: Compute the length-weighted value of an attribute for every TMC
+#
+# Parameters: group - sorted array of group numbers, one per record
+#             values - array of attribute values, one per record, in the same order
+#             calc_len - array of record lengths, in the same order
+#             usable - boolean array indicating which records have a usable value
+#             num_groups - number of groups (TMCs)
+# Return value: tuple of (array of weighted values, one per TMC; boolean array indicating which TMCs have any usable record)
+#
+def _weighted_attribute(group, values, calc_len, usable, num_groups):
+    g = group[usable]
+    lens = calc_len[usable]
+    total = np.bincount(g, weights=lens, minlength=num_groups)
+    has_usable = np.bincount(g, minlength=num_groups) > 0
+    if np.any(has_usable & (total == 0.0)):
+        # process_one_tmc_id would divide by zero here, too
+        raise ZeroDivisionError('float division by zero')
+    # end_if
+    partial = values[usable].astype(np.float64) * (lens / total[g])
+    return np.bincount(g, weights=partial, minlength=num_groups), has_usable
+# def _weighted_attribute()
+
+# iter_aggregate_by_tmc: Generate the output record for every TMC, one at a time
+#
+# Parameters: cols - dict of NumPy arrays containing (at least) the aggregation_fields, one entry per intermediate record,
+#                    e.g., as returned by records_to_columns or columnar_events.load_columnar
+#             report - OPTIONAL function used to report TMCs without usable attribute values
+#             problem_tmcs - OPTIONAL list to which the problem TMCs are appended, before the first record is generated
+#             by_from_meas - OPTIONAL; if True, the records are generated in ascending order of from_meas (ties being
+#                            broken by order of first appearance, as by a stable sort), rather than in order of each
+#                            TMC's first appearance in the input
+# Return value: generator of output records (dicts), one per TMC
+#
+# The per-TMC values are computed for all TMCs at once, as arrays; only the output record (dict) of the TMC being
+# generated is built at any time.
+#
+def iter_aggregate_by_tmc(cols, report=None, problem_tmcs=None, by_from_meas=False):
+    num_recs = len(cols['tmc'])
+    if num_recs == 0:
+        return
+    # end_if
+    group, tmc_ids = group_numbers(cols['tmc'])
+    num_groups = len(tmc_ids)
+
+    # Sort by group, then by from_meas, then by input order
+    order = np.argsort(cols['from_meas'], kind='mergesort')
+    order = order[np.argsort(group[order], kind='mergesort')]
+    group = group[order]
+    from_meas = np.asarray(cols['from_meas'], dtype=np.float64)[order]
+    to_meas = np.asarray(cols['to_meas'], dtype=np.float64)[order]
+    calc_len = np.asarray(cols['calc_len'], dtype=np.float64)[order]
+    speed_lim = np.asarray(cols['speed_lim'])[order]
+    num_lanes = np.asarray(cols['num_lanes'])[order]
+    town_id = np.asarray(cols['town_id'])[order]
+
+    # First and last record of each group
+    counts = np.bincount(group, minlength=num_groups)
+    last = np.cumsum(counts) - 1
+    first = last - counts + 1
+
+    total_length = np.bincount(group, weights=calc_len, minlength=num_groups)
+    sl_usable = np.ones(num_recs, dtype=bool)
+    for value in unusable_speed_limits:
+        sl_usable &= (speed_lim != value)
+    # for
+    speed_limit, has_sl = _weighted_attribute(group, speed_lim, calc_len, sl_usable, num_groups)
+    lanes, has_nl = _weighted_attribute(group, num_lanes, calc_len, num_lanes != 0, num_groups)
+
+    # Set of towns of each group, as a bitset (see ma_towns.town_set_bits)
+    town_bits = [0] * num_groups
+    for g, t in zip(group.tolist(), town_id.tolist()):
+        town_bits[g] |= 1 << t
+    # for
+
+    first_recs = {}
+    for name in ['tmc', 'tmctype', 'route_id', 'roadnum', 'direction', 'firstnm']:
+        first_recs[name] = np.asarray(cols[name])[order][first].tolist()
+    # for
+    overall_from = from_meas[first].tolist()
+    overall_to = to_meas[last].tolist()
+    total_length = total_length.tolist()
+    speed_limit = speed_limit.tolist()
+    lanes = lanes.tolist()
+    has_sl = has_sl.tolist()
+    has_nl = has_nl.tolist()
+
+    # Problem TMCs are reported in the order in which the TMCs are processed, regardless of the order of the output
+    for g in range(num_groups):
+        for has_value, what in [(has_sl[g], 'speed limit'), (has_nl[g], 'number of lanes')]:
+            if not has_value:
+                if report:
+                    report("    No usable " + what + " records for TMC " + first_recs['tmc'][g])
+                # end_if
+                if problem_tmcs is not None:
+                    problem_tmcs.append(first_recs['tmc'][g])
+                # end_if
+            # end_if
+        # for
+    # for
+
+    round_to_multiple_of_5 = lambda x: 5 * round(x/5)
+    groups = np.argsort(np.asarray(overall_from), kind='mergesort').tolist() if by_from_meas else range(num_groups)
+    for g in groups:
+        rec = {}
+        for name in ['tmc', 'tmctype', 'route_id', 'roadnum', 'direction', 'firstnm']:
+            rec[name] = first_recs[name][g]
+        # for
+        rec['from_meas'] = overall_from[g]
+        rec['to_meas'] = overall_to[g]
+        rec['length'] = total_length[g]
+        rec['speed_limit'] = round_to_multiple_of_5(speed_limit[g]) if has_sl[g] else -1
+        rec['num_lanes'] = math.ceil(lanes[g]) if has_nl[g] else -1
+        rec['towns'] = ma_towns.town_bits_string(town_bits[g])
+        yield rec
+    # for
+# def iter_aggregate_by_tmc()
+
+# aggregate_by_tmc: Compute the output record for every TMC
+#
+# Parameters: cols - dict of NumPy arrays containing (at least) the aggregation_fields, one entry per intermediate record
+#             report - OPTIONAL function used to report TMCs without usable attribute values
+# Return value: tuple of (list of output records (dicts), one per TMC, in order of each TMC's first appearance in the input;
+#                         list of problem TMCs)
+#
+def aggregate_by_tmc(cols, report=None):
+    problem_tmcs = []
+    retval = list(iter_aggregate_by_tmc(cols, report, problem_tmcs))
+    return retval, problem_tmcs
+# def aggregate_by_tmc()
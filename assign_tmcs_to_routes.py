@@ -0,0 +1,299 @@
+# assign_tmcs_to_routes.py - assign INRIX TMCs to MassDOT routes automatically, writing a TMC list file for each route
+#
+# The INRIX roadnum and direction of a TMC don't always agree with the MassDOT route_id of the route it lies along,
+# particularly where routes are coincident (see README.md, and the I-291 HACK in get_inrix_attrs), so each route has
+# been conflated with a hand-curated TMC list file. This script produces those files in one pass:
+#     1. Every INRIX TMC is matched against the segments of all the candidate routes at once, using a single spatial
+#        index over them (segment_index.build_network_index): a route is a candidate for a TMC if either endpoint of the
+#        TMC lies within the search radius of one of its segments.
+#     2. Each (TMC, candidate route) pair is scored, by projecting both endpoints of the TMC onto the route
+#        (tmc_locator.project_points), on:
+#            - endpoint distance - the mean distance of the endpoints from the route; an endpoint lying beyond an end of
+#                                  the route (e.g., of a TMC that begins before the route does) is not counted, unless
+#                                  both are,
+#            - heading agreement - the cosine of the angle between the TMC (from its first point to its last) and the
+#                                  direction of increasing measure of the route where the endpoints are projected, and
+#            - measure monotonicity - the TMC's to_meas must be greater than its from_meas, as for any TMC event.
+#        The score is exp(-distance / distance scale) * max(heading cosine, 0), or 0 if the measures aren't monotonic.
+#     3. A TMC is assigned to every route on which it scores at least the minimum score (a TMC can lie along several
+#        coincident routes), and each route's TMC list file lists its TMCs in order of from_meas.
+#     4. All the scored pairs are written to a CSV file, with ambiguity flags for review:
+#            low_confidence   - assigned, but with a score less than the confident score
+#            near_threshold   - not assigned, but with a score within the margin of the minimum score
+#            shared           - the TMC is assigned to more than one route (expected where routes are coincident)
+#            roadnum_mismatch - assigned, but the TMC's INRIX roadnum and direction are not those of the route
+#                               (see get_inrix_attrs); only checked for Interstate, US, and state routes
+#
+# Usage: python assign_tmcs_to_routes.py [--route-list-file <file>] [--tmc-fc <TMC FC>] [--out-dir <dir>]
+#                                        [--scores-file <file>] [--search-radius <meters>] [--distance-scale <meters>]
+#                                        [--min-score <score>] [--confident-score <score>] [--margin <score>]
+#     --route-list-file - file listing the routes to which TMCs are assigned, one route_id per line
+#                         (default: the express highway routes in expressway_routes.py)
+#     --tmc-fc          - INRIX TMC FC (default: INRIX_MASSACHUSETTS_TMC_2019)
+#     --out-dir         - directory in which the TMC list files are written, named as batch_conflate_routes.py expects
+#                         (e.g., i_90_eb_tmcs.txt), so that it can be passed as --tmc-list-dir
+#                         (default: TMC_lists_auto in the base directory); no file is written for a route with no TMCs
+#     --scores-file     - CSV file in which the scored pairs are written (default: tmc_route_scores.csv in the out dir)
+#
+# 10/18/2026
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+import batch_conflate_routes
+import expressway_routes
+import generate_tmc_events_for_expressways as driver
+import process_csv_file
+import route_store
+import segment_index
+import stage_cache
+import statewide_session
+import tmc_locator
+
+# Default matching parameters: distances are in meters, scores in [0, 1]
+default_search_radius = 150.0
+default_distance_scale = 50.0
+default_min_score = 0.5
+default_confident_score = 0.8
+default_margin = 0.1
+
+# Names of the fields of the scores file
+score_fieldnames = ['tmc', 'roadnum', 'direction', 'route_id', 'from_meas', 'to_meas', 'from_dist', 'to_dist',
+                    'heading_cos', 'monotonic', 'score', 'assigned', 'best', 'flags']
+
+# candidate_pairs: Find the candidate routes of each TMC
+#
+# Parameters: routes - dict mapping route_id to dict of route segment arrays (see tmc_locator.route_segments)
+#             tmcs - list of TMC records (see statewide_session.read_tmcs)
+#             search_radius - distance within which an endpoint of a TMC must lie of a route for it to be a candidate
+# Return value: tuple of (list of route_ids, array of TMC indices, array of route indices in the list of route_ids),
+#               with one entry per (TMC, candidate route) pair, sorted on route and TMC
+#
+def candidate_pairs(routes, tmcs, search_radius):
+    index = segment_index.build_network_index(routes)
+    n = len(tmcs)
+    px = np.array([t['from_x'] for t in tmcs] + [t['to_x'] for t in tmcs], dtype=np.float64)
+    py = np.array([t['from_y'] for t in tmcs] + [t['to_y'] for t in tmcs], dtype=np.float64)
+    pt, seg, dist = segment_index.segments_within(index, px, py, search_radius)
+    keys = np.unique(index['seg_route'][seg] * n + pt % n)
+    return index['route_ids'], keys % n, keys // n
+# def candidate_pairs()
+
+# score_route_candidates: Score a batch of TMCs against one route
+#
+# Parameters: segs - dict of route segment arrays
+#             from_x, from_y, to_x, to_y - arrays of the coordinates of the first and last points of the TMCs
+#             distance_scale - distance at which the distance factor of the score falls to 1/e
+# Return value: dict of arrays, with one entry per TMC: from_meas, to_meas, from_dist, to_dist, heading_cos, monotonic, score
+#
+def score_route_candidates(segs, from_x, from_y, to_x, to_y, distance_scale):
+    n = len(from_x)
+    meas, dist, seg_ix = tmc_locator.project_points(segs, np.concatenate([from_x, to_x]), np.concatenate([from_y, to_y]))
+    # Projections onto either end of the route
+    first_m = min(float(segs['m0'][0]), float(segs['m1'][0])); last_m = segs['last_m']
+    at_end = (meas <= first_m) | (meas >= last_m)
+    from_meas = meas[:n]; to_meas = meas[n:]
+    from_dist = dist[:n]; to_dist = dist[n:]
+    counted = ~at_end
+    both_ends = ~(counted[:n] | counted[n:])
+    counted[:n] |= both_ends; counted[n:] |= both_ends
+    mean_dist = (np.where(counted[:n], from_dist, 0.0) + np.where(counted[n:], to_dist, 0.0)) / \
+                (counted[:n].astype(np.float64) + counted[n:].astype(np.float64))
+
+    # Direction of increasing measure of the route at each projected endpoint, and of the TMC
+    sx = segs['x1'][seg_ix] - segs['x0'][seg_ix]; sy = segs['y1'][seg_ix] - segs['y0'][seg_ix]
+    sign = np.where(segs['m1'][seg_ix] < segs['m0'][seg_ix], -1.0, 1.0)
+    slen = np.hypot(sx, sy)
+    ux = np.where(slen > 0.0, sign * sx / np.where(slen > 0.0, slen, 1.0), 0.0)
+    uy = np.where(slen > 0.0, sign * sy / np.where(slen > 0.0, slen, 1.0), 0.0)
+    rx = ux[:n] + ux[n:]; ry = uy[:n] + uy[n:]
+    rlen = np.hypot(rx, ry)
+    tx = np.asarray(to_x, dtype=np.float64) - from_x; ty = np.asarray(to_y, dtype=np.float64) - from_y
+    tlen = np.hypot(tx, ty)
+    ok = (rlen > 0.0) & (tlen > 0.0)
+    heading_cos = np.where(ok, (rx * tx + ry * ty) / np.where(ok, rlen * tlen, 1.0), 0.0)
+
+    monotonic = to_meas > from_meas
+    score = np.where(monotonic, np.exp(-mean_dist / distance_scale) * np.maximum(heading_cos, 0.0), 0.0)
+    return { 'from_meas' : from_meas, 'to_meas' : to_meas, 'from_dist' : from_dist, 'to_dist' : to_dist,
+             'heading_cos' : heading_cos, 'monotonic' : monotonic, 'score' : score }
+# def score_route_candidates()
+
+# score_tmcs: Score every TMC against each of its candidate routes
+#
+# Parameters: routes - dict mapping route_id to dict of route segment arrays
+#             tmcs - list of TMC records
+#             search_radius - see candidate_pairs
+#             distance_scale - see score_route_candidates
+# Return value: list of dicts, one per (TMC, candidate route) pair, with the score_fieldnames up to and including score,
+#               and 'tmc_ix', the index of the TMC in tmcs
+#
+def score_tmcs(routes, tmcs, search_radius, distance_scale):
+    retval = []
+    if len(routes) == 0 or len(tmcs) == 0:
+        return retval
+    # end_if
+    route_ids, tmc_ix, route_ix = candidate_pairs(routes, tmcs, search_radius)
+    for r in np.unique(route_ix).tolist():
+        ixs = tmc_ix[route_ix == r]
+        sel = [tmcs[i] for i in ixs.tolist()]
+        scores = score_route_candidates(routes[route_ids[r]], np.array([t['from_x'] for t in sel], dtype=np.float64),
+                                        np.array([t['from_y'] for t in sel], dtype=np.float64),
+                                        np.array([t['to_x'] for t in sel], dtype=np.float64),
+                                        np.array([t['to_y'] for t in sel], dtype=np.float64), distance_scale)
+        for k, i in enumerate(ixs.tolist()):
+            attrs = tmcs[i]['attrs']
+            rec = { 'tmc_ix' : i, 'tmc' : attrs[0], 'roadnum' : attrs[2], 'direction' : attrs[4], 'route_id' : route_ids[r] }
+            for name in ['from_meas', 'to_meas', 'from_dist', 'to_dist', 'heading_cos', 'score']:
+                rec[name] = float(scores[name][k])
+            # for
+            rec['monotonic'] = int(scores['monotonic'][k])
+            retval.append(rec)
+        # for
+    # for
+    return retval
+# def score_tmcs()
+
+# assign_tmcs: Assign TMCs to routes from their scores, and flag the ambiguous pairs
+#
+# Parameters: candidates - list of scored pairs, as returned by score_tmcs; 'assigned', 'best', and 'flags' are set in each
+#             min_score - minimum score for a TMC to be assigned to a route
+#             confident_score - minimum score of an assigned pair not flagged low_confidence
+#             margin - width of the band below min_score in which an unassigned pair is flagged near_threshold
+#             expected_roads - OPTIONAL dict mapping route_id to the (roadnum, direction) of its TMCs in INRIX;
+#                              routes not in it aren't checked for roadnum_mismatch
+# Return value: dict mapping route_id to the list of the TMC IDs assigned to it, in order of from_meas
+#
+def assign_tmcs(candidates, min_score, confident_score, margin, expected_roads=None):
+    routes_of_tmc = {}
+    best_of_tmc = {}
+    for rec in candidates:
+        rec['assigned'] = int(rec['score'] >= min_score)
+        if rec['assigned']:
+            routes_of_tmc.setdefault(rec['tmc'], []).append(rec['route_id'])
+        # end_if
+        if rec['score'] > 0.0 and (rec['tmc'] not in best_of_tmc or rec['score'] > best_of_tmc[rec['tmc']]['score']):
+            best_of_tmc[rec['tmc']] = rec
+        # end_if
+    # for
+    retval = {}
+    for rec in candidates:
+        rec['best'] = int(best_of_tmc.get(rec['tmc']) is rec)
+        flags = []
+        if rec['assigned']:
+            if rec['score'] < confident_score:
+                flags.append('low_confidence')
+            # end_if
+            if len(routes_of_tmc[rec['tmc']]) > 1:
+                flags.append('shared')
+            # end_if
+            expected = (expected_roads or {}).get(rec['route_id'])
+            if expected is not None and (rec['roadnum'], rec['direction']) != expected:
+                flags.append('roadnum_mismatch')
+            # end_if
+            retval.setdefault(rec['route_id'], []).append((rec['from_meas'], rec['tmc']))
+        elif rec['score'] >= min_score - margin:
+            flags.append('near_threshold')
+        # end_if
+        rec['flags'] = ';'.join(flags)
+    # for
+    for route_id in retval:
+        retval[route_id] = [tmc_id for from_meas, tmc_id in sorted(retval[route_id])]
+    # for
+    return retval
+# def assign_tmcs()
+
+# write_tmc_list_file: Write a TMC list file, a comma-separated list of quoted TMC IDs, one per line
+#                      (as used in an SQL "IN" clause by conflate_route; see also statewide_session.select_tmcs)
+#
+def write_tmc_list_file(tmc_list_file, tmc_ids):
+    with open(tmc_list_file, 'w') as f:
+        f.write(',\n'.join(["'" + tmc_id + "'" for tmc_id in tmc_ids]) + '\n')
+    # with
+# def write_tmc_list_file()
+
+# write_scores_file: Write the scored (TMC, route) pairs to a CSV file, ordered by TMC ID and descending score
+#
+def write_scores_file(candidates, scores_file):
+    with process_csv_file.open_csv_for_writing(scores_file) as f:
+        w = csv.DictWriter(f, fieldnames=score_fieldnames, extrasaction='ignore')
+        w.writeheader()
+        w.writerows(sorted(candidates, key=lambda rec : (rec['tmc'], -rec['score'], rec['route_id'])))
+    # with
+# def write_scores_file()
+
+# expected_inrix_roads: Return the INRIX (roadnum, direction) of each route for which get_inrix_attrs can derive them
+#
+def expected_inrix_roads(route_ids):
+    retval = {}
+    for route_id in route_ids:
+        pieces = route_id.split(' ')
+        if len(pieces) == 2 and pieces[1] in ['NB', 'SB', 'EB', 'WB'] and \
+           (pieces[0].startswith('I') or pieces[0].startswith('US') or pieces[0].startswith('SR')):
+            attrs = driver.get_inrix_attrs(route_id)
+            retval[route_id] = (attrs['roadnum'], attrs['direction'])
+        # end_if
+    # for
+    return retval
+# def expected_inrix_roads()
+
+def main():
+    parser = argparse.ArgumentParser(description='Assign INRIX TMCs to MassDOT routes, writing a TMC list file for each route.')
+    parser.add_argument('--route-list-file', default='')
+    parser.add_argument('--tmc-fc', default=driver.INRIX_MASSACHUSETTS_TMC_2019)
+    parser.add_argument('--out-dir', default=os.path.join(driver.base_dir, 'TMC_lists_auto'))
+    parser.add_argument('--scores-file', default='')
+    parser.add_argument('--search-radius', type=float, default=default_search_radius)
+    parser.add_argument('--distance-scale', type=float, default=default_distance_scale)
+    parser.add_argument('--min-score', type=float, default=default_min_score)
+    parser.add_argument('--confident-score', type=float, default=default_confident_score)
+    parser.add_argument('--margin', type=float, default=default_margin)
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.route_list_file:
+        route_ids = expressway_routes.read_route_list_file(args.route_list_file)
+    else:
+        route_ids = expressway_routes.expressway_route_ids
+    # end_if
+    routes = route_store.load_route_segments(driver.route_store_dir,
+                                             stage_cache.source_stamp(driver.MASSDOT_LRSN_Routes_19Dec2019), route_ids) or {}
+    routes.update(statewide_session.read_routes([route_id for route_id in route_ids if route_id not in routes]))
+    for route_id in route_ids:
+        if route_id not in routes:
+            print('    Route ' + route_id + ' not found in LRSN routes.')
+        # end_if
+    # for
+    print('Reading TMCs from: ' + args.tmc_fc)
+    tmcs = statewide_session.read_tmcs(args.tmc_fc)
+
+    candidates = score_tmcs(routes, tmcs, args.search_radius, args.distance_scale)
+    assigned = assign_tmcs(candidates, args.min_score, args.confident_score, args.margin,
+                           expected_inrix_roads(list(routes.keys())))
+    if not os.path.isdir(args.out_dir):
+        os.makedirs(args.out_dir)
+    # end_if
+    for route_id in route_ids:
+        tmc_ids = assigned.get(route_id, [])
+        if len(tmc_ids) > 0:
+            write_tmc_list_file(os.path.join(args.out_dir, batch_conflate_routes.tmc_list_file_name(route_id)), tmc_ids)
+        # end_if
+        flagged = len([rec for rec in candidates if rec['route_id'] == route_id and rec['flags']])
+        print('    ' + route_id + ': ' + str(len(tmc_ids)) + ' TMCs, ' + str(flagged) + ' flagged pairs')
+    # for
+    scores_file = args.scores_file or os.path.join(args.out_dir, 'tmc_route_scores.csv')
+    write_scores_file(candidates, scores_file)
+    num_assigned = len(set([rec['tmc'] for rec in candidates if rec['assigned']]))
+    print('Assigned ' + str(num_assigned) + ' of ' + str(len(tmcs)) + ' TMCs to ' + str(len(assigned)) + ' routes in ' +
+          str(round(time.time() - start, 1)) + ' sec. TMC list files are in: ' + args.out_dir + '; scores are in: ' + scores_file)
+    return 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
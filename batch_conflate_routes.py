@@ -0,0 +1,185 @@
+# batch_conflate_routes.py - conflate INRIX TMCs onto several MassDOT routes concurrently
+#
+# Usage: python batch_conflate_routes.py [--route-list-file <file>] [--tmc-list-dir <dir>]
+#                                        [--processes <N>] [--summary-file <file>] [--force]
+#
+#     --route-list-file - file listing the routes to be processed, one per line. Each line contains either
+#                         a MassDOT route_id, or a route_id and the full path of the file containing its list of TMCs,
+#                         separated by a comma, e.g.:
+#                             I90 EB,\\lilliput\groups\...\i_90_eb_tmcs.txt
+#                         If not specified, the express highway routes in expressway_routes.py are processed.
+#     --tmc-list-dir    - directory containing TMC list files for routes for which none is given in the route list file;
+#                         the name of each file is derived from the route_id, e.g., i_90_eb_tmcs.txt for 'I90 EB'.
+#                         If a route has no TMC list file, its TMCs are selected by INRIX roadnum and direction.
+#     --processes       - number of worker processes (default: number of CPUs)
+#     --summary-file    - CSV file in which the per-route success/failure summary is written
+#                         (default: batch_summary.csv in the base directory)
+#     --force           - re-run every stage for every route, even those whose output is in the stage cache
+#
+# Each route is processed by generate_tmc_events_for_expressways.conflate_route in its own worker process.
+# The event table geodatabases for each route are written to a separate work directory
+# (<base_dir>\batch\<route>), so that concurrent workers never write to the same geodatabase;
+# the intermediate and final CSV files are written to the usual csv_intermediate and csv_final directories.
+# The elapsed time of a full batch is thus bounded by the slowest route rather than the sum over all routes.
+#
+# NOTE: This script must be run from the command line using the ArcGIS Python installation,
+#       not from within ArcMap, since it starts additional Python processes.
+#
+# 10/18/2026
+
+import argparse
+import csv
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+
+import arcpy
+import expressway_routes
+import generate_tmc_events_for_expressways
+import process_csv_file
+
+# tmc_list_file_name: Return the name of the TMC list file for a MassDOT route_id, e.g., 'i_90_eb_tmcs.txt' for 'I90 EB'
+#
+# Parameter: route_id - MassDOT route_id
+# Return value: name (not full path) of TMC list file
+#
+def tmc_list_file_name(route_id):
+    pieces = route_id.split(' ')
+    match = re.match(r'([A-Za-z]+)(.*)', pieces[0])
+    route_part = match.group(1).lower() + '_' + match.group(2) if match else pieces[0].lower()
+    return route_part + '_' + '_'.join(pieces[1:]).lower() + '_tmcs.txt'
+# def tmc_list_file_name()
+
+# get_batch_tasks: Build the list of routes to be processed, paired with their TMC list files
+#
+# Parameters: route_list_file - file containing list of routes (see above), or '' to process the express highway routes
+#             tmc_list_dir - directory containing TMC list files, or ''
+# Return value: list of (route_id, TMC_list_file) tuples; TMC_list_file is '' if there is none for the route
+#
+def get_batch_tasks(route_list_file, tmc_list_dir):
+    pairs = []
+    if route_list_file:
+        for line in expressway_routes.read_route_list_file(route_list_file):
+            pieces = line.split(',', 1)
+            pairs.append((pieces[0].strip(), pieces[1].strip() if len(pieces) > 1 else ''))
+        # for
+    else:
+        pairs = [(route_id, '') for route_id in expressway_routes.expressway_route_ids]
+    # end_if
+    retval = []
+    for route_id, tmc_list_file in pairs:
+        if tmc_list_file == '' and tmc_list_dir:
+            candidate = os.path.join(tmc_list_dir, tmc_list_file_name(route_id))
+            if os.path.exists(candidate):
+                tmc_list_file = candidate
+            # end_if
+        # end_if
+        retval.append((route_id, tmc_list_file))
+    # for
+    return retval
+# def get_batch_tasks()
+
+# new_route_summary: Return the summary of the outcome for a route, before it has been conflated
+#
+# Parameters: route_id - MassDOT route_id
+#             tmc_list_file - full path of the route's TMC list file, or ''
+# Return value: dict summarizing the outcome for the route, with its status initialized to 'failure'
+#
+def new_route_summary(route_id, tmc_list_file):
+    return { 'route_id' : route_id, 'tmc_list_file' : tmc_list_file, 'status' : 'failure',
+             'elapsed_sec' : 0.0, 'output_csv' : '', 'message' : '' }
+# def new_route_summary()
+
+# conflate_one_route: Worker routine - conflate a single route, trapping any failure
+#
+# Parameter: task - (route_id, TMC_list_file, work_dir, force) tuple
+# Return value: dict summarizing the outcome for the route
+#
+def conflate_one_route(task):
+    route_id, tmc_list_file, work_dir, force = task
+    retval = new_route_summary(route_id, tmc_list_file)
+    start = time.time()
+    try:
+        arcpy.env.overwriteOutput = True
+        if not os.path.exists(work_dir):
+            os.makedirs(work_dir)
+        # end_if
+        retval['output_csv'] = generate_tmc_events_for_expressways.conflate_route(route_id, tmc_list_file, work_dir, force)
+        retval['status'] = 'success'
+    except BaseException:
+        # Note: BaseException rather than Exception, since the driver calls exit() for unsupported routes
+        retval['message'] = traceback.format_exc().strip().split('\n')[-1]
+    # try/except
+    retval['elapsed_sec'] = round(time.time() - start, 3)
+    return retval
+# def conflate_one_route()
+
+# run_batch: Conflate a list of routes concurrently, using a pool of worker processes
+#
+# Parameters: tasks - list of (route_id, TMC_list_file) tuples, as returned by get_batch_tasks
+#             batch_dir - directory under which a work directory for each route is created
+#             num_processes - number of worker processes
+#             force - OPTIONAL; True to re-run every stage, even those whose output is cached
+# Return value: list of per-route summary dicts (see conflate_one_route), in the order of tasks
+#
+def run_batch(tasks, batch_dir, num_processes, force=False):
+    worker_tasks = [(route_id, tmc_list_file, os.path.join(batch_dir, route_id.lower().replace(' ', '_')), force)
+                    for route_id, tmc_list_file in tasks]
+    # maxtasksperchild=1: each route gets a fresh process, and hence a fresh arcpy session
+    pool = multiprocessing.Pool(processes=num_processes, maxtasksperchild=1)
+    try:
+        retval = pool.map(conflate_one_route, worker_tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    # try/finally
+    return retval
+# def run_batch()
+
+# write_summary: Write the per-route success/failure summary to a CSV file
+#
+# Parameters: summary - list of per-route summary dicts
+#             summary_file - full path of output CSV file
+# Return value: none
+#
+def write_summary(summary, summary_file):
+    fieldnames = ['route_id', 'status', 'elapsed_sec', 'tmc_list_file', 'output_csv', 'message']
+    with process_csv_file.open_csv_for_writing(summary_file) as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(summary)
+    # with
+# def write_summary()
+
+def main():
+    base_dir = generate_tmc_events_for_expressways.base_dir
+
+    parser = argparse.ArgumentParser(description='Conflate INRIX TMCs onto several MassDOT routes concurrently.')
+    parser.add_argument('--route-list-file', default='')
+    parser.add_argument('--tmc-list-dir', default='')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--summary-file', default=os.path.join(base_dir, 'batch_summary.csv'))
+    parser.add_argument('--force', action='store_true')
+    args = parser.parse_args()
+
+    tasks = get_batch_tasks(args.route_list_file, args.tmc_list_dir)
+    print('Conflating ' + str(len(tasks)) + ' routes using ' + str(args.processes) + ' worker processes.')
+    start = time.time()
+    summary = run_batch(tasks, os.path.join(base_dir, 'batch'), args.processes, args.force)
+    write_summary(summary, args.summary_file)
+
+    failures = [rec for rec in summary if rec['status'] != 'success']
+    for rec in summary:
+        print('    ' + rec['route_id'] + ': ' + rec['status'] + ' (' + str(rec['elapsed_sec']) + ' sec) ' + rec['message'])
+    # for
+    print('Finished in ' + str(round(time.time() - start, 1)) + ' sec: ' + str(len(summary) - len(failures)) + ' succeeded, ' +
+          str(len(failures)) + ' failed. Summary is in: ' + args.summary_file)
+    return 1 if failures else 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
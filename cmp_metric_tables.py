@@ -0,0 +1,224 @@
+# cmp_metric_tables.py - definitions and readers of the tables from which expressway_performance_measures is populated
+#
+# The CMP Express Highway Performance Dashboard is backed by the expressway_performance_measures table, which was built
+# in an MS Access database by the statements in the sql directory:
+#     populate_expressway_performance_measures.sql - INSERT one row per TMC of Inrix_2019_cmp_exp_roadinv_attrib
+#                                                    (the conflated road inventory attributes), with its distance
+#                                                    taken from Inrix_2019_cmp_exp_avg_length
+#     populate_exp_perf_measures_lanes_spd_limit.sql - UPDATE lanes, lane_miles (distance * num_lanes), and spd_limit
+#                                                      from Inrix_2019_cmp_exp_roadinv_attrib
+#     populate_exp_perf_measures_<measure>.sql     - UPDATE one measure column from one INRIX CMP metric table
+# This module describes those tables (metric_tables, below, lists the 15 metric UPDATEs), and reads them from CSV files,
+# so that the table can be built outside of Access (see populate_performance_measures_db.py and join_performance_measures.py).
+#
+# Each table is read from a CSV file named <table name>.csv (e.g., an export of the Access table), in a single directory.
+# Inrix_2019_cmp_exp_roadinv_attrib can instead be built from the final CSV files of the conflation
+# (see roadinv_attrib_from_final_records).
+#
+# 10/18/2026
+
+import csv
+import glob
+import os
+
+import process_csv_file
+
+# Table of conflated road inventory attributes, one row per TMC, and its fields
+roadinv_attrib_table = 'Inrix_2019_cmp_exp_roadinv_attrib'
+roadinv_attrib_fields = ['rid', 'tmc', 'from_meas', 'to_meas', 'route_id', 'route_num', 'road_name', 'direction',
+                         'seg_begin', 'seg_end', 'community', 'num_lanes', 'speed_limit']
+roadinv_attrib_numeric_fields = ['rid', 'from_meas', 'to_meas', 'num_lanes', 'speed_limit']
+
+# Table of the length of each TMC, and its length field
+avg_length_table = 'Inrix_2019_cmp_exp_avg_length'
+avg_length_field = 'avg_length'
+
+# The INRIX CMP metric tables: (column of expressway_performance_measures, metric table, field of metric table)
+metric_tables = [ ('ffs', 'Inrix_2019_cmp_exp_free_flow_speed_edited', 'max_speed'),
+                  ('am_avg_sp', 'Inrix_2019_cmp_exp_avg_speed_all_am', 'avg_speed'),
+                  ('pm_avg_sp', 'Inrix_2019_cmp_exp_avg_speed_all_pm', 'avg_speed'),
+                  ('am_cong_sp', 'Inrix_2019_cmp_exp_avg_speed_cong_am', 'avg_speed'),
+                  ('pm_cong_sp', 'Inrix_2019_cmp_exp_avg_speed_cong_pm', 'avg_speed'),
+                  ('am_del_mi', 'Inrix_2019_cmp_exp_delay_per_mile_am', 'delay_per_mile'),
+                  ('pm_del_mi', 'Inrix_2019_cmp_exp_delay_per_mile_pm', 'delay_per_mile'),
+                  ('am_spd_ix', 'Inrix_2019_cmp_exp_speed_index_am', 'speed_index'),
+                  ('pm_spd_ix', 'Inrix_2019_cmp_exp_speed_index_pm', 'speed_index'),
+                  ('am_avtt_ix', 'Inrix_2019_cmp_exp_travel_time_idx_am', 'tt_idx'),
+                  ('pm_avtt_ix', 'Inrix_2019_cmp_exp_travel_time_idx_pm', 'tt_idx'),
+                  ('am_5ptt_ix', 'Inrix_2019_cmp_exp_planning_time_idx_am', 'pt_idx'),
+                  ('pm_5ptt_ix', 'Inrix_2019_cmp_exp_planning_time_idx_pm', 'pt_idx'),
+                  ('am_cong_mn', 'Inrix_2019_cmp_exp_cong_min_tmc_am', 'cong_min'),
+                  ('pm_cong_mn', 'Inrix_2019_cmp_exp_cong_min_tmc_pm', 'cong_min') ]
+
+# Columns of expressway_performance_measures, and their SQL types
+performance_measures_columns = [ ('rid', 'INTEGER'), ('tmc', 'TEXT'), ('from_meas', 'REAL'), ('to_meas', 'REAL'),
+                                 ('distance', 'REAL'), ('route_id', 'TEXT'), ('route_num', 'TEXT'), ('road_name', 'TEXT'),
+                                 ('direction', 'TEXT'), ('seg_begin', 'TEXT'), ('seg_end', 'TEXT'), ('community', 'TEXT'),
+                                 ('lanes', 'INTEGER'), ('lane_miles', 'REAL'), ('spd_limit', 'INTEGER') ] + \
+                               [ (column, 'REAL') for column, table, field in metric_tables ]
+
+# _number: Convert a value read from a CSV file to a number, or None if it is empty
+#
+def _number(value, convert=float):
+    if value is None or value.strip() == '':
+        return None
+    # end_if
+    return convert(float(value)) if convert is int else convert(value)
+# def _number()
+
+# table_csv_path: Return the full path of the CSV file containing a table
+#
+# Parameters: table_dir - full path of the directory containing the CSV files
+#             table_name - name of the table
+#
+def table_csv_path(table_dir, table_name):
+    return os.path.join(table_dir, table_name + '.csv')
+# def table_csv_path()
+
+# _field_index: Return the index of a field in a CSV header, ignoring case (as Access does)
+#
+def _field_index(header, field, csv_path):
+    lower = [name.strip().lower() for name in header]
+    if field.lower() not in lower:
+        raise ValueError(csv_path + ': no field named ' + field)
+    # end_if
+    return lower.index(field.lower())
+# def _field_index()
+
+# iter_keyed_table: Generate the TMC and value of one value field of each row of a table, as it is read
+#
+# Parameters: table_dir - full path of the directory containing the CSV files
+#             table_name - name of the table
+#             field - name of the value field
+# Return value: generator of (TMC ID, value) tuples, value being a float, or None if empty
+#
+def iter_keyed_table(table_dir, table_name, field):
+    csv_path = table_csv_path(table_dir, table_name)
+    with open(csv_path) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        tmc_ix = _field_index(header, 'tmc', csv_path); value_ix = _field_index(header, field, csv_path)
+        for row in reader:
+            if len(row) == 0:
+                continue
+            # end_if
+            try:
+                value = _number(row[value_ix])
+            except ValueError:
+                raise ValueError(csv_path + ', line ' + str(reader.line_num) + ': invalid value ' + repr(row[value_ix]) +
+                                 ' in field ' + field)
+            # try/except
+            yield row[tmc_ix], value
+        # for
+    # with
+# def iter_keyed_table()
+
+# read_keyed_table: Read one value field of a table, keyed by TMC
+#
+# Parameters: table_dir - full path of the directory containing the CSV files
+#             table_name - name of the table
+#             field - name of the value field
+# Return value: dict mapping TMC ID to value (float, or None if empty); if a TMC appears more than once,
+#               its last value is used
+#
+def read_keyed_table(table_dir, table_name, field):
+    return dict(iter_keyed_table(table_dir, table_name, field))
+# def read_keyed_table()
+
+# read_roadinv_attrib: Read Inrix_2019_cmp_exp_roadinv_attrib from its CSV file
+#
+# Parameter: table_dir - full path of the directory containing the CSV files
+# Return value: list of dicts, one per row, with the roadinv_attrib_fields
+#
+def read_roadinv_attrib(table_dir):
+    csv_path = table_csv_path(table_dir, roadinv_attrib_table)
+    retval = []
+    with open(csv_path) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        indices = [_field_index(header, field, csv_path) for field in roadinv_attrib_fields]
+        for row in reader:
+            if len(row) == 0:
+                continue
+            # end_if
+            rec = dict(zip(roadinv_attrib_fields, [row[ix] for ix in indices]))
+            for field in roadinv_attrib_numeric_fields:
+                rec[field] = _number(rec[field], float if field in ['from_meas', 'to_meas'] else int)
+            # for
+            retval.append(rec)
+        # for
+    # with
+    return retval
+# def read_roadinv_attrib()
+
+# read_final_records: Read the final records of the conflation
+#
+# Parameter: final_path - full path of either a final CSV file (e.g., the merged statewide_events_final.csv written by
+#                         statewide_session.py) or a directory of per-route final CSV files (*_events_final.csv)
+# Return value: list of dicts, one per TMC of each route, in the fields of process_csv_file.output_fieldnames
+#
+def read_final_records(final_path):
+    if os.path.isdir(final_path):
+        csv_paths = sorted([fn for fn in glob.glob(os.path.join(final_path, '*_events_final.csv'))
+                            if os.path.basename(fn) != 'statewide_events_final.csv'])
+    else:
+        csv_paths = [final_path]
+    # end_if
+    retval = []
+    for csv_path in csv_paths:
+        with open(csv_path) as csvfile:
+            for rec in csv.DictReader(csvfile):
+                for field in ['from_meas', 'to_meas', 'length']:
+                    rec[field] = _number(rec[field])
+                # for
+                for field in ['speed_limit', 'num_lanes']:
+                    rec[field] = _number(rec[field], int)
+                # for
+                retval.append(rec)
+            # for
+        # with
+    # for
+    return retval
+# def read_final_records()
+
+# roadinv_attrib_from_final_records: Build the rows of Inrix_2019_cmp_exp_roadinv_attrib from the final records
+#
+# Parameter: records - list of final records, as returned by read_final_records
+# Return value: list of dicts, one per final record with a TMC, with the roadinv_attrib_fields
+#
+# rid is the (1-based) number of the row. road_name, seg_begin, and seg_end aren't produced by the conflation (see the
+# note on firstnm in README.md), and are left empty. A num_lanes or speed_limit of -1 (no usable value) is left empty.
+#
+def roadinv_attrib_from_final_records(records):
+    retval = []
+    for rec in records:
+        if not rec['tmc']:
+            continue
+        # end_if
+        retval.append({ 'rid' : len(retval) + 1, 'tmc' : rec['tmc'], 'from_meas' : rec['from_meas'], 'to_meas' : rec['to_meas'],
+                        'route_id' : rec['route_id'], 'route_num' : rec['roadnum'], 'road_name' : None,
+                        'direction' : rec['direction'], 'seg_begin' : None, 'seg_end' : None, 'community' : rec['towns'],
+                        'num_lanes' : rec['num_lanes'] if rec['num_lanes'] != -1 else None,
+                        'speed_limit' : rec['speed_limit'] if rec['speed_limit'] != -1 else None })
+    # for
+    return retval
+# def roadinv_attrib_from_final_records()
+
+# write_performance_measures_csv: Write the rows of expressway_performance_measures to a CSV file
+#
+# Parameters: out_csv - full path of the CSV file
+#             rows - iterable of sequences of values, in the order of performance_measures_columns
+# Return value: number of rows written
+#
+def write_performance_measures_csv(out_csv, rows):
+    retval = 0
+    with process_csv_file.open_csv_for_writing(out_csv) as f:
+        w = csv.writer(f)
+        w.writerow([name for name, sql_type in performance_measures_columns])
+        for row in rows:
+            w.writerow(['' if value is None else value for value in row])
+            retval += 1
+        # for
+    # with
+    return retval
+# def write_performance_measures_csv()
@@ -0,0 +1,301 @@
+# columnar_events.py - typed, columnar storage of the intermediate (overlaid) event table
+#
+# Phase 1 of the conflation (generate_tmc_events_for_expressways.py) originally handed its output to
+# phase 2 (process_csv_file.py) as a CSV file, which phase 2 re-parsed row by row, converting each
+# numeric field with int() or float(). The intermediate event table is now written as a directory
+# containing one NumPy .npy file per column, with a fixed dtype for each numeric column, and a small
+# JSON "schema" file. Phase 2 loads the columns with no parsing at all, and can memory-map them.
+# The intermediate CSV file remains available as an export; when it must be read, load_csv_columns reads it
+# directly into the same typed columns.
+#
+# Layout of a columnar event table directory:
+#     schema.json    - format version, number of rows, and the name, dtype, and file name of each column
+#     <column>.npy   - one file per column
+#
+# 10/18/2026
+
+import csv
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+
+# Version of the columnar format
+columnar_format_version = 1
+
+# Name of the schema file in a columnar event table directory
+schema_file_name = 'schema.json'
+
+# Columns of the intermediate event table, and their dtypes.
+# A dtype of None indicates a string column; its dtype is a fixed-width Unicode type
+# wide enough to hold the longest value in the column.
+#
+event_columns = [ ('route_id', None), ('from_meas', '<f8'), ('to_meas', '<f8'), ('tmc', None), ('tmctype', None),
+                  ('roadnum', None), ('firstnm', None), ('direction', None), ('town', None), ('town_id', '<i4'),
+                  ('speed_lim', '<i4'), ('num_lanes', '<i4'), ('calc_len', '<f8') ]
+
+# is_columnar: Return True if the given path is a columnar event table directory
+#
+def is_columnar(path):
+    return os.path.isfile(os.path.join(path, schema_file_name))
+# def is_columnar()
+
+# events_to_columns: Convert a list of event dicts into a dict of typed NumPy arrays
+#
+# Parameters: events - list of dicts, one per event, each containing (at least) the fields in event_columns
+#             columns - OPTIONAL list of (name, dtype) tuples; defaults to event_columns
+# Return value: dict of NumPy arrays, keyed by column name
+#
+def events_to_columns(events, columns=None):
+    if columns is None:
+        columns = event_columns
+    # end_if
+    retval = {}
+    for name, dtype in columns:
+        values = [ev[name] for ev in events]
+        if dtype is None:
+            width = max([len(v) for v in values]) if len(values) > 0 else 1
+            retval[name] = np.array(values, dtype='<U' + str(max(width, 1)))
+        else:
+            retval[name] = np.array(values, dtype=dtype)
+        # end_if
+    # for
+    return retval
+# def events_to_columns()
+
+# write_columnar: Write a list of event dicts as a columnar event table directory
+#
+# Parameters: out_dir - full path of the directory to be written; it is created if necessary
+#             events - list of dicts, one per event
+#             columns - OPTIONAL list of (name, dtype) tuples; defaults to event_columns
+# Return value: none
+#
+# Note: The schema file is written last, so that a directory whose columns were only partially written
+#       is not mistaken for a complete columnar event table.
+#
+def write_columnar(out_dir, events, columns=None):
+    if columns is None:
+        columns = event_columns
+    # end_if
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    # end_if
+    schema_fn = os.path.join(out_dir, schema_file_name)
+    if os.path.exists(schema_fn):
+        os.remove(schema_fn)
+    # end_if
+    cols = events_to_columns(events, columns)
+    schema = { 'format_version' : columnar_format_version, 'num_rows' : len(events), 'columns' : [] }
+    for name, dtype in columns:
+        file_name = name + '.npy'
+        np.save(os.path.join(out_dir, file_name), cols[name])
+        schema['columns'].append({ 'name' : name, 'dtype' : cols[name].dtype.str, 'file' : file_name })
+    # for
+    with open(schema_fn, 'w') as f:
+        json.dump(schema, f, indent=1)
+    # with
+# def write_columnar()
+
+# load_columnar: Load a columnar event table directory
+#
+# Parameters: in_dir - full path of the columnar event table directory
+#             mmap - OPTIONAL; if True, the columns are memory-mapped (read-only) rather than read into memory
+# Return value: dict of NumPy arrays, keyed by column name
+#
+def load_columnar(in_dir, mmap=False):
+    schema_fn = os.path.join(in_dir, schema_file_name)
+    with open(schema_fn, 'r') as f:
+        schema = json.load(f)
+    # with
+    if schema['format_version'] != columnar_format_version:
+        raise ValueError(in_dir + ': unsupported columnar format version ' + str(schema['format_version']))
+    # end_if
+    retval = {}
+    for col in schema['columns']:
+        arr = np.load(os.path.join(in_dir, col['file']), mmap_mode='r' if mmap else None)
+        if arr.dtype.str != col['dtype'] or len(arr) != schema['num_rows']:
+            raise ValueError(in_dir + ': column ' + col['name'] + ' does not match schema')
+        # end_if
+        retval[col['name']] = arr
+    # for
+    return retval
+# def load_columnar()
+
+# columns_to_records: Convert a dict of column arrays into a list of dicts, one per row, containing native Python values
+#
+# Parameter: cols - dict of NumPy arrays, as returned by load_columnar
+# Return value: list of dicts
+#
+def columns_to_records(cols):
+    names = list(cols.keys())
+    values = [cols[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+# def columns_to_records()
+
+# Number of rows of a CSV file converted to typed arrays at a time by load_csv_columns
+csv_chunk_rows = 16384
+
+# _csv_chunks: Generate the rows of an open CSV file, a chunk at a time
+#
+# Parameters: csvfile - file object, positioned after the header line
+#             num_fields - number of fields in the header
+# Return value: generator of (line_nums, values, rows) tuples, one per chunk of (up to) csv_chunk_rows rows:
+#               either values is None, rows is a list of lists of field values, and line_nums the list of the line
+#               number of each row; or rows is None, values is the flat list of the field values of all the rows, each
+#               having exactly num_fields values, and line_nums is the line number of the first row
+#
+# A chunk of lines containing no quote character, each line having exactly num_fields - 1 commas (as do all the lines
+# of the intermediate CSV files), is split into its values all at once; since the field count is checked line by line,
+# a blank line, or a line with too many fields followed by one with too few, keeps a chunk off this path. Any other
+# chunk is split line by line, a line containing a quote character being parsed, together with the lines following it
+# up to the end of any quoted value, by the csv module; blank lines are skipped.
+#
+def _csv_chunks(csvfile, num_fields):
+    line_num = 2
+    while True:
+        lines = list(itertools.islice(csvfile, csv_chunk_rows))
+        if len(lines) == 0:
+            return
+        # end_if
+        text = ''.join(lines)
+        if '"' not in text and num_fields > 1 and all([line.count(',') == num_fields - 1 for line in lines]):
+            values = text.replace('\r', '').rstrip('\n').replace('\n', ',').split(',')
+            yield line_num, values, None
+            line_num += len(lines)
+            continue
+        # end_if
+        line_nums = []; rows = []
+        lines_iter = iter(lines)
+        for line in lines_iter:
+            if '"' not in line:
+                row = line.rstrip('\r\n').split(',')
+                if not (len(row) == 1 and row[0] == ''):
+                    line_nums.append(line_num); rows.append(row)
+                # end_if
+                line_num += 1
+            else:
+                line_nums.append(line_num)
+                while line.count('"') % 2 == 1:
+                    next_line = next(lines_iter, None)
+                    if next_line is None:
+                        next_line = csvfile.readline()
+                        if next_line == '':
+                            break
+                        # end_if
+                    # end_if
+                    line += next_line
+                    line_num += 1
+                # while
+                rows.append(next(csv.reader([line])))
+                line_num += 1
+            # end_if
+        # for
+        yield line_nums, None, rows
+    # while
+# def _csv_chunks()
+
+# _convert_chunk: Convert one chunk of the values of a CSV column to a typed array
+#
+# Parameters: values - list of strings
+#             dtype - dtype of the column (None for a string column; see event_columns)
+# Return value: tuple of (NumPy array, index in values of the first value that can't be converted, or None)
+#
+def _convert_chunk(values, dtype):
+    if dtype is None:
+        if len(values) == 0:
+            return np.array(values, dtype='<U1'), None
+        # end_if
+        return np.array(values, dtype='U'), None
+    # end_if
+    convert = float if np.dtype(dtype).kind == 'f' else int
+    try:
+        return np.array(list(map(convert, values)), dtype=dtype), None
+    except ValueError:
+        pass
+    # try/except
+    # Find the offending value; an integer column may contain values written as floats, e.g., "55.0"
+    retval = np.empty(len(values), dtype=dtype)
+    for i, v in enumerate(values):
+        try:
+            f = float(v)
+            if convert is int:
+                if f != int(f):
+                    return None, i
+                # end_if
+                f = int(f)
+            # end_if
+            retval[i] = f
+        except (ValueError, OverflowError):
+            return None, i
+        # try/except
+    # for
+    return retval, None
+# def _convert_chunk()
+
+# load_csv_columns: Load an intermediate event table from a CSV file directly into a dict of typed NumPy arrays
+#
+# Parameters: csv_path - full path of the CSV file
+#             columns - OPTIONAL list of (name, dtype) tuples, the schema of the columns to be loaded; defaults to event_columns
+# Return value: dict of NumPy arrays, keyed by column name, as returned by load_columnar
+#
+# The header is checked once: every column of the schema must be present, and any other columns (e.g., the OBJECTID,
+# route_id_1, and st_area_shape_ columns written by TableToTable) are skipped without being converted or kept.
+# The rows are read and converted a chunk (csv_chunk_rows rows) at a time (see _csv_chunks), each chunk's values being
+# converted column by column, so that no per-row dicts are built and only one chunk's strings are held at once.
+# A missing column, a row whose number of fields is not that of the header, or a value that can't be converted raises
+# ValueError, giving the file name, line number, and column name.
+#
+def load_csv_columns(csv_path, columns=None):
+    if columns is None:
+        columns = event_columns
+    # end_if
+    chunks = dict([(name, [_convert_chunk([], dtype)[0]]) for name, dtype in columns])
+    if sys.version_info[0] < 3:
+        csvfile = open(csv_path, 'rU')
+    else:
+        csvfile = open(csv_path, newline='')
+    # end_if
+    with csvfile:
+        header_line = csvfile.readline()
+        if header_line == '':
+            raise ValueError(csv_path + ': empty file; expected a header line')
+        # end_if
+        header = next(csv.reader([header_line]))
+        missing = [name for name, dtype in columns if name not in header]
+        if len(missing) > 0:
+            raise ValueError(csv_path + ', line 1: missing column(s) ' + ', '.join(missing))
+        # end_if
+        indices = [header.index(name) for name, dtype in columns]
+        for line_nums, values, rows in _csv_chunks(csvfile, len(header)):
+            if rows is not None:
+                for line_num, row in zip(line_nums, rows):
+                    if len(row) != len(header):
+                        raise ValueError(csv_path + ', line ' + str(line_num) + ': expected ' +
+                                         str(len(header)) + ' fields, found ' + str(len(row)))
+                    # end_if
+                # for
+            # end_if
+            for (name, dtype), ix in zip(columns, indices):
+                if rows is None:
+                    arr, bad = _convert_chunk(values[ix::len(header)], dtype)
+                else:
+                    arr, bad = _convert_chunk([row[ix] for row in rows], dtype)
+                # end_if
+                if bad is not None:
+                    line_num = line_nums + bad if rows is None else line_nums[bad]
+                    bad_value = values[bad * len(header) + ix] if rows is None else rows[bad][ix]
+                    raise ValueError(csv_path + ', line ' + str(line_num) + ': invalid value ' + repr(bad_value) +
+                                     ' in column ' + name)
+                # end_if
+                chunks[name].append(arr)
+            # for
+        # for
+    # with
+    retval = {}
+    for name, dtype in columns:
+        retval[name] = np.concatenate(chunks[name]) if len(chunks[name]) > 2 else chunks[name][-1]
+    # for
+    return retval
+# def load_csv_columns()
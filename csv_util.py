@@ -0,0 +1,24 @@
+# csv_util.py - opening CSV files for writing in the same way under Python 2 and Python 3
+#
+# This module has no dependencies outside the standard library, so that modules which write CSV files,
+# e.g., run_report.py, need not import process_csv_file.py (and hence pydash) to do so.
+#
+# 10/18/2026
+
+import sys
+
+# open_csv_for_writing: Open a file for writing by a csv.writer or csv.DictWriter
+#
+# Parameter: open_fn - full path of CSV file
+# Return value: file object
+#
+# Note: Under Python 2, the file must be opened in 'wb' mode on Windows in order to prevent each record
+#       being written out with an EXTRA newline; under Python 3, the same is accomplished with newline=''.
+#
+def open_csv_for_writing(open_fn):
+    if sys.version_info[0] < 3:
+        return open(open_fn, 'wb')
+    else:
+        return open(open_fn, 'w', newline='')
+    # end_if
+# def open_csv_for_writing()
@@ -0,0 +1,20 @@
+# expressway_routes.py - list of MassDOT route_ids for the express highways conflated with INRIX TMCs
+#
+# This list was formerly hard-coded in regenerate_LRSE_FCs.py; it is shared by that script and by
+# batch_conflate_routes.py.
+
+expressway_route_ids = [ 'I90 EB', 'I90 WB', 'I93 NB', 'I93 SB', 'I95 NB', 'I95 SB', 'I290 EB', 'I290 WB', 'I495 NB', 'I495 SB',
+                         'US1 NB', 'US1 SB', 'US3 NB', 'US3 SB', 'US44 EB', 'US44 WB', 'SR2 EB', 'SR2 WB', 'SR3 NB', 'SR3 SB',
+                         'SR24 NB', 'SR24 SB', 'SR140 NB', 'SR140 SB', 'SR146 NB', 'SR146 SB', 'SR213 EB', 'SR213 WB', 'N087 NB', 'N482 SB' ]
+
+# read_route_list_file: Read a newline-delimited list of MassDOT route_ids from a file
+#
+# Parameter: route_list_file_name - full path of file containing the list of route_ids
+# Return value: list of route_ids; blank lines are ignored
+#
+def read_route_list_file(route_list_file_name):
+    with open(route_list_file_name, 'r') as f:
+        s = f.read()
+    # with
+    return [route_id.strip() for route_id in s.split('\n') if route_id.strip() != '']
+# def read_route_list_file()
@@ -0,0 +1,309 @@
+# generate_synthetic_data.py - generate synthetic inputs for the conflation pipeline, for benchmarking
+#
+# Usage: python generate_synthetic_data.py [--routes <N>] [--statewide <K>] [--seed <S>] --out <file>
+#
+#     --routes    - number of routes to generate (default: 1)
+#     --statewide - generate K times as many routes as there are express highway routes in expressway_routes.py;
+#                   overrides --routes
+#     --seed      - seed for the random number generator (default: 1); the same seed always yields the same data
+#     --out       - full path of the (pickle) file to which the generated data set is written
+#
+# The data set mimics the inputs of generate_tmc_events_for_expressways.py, without depending upon arcpy:
+#     1. Routes - M-aware polylines (random walks, with vertices about 50 meters apart, in meters;
+#        M-values are in miles). Every other route shares a stretch of the preceding route's
+#        geometry, mimicking concurrent routes (e.g., I-93 and US-1).
+#     2. TMCs - polylines covering each route end-to-end, whose endpoints are jittered off the route.
+#        The first TMC of each route begins before the start of the route, and the last TMC ends beyond
+#        its end; one further TMC lies entirely beyond the end of the route (and is thus located as a
+#        zero-length event).
+#     3. Towns - a grid of rectangular town polygons covering all the routes, and the town events along each route.
+#     4. Speed limit and number of lanes events along each route, with occasional gaps and "no value" (99) speed limits.
+#
+# The data set is a dict; see make_dataset for its contents.
+#
+# 10/18/2026
+
+import argparse
+import math
+import pickle
+import random
+
+import expressway_routes
+import ma_towns
+
+meters_per_mile = 1609.344
+
+# make_route_walk: Generate the vertices of a random walk
+#
+# Parameters: rng - random.Random object
+#             x, y - coordinates of the starting point
+#             heading - initial heading, in radians
+#             num_vertices - number of vertices to generate, NOT including the starting point
+#             spacing - mean distance between vertices, in meters
+# Return value: tuple of (list of X coordinates, list of Y coordinates, final heading)
+#
+def make_route_walk(rng, x, y, heading, num_vertices, spacing):
+    xs = []; ys = []
+    for i in range(num_vertices):
+        heading += rng.gauss(0.0, 0.05)
+        step = spacing * rng.uniform(0.5, 1.5)
+        x += step * math.cos(heading)
+        y += step * math.sin(heading)
+        xs.append(x); ys.append(y)
+    # for
+    return xs, ys, heading
+# def make_route_walk()
+
+# measures_along: Compute the M-values (in miles) of a sequence of vertices, as cumulative distance from the first
+#
+def measures_along(xs, ys):
+    ms = [0.0]
+    for i in range(1, len(xs)):
+        ms.append(ms[-1] + math.hypot(xs[i] - xs[i-1], ys[i] - ys[i-1]) / meters_per_mile)
+    # for
+    return ms
+# def measures_along()
+
+# make_route: Generate a single-part route
+#
+# Parameters: rng - random.Random object
+#             route_id - route_id of the route
+#             length_miles - approximate length of the route
+#             origin - (x, y) of the starting point
+#             shared - OPTIONAL (xs, ys) of a stretch of another route's vertices to be shared by this route
+#             spacing - OPTIONAL mean distance between vertices, in meters
+# Return value: dict with the fields route_id, parts (a list of one (xs, ys, ms) tuple), and last_m
+#
+def make_route(rng, route_id, length_miles, origin, shared=None, spacing=50.0):
+    num_vertices = max(2, int(length_miles * meters_per_mile / spacing))
+    if shared is None:
+        xs, ys, h = make_route_walk(rng, origin[0], origin[1], rng.uniform(0.0, 2.0 * math.pi), num_vertices, spacing)
+        xs = [origin[0]] + xs; ys = [origin[1]] + ys
+    else:
+        shared_xs, shared_ys = shared
+        n_before = num_vertices // 3
+        n_after = num_vertices - n_before - len(shared_xs)
+        back_heading = math.atan2(shared_ys[0] - shared_ys[1], shared_xs[0] - shared_xs[1])
+        bxs, bys, h = make_route_walk(rng, shared_xs[0], shared_ys[0], back_heading, n_before, spacing)
+        fwd_heading = math.atan2(shared_ys[-1] - shared_ys[-2], shared_xs[-1] - shared_xs[-2])
+        fxs, fys, h = make_route_walk(rng, shared_xs[-1], shared_ys[-1], fwd_heading, max(n_after, 1), spacing)
+        xs = list(reversed(bxs)) + list(shared_xs) + fxs
+        ys = list(reversed(bys)) + list(shared_ys) + fys
+    # end_if
+    ms = measures_along(xs, ys)
+    return { 'route_id' : route_id, 'parts' : [(xs, ys, ms)], 'last_m' : ms[-1] }
+# def make_route()
+
+# point_at_measure: Return the (x, y) coordinates of the point at a given measure along a single-part route,
+#                   extrapolating beyond either end of the route along its first or last segment
+#
+def point_at_measure(route, m):
+    xs, ys, ms = route['parts'][0]
+    lo = 0
+    hi = len(ms) - 1
+    if m <= ms[0]:
+        i = 0
+    elif m >= ms[-1]:
+        i = len(ms) - 2
+    else:
+        # Binary search for the segment containing m
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if ms[mid] <= m:
+                lo = mid
+            else:
+                hi = mid
+            # end_if
+        # while
+        i = lo
+    # end_if
+    t = (m - ms[i]) / (ms[i+1] - ms[i]) if ms[i+1] != ms[i] else 0.0
+    return xs[i] + t * (xs[i+1] - xs[i]), ys[i] + t * (ys[i+1] - ys[i])
+# def point_at_measure()
+
+# make_tmcs: Generate the TMCs covering a route
+#
+# Parameters: rng - random.Random object
+#             route - route, as returned by make_route
+#             route_num - sequence number of the route, used to generate unique TMC IDs
+#             mean_len - mean length of a TMC, in miles
+#             jitter - standard deviation of the offset of each TMC endpoint from the route, in meters
+# Return value: list of dicts, one per TMC, with the fields tmc, tmctype, roadnum, firstnm, direction, route_id,
+#               from_x, from_y, to_x, to_y, and (for reference) true_from_meas and true_to_meas
+#
+def make_tmcs(rng, route, route_num, mean_len=1.0, jitter=5.0):
+    last_m = route['last_m']
+    # Breakpoints: the first TMC starts before the route, and the last one ends beyond it
+    breaks = [-rng.uniform(0.05, 0.2) * mean_len]
+    while breaks[-1] < last_m:
+        breaks.append(breaks[-1] + rng.uniform(0.5, 1.5) * mean_len)
+    # while
+    # One more TMC lying entirely beyond the end of the route
+    breaks.append(breaks[-1] + rng.uniform(0.5, 1.5) * mean_len)
+    retval = []
+    for i in range(len(breaks) - 1):
+        fx, fy = point_at_measure(route, breaks[i])
+        tx, ty = point_at_measure(route, breaks[i+1])
+        retval.append({ 'tmc' : '%03dP%05d' % (route_num, i), 'tmctype' : 'P1.11',
+                        'roadnum' : route['route_id'].split(' ')[0], 'firstnm' : 'Exit ' + str(i + 1),
+                        'direction' : route['route_id'].split(' ')[-1], 'route_id' : route['route_id'],
+                        'from_x' : fx + rng.gauss(0.0, jitter), 'from_y' : fy + rng.gauss(0.0, jitter),
+                        'to_x' : tx + rng.gauss(0.0, jitter), 'to_y' : ty + rng.gauss(0.0, jitter),
+                        'true_from_meas' : breaks[i], 'true_to_meas' : breaks[i+1] })
+    # for
+    return retval
+# def make_tmcs()
+
+# make_towns: Generate a grid of rectangular town polygons covering a bounding box
+#
+# Parameters: bbox - (min_x, min_y, max_x, max_y)
+#             cell_size - width and height of each town, in meters
+# Return value: dict with the fields origin (x, y), cell_size, ncols, nrows, and polygons:
+#               a list of dicts with the fields town_id, town, and ring (list of (x, y) tuples; closed)
+#
+def make_towns(bbox, cell_size=8000.0):
+    min_x = bbox[0] - cell_size; min_y = bbox[1] - cell_size
+    ncols = int(math.ceil((bbox[2] - min_x) / cell_size)) + 1
+    nrows = int(math.ceil((bbox[3] - min_y) / cell_size)) + 1
+    polygons = []
+    for row in range(nrows):
+        for col in range(ncols):
+            town_id = 1 + (row * ncols + col) % (len(ma_towns.ma_towns) - 1)
+            x0 = min_x + col * cell_size; y0 = min_y + row * cell_size
+            ring = [(x0, y0), (x0, y0 + cell_size), (x0 + cell_size, y0 + cell_size), (x0 + cell_size, y0), (x0, y0)]
+            polygons.append({ 'town_id' : town_id, 'town' : ma_towns.ma_towns[town_id]['town'], 'ring' : ring })
+        # for
+    # for
+    return { 'origin' : (min_x, min_y), 'cell_size' : cell_size, 'ncols' : ncols, 'nrows' : nrows, 'polygons' : polygons }
+# def make_towns()
+
+# make_town_events: Compute the town events along a route, by splitting it where it crosses the town grid
+#
+# Parameters: route - route, as returned by make_route
+#             towns - town grid, as returned by make_towns
+# Return value: list of dicts with the fields route_id, from_meas, to_meas, town, and town_id
+#
+def make_town_events(route, towns):
+    ox, oy = towns['origin']
+    size = towns['cell_size']
+    xs, ys, ms = route['parts'][0]
+    retval = []
+    for i in range(len(xs) - 1):
+        x0, y0, m0, x1, y1, m1 = xs[i], ys[i], ms[i], xs[i+1], ys[i+1], ms[i+1]
+        # Parameters (0..1) along the segment at which it crosses a grid line
+        ts = [0.0, 1.0]
+        for a0, a1, o in [(x0, x1, ox), (y0, y1, oy)]:
+            if a0 != a1:
+                k_lo = int(math.floor((min(a0, a1) - o) / size)) + 1
+                k_hi = int(math.floor((max(a0, a1) - o) / size))
+                for k in range(k_lo, k_hi + 1):
+                    ts.append((o + k * size - a0) / (a1 - a0))
+                # for
+            # end_if
+        # for
+        ts.sort()
+        for j in range(len(ts) - 1):
+            if ts[j+1] <= ts[j]:
+                continue
+            # end_if
+            tm = (ts[j] + ts[j+1]) / 2.0
+            col = int(math.floor((x0 + tm * (x1 - x0) - ox) / size))
+            row = int(math.floor((y0 + tm * (y1 - y0) - oy) / size))
+            poly = towns['polygons'][row * towns['ncols'] + col]
+            from_meas = m0 + ts[j] * (m1 - m0)
+            to_meas = m0 + ts[j+1] * (m1 - m0)
+            if len(retval) > 0 and retval[-1]['town_id'] == poly['town_id']:
+                retval[-1]['to_meas'] = to_meas
+            else:
+                retval.append({ 'route_id' : route['route_id'], 'from_meas' : from_meas, 'to_meas' : to_meas,
+                                'town' : poly['town'], 'town_id' : poly['town_id'] })
+            # end_if
+        # for
+    # for
+    return retval
+# def make_town_events()
+
+# make_lrse_events: Generate LRSE events (e.g., speed limit or number of lanes) along a route
+#
+# Parameters: rng - random.Random object
+#             route - route, as returned by make_route
+#             field - name of the attribute field, e.g., 'speed_lim'
+#             values - list of values from which the value of each event is chosen
+#             mean_len - mean length of an event, in miles
+#             gap_fraction - fraction of the route (approximately) not covered by any event
+# Return value: list of dicts with the fields route_id, from_meas, to_meas, and <field>
+#
+def make_lrse_events(rng, route, field, values, mean_len=2.0, gap_fraction=0.03):
+    retval = []
+    m = 0.0
+    while m < route['last_m']:
+        to_m = min(m + rng.uniform(0.25, 1.75) * mean_len, route['last_m'])
+        if rng.random() >= gap_fraction:
+            retval.append({ 'route_id' : route['route_id'], 'from_meas' : m, 'to_meas' : to_m, field : rng.choice(values) })
+        # end_if
+        m = to_m
+    # while
+    return retval
+# def make_lrse_events()
+
+# make_dataset: Generate a complete synthetic data set
+#
+# Parameters: num_routes - number of routes to generate
+#             seed - seed for the random number generator
+#             mean_route_len - mean length of a route, in miles
+# Return value: dict with the fields:
+#               routes - list of routes (see make_route)
+#               tmcs - list of TMCs (see make_tmcs), for all routes
+#               towns - town grid (see make_towns)
+#               town_events, speed_limit_events, num_lanes_events - lists of events, for all routes
+#
+def make_dataset(num_routes=1, seed=1, mean_route_len=40.0):
+    rng = random.Random(seed)
+    routes = []
+    for i in range(num_routes):
+        route_id = 'SYN' + str(i // 2 + 1) + (' NB' if i % 2 == 0 else ' SB')
+        length_miles = rng.uniform(0.25, 1.75) * mean_route_len
+        shared = None
+        if i % 2 == 1:
+            # Share the middle fifth of the preceding route's vertices
+            pxs, pys, pms = routes[-1]['parts'][0]
+            n = len(pxs)
+            shared = (pxs[2 * n // 5 : 3 * n // 5 + 2], pys[2 * n // 5 : 3 * n // 5 + 2])
+        # end_if
+        origin = (rng.uniform(0.0, 250000.0), rng.uniform(0.0, 100000.0))
+        routes.append(make_route(rng, route_id, length_miles, origin, shared))
+    # for
+    all_x = [x for r in routes for x in r['parts'][0][0]]
+    all_y = [y for r in routes for y in r['parts'][0][1]]
+    towns = make_towns((min(all_x), min(all_y), max(all_x), max(all_y)))
+    retval = { 'seed' : seed, 'routes' : routes, 'tmcs' : [], 'towns' : towns,
+               'town_events' : [], 'speed_limit_events' : [], 'num_lanes_events' : [] }
+    for i, route in enumerate(routes):
+        retval['tmcs'] += make_tmcs(rng, route, i)
+        retval['town_events'] += make_town_events(route, towns)
+        retval['speed_limit_events'] += make_lrse_events(rng, route, 'speed_lim', [40, 45, 50, 55, 55, 65, 65, 99])
+        retval['num_lanes_events'] += make_lrse_events(rng, route, 'num_lanes', [2, 3, 3, 4, 5])
+    # for
+    return retval
+# def make_dataset()
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic inputs for the conflation pipeline.')
+    parser.add_argument('--routes', type=int, default=1)
+    parser.add_argument('--statewide', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    num_routes = args.statewide * len(expressway_routes.expressway_route_ids) if args.statewide else args.routes
+    dataset = make_dataset(num_routes, args.seed)
+    with open(args.out, 'wb') as f:
+        pickle.dump(dataset, f, protocol=2)
+    # with
+    print('Generated ' + str(len(dataset['routes'])) + ' routes, ' + str(len(dataset['tmcs'])) + ' TMCs, ' +
+          str(len(dataset['towns']['polygons'])) + ' towns: ' + args.out)
+# def main()
+
+if __name__ == '__main__':
+    main()
+# end_if
@@ -19,26 +19,26 @@
 #     4. ma_towns
 # The first two are standard modules, part of any standard Python installation.
 # The third, pydash", requires explicit installation.
-# We include an explicit "try: import pydash..." at the beginning of this module, 
-# in order to notify the user if this library is not installed, and then exit.
 # The fourth resides in the same directory as this script and process_csv_file.py.
 #
+# TMC events are located along the route by tmc_locator.py, and town events by town_events.py,
+# which reside in the same directory as this script and depend upon NumPy (included in the ArcGIS Python installation).
+#
 # Ben Krepp, attending metaphysician
 # 12/31/2019, 01/02/2020, 01/06/2020-01/08/2020, 02/12/2020, 02/19/2020, 02/20/2020
 # ---------------------------------------------------------------------------
 
+import csv
+import os
 import arcpy
 import process_csv_file
-
-try:
-    import pydash
-except:
-    arcpy.AddMessage("This script requires the pydash package, which is not installed on the computer running this script.")
-    arcpy.AddMessage("Please have your System Administrator install the pydash package, and re-launch this script.")
-    arcpy.AddMessage("The command to install pydash has the form: '<python_installation_directory>\PythonNN -m pip install pydash'")
-    arcpy.AddError("Error: pydash package not installed. Terminating script execution.")
-    exit()
-# try/except
+import columnar_events
+import tmc_locator
+import town_events as town_locator
+import route_store
+import overlay_events
+import stage_cache
+import run_report
 
 # Map MassDOT route_id into INRIX 'roadnum' and INRIX 'direction'
 def get_inrix_attrs(MassDOT_route_id):
@@ -74,50 +74,92 @@ def get_inrix_attrs(MassDOT_route_id):
     retval['direction'] = direction
     return retval   
 # def get_inrix_attrs()
-       
-# Script parameters
-# First parameter, MassDOT route_id is REQUIRED
-MassDOT_route_id = arcpy.GetParameterAsText(0)
-if MassDOT_route_id == '#' or not MassDOT_route_id:
-    MassDOT_route_id = "I95 NB"
-# Debug/trace
-arcpy.AddMessage("Processing " + MassDOT_route_id) 
-MassDOT_route_query_string = "route_id = " + "'" + MassDOT_route_id + "'"
-arcpy.AddMessage("MassDOT_route_query_string = " + MassDOT_route_query_string)
-
-# Second parameter, indicating a file containing a specific list of TMCs, is OPTIONAL    
-TMC_list_file = arcpy.GetParameterAsText(1)
-#  Debug/trace
-if TMC_list_file != '':
-    arcpy.AddMessage("TMC_list_file = " + TMC_list_file)
-# end_if
-
-# Third parameter, XY tolerance for locating TMC events, is OPTIONAL; it defaults to 10 (meters).
-# Change: 2/12/2020: removed this parameter.
-# XY_tolerance = TMC_list_file = arcpy.GetParameterAsText(2)
-# if XY_tolerance == '#' or not XY_tolerance:
-#    XY_tolerance = '10'
-#
-# arcpy.AddMessage("XY tolerance = " + XY_tolerance)
- 
-if not TMC_list_file:
-    INRIX_attrs = get_inrix_attrs(MassDOT_route_id)
-    INRIX_roadnum = INRIX_attrs['roadnum']
-    INRIX_route_direction = INRIX_attrs['direction']
-    INRIX_query_string = "roadnum = " + "'" + INRIX_roadnum + "'" + " AND direction = " + "'" + INRIX_route_direction + "'"
-    arcpy.AddMessage("INRIX_roadnum = " + INRIX_roadnum)
-    arcpy.AddMessage("INRIX_route_direction = " + INRIX_route_direction)
-    arcpy.AddMessage("INRIX_query_string = " + INRIX_query_string)
-else:
-    f = open(TMC_list_file, 'r')
-    str1 = f.read()
-    str2 = str1.replace('\n', '')
-    INRIX_query_string = "tmc IN (" + str2 + ")"
-    arcpy.AddMessage("Using specified list of TMCs.")
-    arcpy.AddMessage("INRIX_query_string = " + INRIX_query_string)
-# end_if
-
 
+# get_route_parts: Extract the vertex coordinates and M-values of an M-aware polyline
+#
+# Parameter: geom - arcpy Polyline geometry object
+# Return value: list of (x, y, m) tuples of lists, one per part of the polyline
+#
+def get_route_parts(geom):
+    retval = []
+    for part in geom:
+        x = []; y = []; m = []
+        for pnt in part:
+            # Null points separate the rings of a part; they don't occur in route geometry, but be safe
+            if pnt:
+                x.append(pnt.X); y.append(pnt.Y); m.append(pnt.M)
+            # end_if
+        # for
+        retval.append((x, y, m))
+    # for
+    return retval
+# def get_route_parts()
+
+# read_event_table: Read an event table generated by one of the arcpy linear referencing tools into memory
+#
+# Parameters: event_table - full path of event table
+#             attr_fieldnames - list of names of the (non-key) attribute fields to be read
+# Return value: list of dicts, one per event, with keys 'route_id', 'from_meas', 'to_meas' and those in attr_fieldnames
+#
+def read_event_table(event_table, attr_fieldnames):
+    fieldnames = ['route_id', 'from_meas', 'to_meas'] + attr_fieldnames
+    retval = []
+    for row in arcpy.da.SearchCursor(event_table, fieldnames):
+        retval.append(dict(zip(fieldnames, row)))
+    # for
+    return retval
+# def read_event_table()
+
+# read_town_polygons: Read the town polygons from a polygon feature class into memory
+#
+# Parameter: town_fc - full path of the town polygon feature class
+# Return value: list of dicts, one per polygon feature, with the fields town_id, town, and rings
+#               (list of rings, each a list of (x, y) tuples), as expected by town_events.prepare_town_polygons
+#
+def read_town_polygons(town_fc):
+    retval = []
+    for town_feat in arcpy.da.SearchCursor(town_fc, ['town_id', 'town', 'shape@']):
+        rings = []
+        for part in town_feat[2]:
+            ring = []
+            for pnt in part:
+                # Null points separate the outer boundary of a part from its holes
+                if pnt:
+                    ring.append((pnt.X, pnt.Y))
+                else:
+                    rings.append(ring)
+                    ring = []
+                # end_if
+            # for
+            rings.append(ring)
+        # for
+        retval.append({ 'town_id' : town_feat[0], 'town' : town_feat[1], 'rings' : rings })
+    # for
+    return retval
+# def read_town_polygons()
+
+# Prepared town polygons (see town_events.py), indexed by the source stamp of the town polygon feature class from which
+# they were read; they are prepared once, and used for every route conflated by this process
+prepared_town_polygons = {}
+
+# get_prepared_town_polygons: Return the prepared town polygons, preparing them if this hasn't yet been done by this process
+#
+# Parameters: town_fc - full path of the town polygon feature class
+#             cache_dir - full path of the stage cache directory, in which the polygons read from town_fc are cached
+#             force - True to re-read the polygons, even if they are cached
+# Return value: prepared town polygons
+#
+def get_prepared_town_polygons(town_fc, cache_dir, force=False):
+    stamp = stage_cache.source_stamp(town_fc)
+    if force or stamp not in prepared_town_polygons:
+        key = stage_cache.cache_key('town_polygons', [stamp])
+        polygons = stage_cache.cached_stage(cache_dir, 'town_polygons', key, lambda: read_town_polygons(town_fc), force, arcpy.AddMessage)
+        prepared_town_polygons.clear()
+        prepared_town_polygons[stamp] = town_locator.prepare_town_polygons(polygons)
+    # end_if
+    return prepared_town_polygons[stamp]
+# def get_prepared_town_polygons()
+       
 # Path to "base directory" in which all output files are written,
 # and in which the re-generated LRSE FCs are found
 #
@@ -160,351 +202,565 @@ Num_Lanes_Layer = "Num Lanes Layer"
 # Towns political boundaries
 towns_pb_r = sde_mpodata_ro_connection + '\mpodata.mpodata.boundary\mpodata.mpodata.towns_pb_r'
 
-
-# OUTPUT DATA: Event tables and CSV file
-
 # Full path to geodatabase containing "template" TMC event table.
 tmc_template_event_table_gdb =  base_dir + "\\tmc_event_table_template.gdb"
 
-# Full paths of geodatabases in which event tables are written
-#
-tmc_event_table_gdb = base_dir + "\\tmc_events.gdb"
-town_event_table_gdb = base_dir + "\\town_events.gdb"
-overlay_events_1_gdb = base_dir + "\\overlay_1.gdb"
-speed_limit_event_table_gdb = base_dir + "\\speed_limit_events.gdb"
-overlay_events_2_gdb = base_dir + "\\overlay_2.gdb"
-num_lanes_event_table_gdb = base_dir + "\\num_lanes_events.gdb"
-overlay_events_3_gdb = base_dir + "\\overlay_3.gdb"
-output_events_gdb = base_dir + "\\output_prep.gdb"
-
-# Full path of directory in which intermediate CSV file is written
-# 
-output_csv_dir_1 = base_dir + "\\csv_intermediate"
-# Full path of directory in which final (i.e., post-processed) CSV file is written
-#
-output_csv_dir_2 = base_dir + "\\csv_final"
-
-# Names of generated event tables and intermediate CSV file
-#
-base_table_name = MassDOT_route_id.lower().replace(' ','_')
-# Raw (i.e., unsorted) TMC event table name
-tmc_event_table_name_raw = base_table_name + "_events_tmc_raw"
-# Sorted TMC event table name
-tmc_event_table_name = base_table_name + "_events_tmc"
-town_event_table_name = base_table_name + "_events_town"
-overlay_event_table_1_name = base_table_name + "_events_overlay_1"
-speed_limit_event_table_name = base_table_name + "_events_speedlimit"
-overlay_event_table_2_name = base_table_name + "_events_overlay_2"
-num_lanes_event_table_name = base_table_name + "_events_nlanes"
-overlay_event_table_3_name = base_table_name + "_events_overlay_3"
-# Note that the FINAL event table is written out as the INTERMEDIATE CSV file.
-# Subsequent processing (by process_csv_file.py) writes out the FINAL CSV file.
-output_event_table_name = base_table_name + "_events_output"
-output_csv_file_name_1 = base_table_name + "_events_output.csv"
-output_csv_file_name_2 = base_table_name + "_events_final.csv"
-
 # Full path of "template" TMC event table
 tmc_template_event_table = tmc_template_event_table_gdb +"\\TEMPLATE_events_tmc"
 
-# Full paths of generated event tables
-#
-# Raw (i.e., unsorted) TMC event table
-tmc_event_table_raw = tmc_event_table_gdb + "\\" + tmc_event_table_name_raw
-# Sorted TMC event table
-tmc_event_table = tmc_event_table_gdb + "\\" + tmc_event_table_name 
-town_event_table = town_event_table_gdb + "\\" + town_event_table_name
-overlay_events_1 = overlay_events_1_gdb + "\\" + overlay_event_table_1_name
-speed_limit_event_table = speed_limit_event_table_gdb + "\\" + speed_limit_event_table_name
-overlay_events_2 = overlay_events_2_gdb + "\\" + overlay_event_table_2_name
-num_lanes_event_table = num_lanes_event_table_gdb + "\\" + num_lanes_event_table_name
-overlay_events_3 = overlay_events_3_gdb + "\\" + overlay_event_table_3_name
-output_event_table = output_events_gdb + "\\" + output_event_table_name 
-
-# Full path of generated intermediate CSV file
-#
-output_csv_1 = output_csv_dir_1 + "\\" + output_csv_file_name_1
-#
-# Full path of generated final CSV file
-output_csv_2 = output_csv_dir_2 + "\\" + output_csv_file_name_2
-
-
-# Processing, per se, begins here
-
-# Make Feature Layer "INRIX_TMCS": from INRIX TMCs, select TMCs using the INRIX_query_string
-arcpy.MakeFeatureLayer_management(INRIX_MASSACHUSETTS_TMC_2019, INRIX_TMCS, INRIX_query_string, 
-                                  "", "objectid objectid HIDDEN NONE;tmc tmc VISIBLE NONE;tmctype tmctype VISIBLE NONE;linrtmc linrtmc HIDDEN NONE;frc frc VISIBLE NONE;lenmiles lenmiles VISIBLE NONE;strtlat strtlat HIDDEN NONE;strtlong strtlong HIDDEN NONE;endlat endlat HIDDEN NONE;endlong endlong HIDDEN NONE;roadnum roadnum VISIBLE NONE;roadname roadname VISIBLE NONE;firstnm firstnm VISIBLE NONE;direction direction VISIBLE NONE;country country HIDDEN NONE;state state HIDDEN NONE;zipcode zipcode HIDDEN NONE;shape shape HIDDEN NONE;st_length(shape) st_length(shape) HIDDEN NONE")
-
-# Make Feature Layer "Selected_LRSN_Route": from MASSDOT LRSN_Routes select route with MassDOT_route_id
-arcpy.MakeFeatureLayer_management(MASSDOT_LRSN_Routes_19Dec2019, Selected_LRSN_Route, MassDOT_route_query_string, 
-                                   "", "objectid objectid HIDDEN NONE;from_date from_date HIDDEN NONE;to_date to_date HIDDEN NONE;route_system route_system HIDDEN NONE;route_number route_number HIDDEN NONE;route_direction route_direction HIDDEN NONE;route_id route_id VISIBLE NONE;route_type route_type VISIBLE NONE;route_qualifier route_qualifier HIDDEN NONE;alternate_route_number alternate_route_number HIDDEN NONE;created_by created_by HIDDEN NONE;date_created date_created HIDDEN NONE;edited_by edited_by HIDDEN NONE;date_edited date_edited HIDDEN NONE;globalid globalid HIDDEN NONE;shape shape HIDDEN NONE;st_length(shape) st_length(shape) HIDDEN NONE")
-
-arcpy.AddMessage("Generating TMC events.")
-
-# Generate TMC events: "locate" TMCs along MassDOT routes
-#
-# NOTE: We found that the out-of-the-box ESRI 'Locate Features Along Routes' doesn't quite do the job we need.
-#       The original code using the ESRI tool is reatained here as a comment, for reference.
-#      The code we implmented to perform locating TMC events along the MassDOT routes is found below.
-#
-# *** Beginning of original code:
-#
-# Locate Features Along Routes: locate selected TMCs along selected MassDOT route
-# Output is: tmc_event_table
-# Note: An XY tolerance of ***40*** meters was found to be necessary some cases, e.g., I-95 @ new bridge over Merrimack River.
-# tmc_event_table_properties = "route_id LINE from_meas to_meas"
-# arcpy.LocateFeaturesAlongRoutes_lr(INRIX_TMCS, Selected_LRSN_Route, "route_id", XY_tolerance + " Meters", tmc_event_table, 
-#                                    tmc_event_table_properties, "FIRST", "DISTANCE", "ZERO", "FIELDS", "M_DIRECTON")
-# Delete un-needed fields from tmc_event_table
-# arcpy.DeleteField_management(tmc_event_table, "linrtmc;frc;lenmiles;strtlat;strtlong;endlat;endlong;roadname;country;state;zipcode")
-#
-# *** End of original code
-#
-# *** Beginning of replacement code:
-#
-# Make a copy of the "template" TMC event table into which the raw (unsorted) TMC events will be written
-arcpy.CreateTable_management(tmc_event_table_gdb, tmc_event_table_name_raw, tmc_template_event_table)
+# Full path of directory in which the outputs of the pipeline's stages are cached (see stage_cache.py),
+# the maximum size of the cache (in bytes), and the number of days after which an unused cache entry is discarded
+stage_cache_dir = base_dir + "\\stage_cache"
+stage_cache_max_bytes = 2 * 1024 * 1024 * 1024
+stage_cache_max_age_days = 90
+
+# Full path of the route store directory: the geometry of all LRSN routes, packed into memory-mappable arrays (see route_store.py)
+route_store_dir = base_dir + "\\route_store"
+
+# Full path of directory in which the run report (per-stage timings and counters; see run_report.py) for each route is written
+run_report_dir = base_dir + "\\run_reports"
+
+# count_output_events: Record in a run report the number of records affected by each clean-up operation
+#                      performed on the overlay of a route's events, and the number of records remaining
+#
+# Parameters: rpt - run report (see run_report.py)
+#             output_stage_output - output of overlay_events.overlay_route_events
+# Return value: None
+#
+def count_output_events(rpt, output_stage_output):
+    counts = output_stage_output['counts']
+    run_report.count(rpt, 'town_id_0_records_deleted', counts['town_id_0'])
+    run_report.count(rpt, 'empty_tmc_records_deleted', counts['empty_tmc'])
+    run_report.count(rpt, 'negative_from_meas_fixed', counts['negative_from_meas'])
+    run_report.count(rpt, 'zero_length_records_deleted', counts['zero_length'])
+    run_report.count(rpt, 'intermediate_records', len(output_stage_output['events']))
+# def count_output_events()
+
+# write_output_events: Write a route's intermediate event table in columnar form, and optionally export it as a CSV file
+#
+# Parameters: rpt - run report (see run_report.py), in which the time taken by each is recorded
+#             output_events - intermediate event table (list of dicts)
+#             output_columnar - full path of the directory in which the columnar event table is written
+#             output_csv - full path of the CSV file
+#             export_csv - True to export the intermediate event table as a CSV file
+# Return value: None
+#
+def write_output_events(rpt, output_events, output_columnar, output_csv, export_csv):
+    with run_report.timed_stage(rpt, 'write_columnar', len(output_events)):
+        columnar_events.write_columnar(output_columnar, output_events)
+    # with
+    if export_csv:
+        output_csv_fieldnames = [name for name, dtype in columnar_events.event_columns]
+        with run_report.timed_stage(rpt, 'export_csv', len(output_events)):
+            with process_csv_file.open_csv_for_writing(output_csv) as f:
+                w = csv.DictWriter(f, fieldnames=output_csv_fieldnames, extrasaction='ignore')
+                w.writeheader()
+                w.writerows(output_events)
+            # with
+        # with
+    # end_if
+# def write_output_events()
+
+# conflate_route: Conflate the INRIX TMCs, towns, speed limit, and number of lanes events onto one MassDOT route,
+#                 generating the intermediate and final CSV files for the route
+#
+# Parameters: MassDOT_route_id - MassDOT route_id, e.g., 'I95 NB'
+#             TMC_list_file - full path of file containing the list of TMCs to be conflated onto the route,
+#                             or '' to select TMCs using the INRIX roadnum and direction corresponding to the route_id
+#             work_dir - OPTIONAL full path of directory in which the route's event table geodatabases are written;
+#                        if not specified, they are written in base_dir
+#             force - OPTIONAL; True to re-run every stage, even those whose output is cached
+#             cache_dir - OPTIONAL full path of the stage cache directory; '' to disable caching
+#             export_csv - OPTIONAL; if True (the default), the intermediate event table is also exported as a CSV file
+#             report_dir - OPTIONAL full path of the directory in which the run report is written; '' to not write one
+#             export_tmc_events - OPTIONAL; if True, the TMC events are also written to the tmc_events geodatabase,
+#                                 for inspection, whenever the TMC events stage is run (i.e., not taken from the stage cache)
+# Return value: full path of the final CSV file
+#
+def conflate_route(MassDOT_route_id, TMC_list_file, work_dir=None, force=False, cache_dir=None, export_csv=True, report_dir=None,
+                   export_tmc_events=False):
+    if cache_dir is None:
+        cache_dir = stage_cache_dir
+    # end_if
+    if report_dir is None:
+        report_dir = run_report_dir
+    # end_if
+    # Per-stage timings and counters for this run
+    rpt = run_report.new_run_report(MassDOT_route_id)
+    # Debug/trace
+    arcpy.AddMessage("Processing " + MassDOT_route_id) 
+    MassDOT_route_query_string = "route_id = " + "'" + MassDOT_route_id + "'"
+    arcpy.AddMessage("MassDOT_route_query_string = " + MassDOT_route_query_string)
+    if TMC_list_file != '':
+        arcpy.AddMessage("TMC_list_file = " + TMC_list_file)
+    # end_if
 
-# Indices in the vector of fields (i.e., attributes) to be read in from the TMC FC
-route_feat_route_id_ix = 0; route_feat_shape_ix = 1
-#
-# Get the geometry of the selected LRSN route
-route_sc = arcpy.da.SearchCursor(Selected_LRSN_Route,['route_id', 'shape@'])
-route_feat = route_sc.next()
-route_feat_last_m_value = route_feat[route_feat_shape_ix].lastPoint.M
+    if not TMC_list_file:
+        INRIX_attrs = get_inrix_attrs(MassDOT_route_id)
+        INRIX_roadnum = INRIX_attrs['roadnum']
+        INRIX_route_direction = INRIX_attrs['direction']
+        INRIX_query_string = "roadnum = " + "'" + INRIX_roadnum + "'" + " AND direction = " + "'" + INRIX_route_direction + "'"
+        arcpy.AddMessage("INRIX_roadnum = " + INRIX_roadnum)
+        arcpy.AddMessage("INRIX_route_direction = " + INRIX_route_direction)
+        arcpy.AddMessage("INRIX_query_string = " + INRIX_query_string)
+    else:
+        f = open(TMC_list_file, 'r')
+        str1 = f.read()
+        str2 = str1.replace('\n', '')
+        INRIX_query_string = "tmc IN (" + str2 + ")"
+        arcpy.AddMessage("Using specified list of TMCs.")
+        arcpy.AddMessage("INRIX_query_string = " + INRIX_query_string)
+    # end_if
 
+    # OUTPUT DATA: Event tables and CSV file
+
+    # Full paths of geodatabases in which event tables are written.
+    # If a work_dir was specified, these are written there (creating them if necessary), rather than in base_dir;
+    # this allows several routes to be processed concurrently without contending for the same geodatabases.
+    #
+    gdb_dir = work_dir if work_dir else base_dir
+    tmc_event_table_gdb = gdb_dir + "\\tmc_events.gdb"
+    speed_limit_event_table_gdb = gdb_dir + "\\speed_limit_events.gdb"
+    num_lanes_event_table_gdb = gdb_dir + "\\num_lanes_events.gdb"
+    if work_dir:
+        for gdb in ([tmc_event_table_gdb] if export_tmc_events else []) + [speed_limit_event_table_gdb, num_lanes_event_table_gdb]:
+            if not arcpy.Exists(gdb):
+                arcpy.CreateFileGDB_management(work_dir, os.path.basename(gdb))
+            # end_if
+        # for
+    # end_if
 
-# Names of fields (i.e., attributes) read in from the TMC FC
-tmc_fc_fieldnames = ['tmc', 'tmctype','roadnum', 'firstnm', 'direction', 'shape@']
-# Indices in the vector of fields (i.e., attributes) read in from the TMC FC
-tmc_feat_tmc_id_ix = 0;  tmc_feat_tmctype_ix = 1; tmc_feat_roadnum_ix = 2; tmc_feat_firstnm_ix = 3; 
-tmc_feat_direction_ix = 4; tmc_feat_shape_ix = 5
+    # Full path of directory in which intermediate event table is written,
+    # in columnar form and (optionally) as a CSV file
+    # 
+    output_csv_dir_1 = base_dir + "\\csv_intermediate"
+    # Full path of directory in which final (i.e., post-processed) CSV file is written
+    #
+    output_csv_dir_2 = base_dir + "\\csv_final"
+
+    # Names of generated event tables and intermediate CSV file
+    #
+    base_table_name = MassDOT_route_id.lower().replace(' ','_')
+    # Raw (i.e., unsorted) TMC event table name
+    tmc_event_table_name_raw = base_table_name + "_events_tmc_raw"
+    # Sorted TMC event table name
+    tmc_event_table_name = base_table_name + "_events_tmc"
+    speed_limit_event_table_name = base_table_name + "_events_speedlimit"
+    num_lanes_event_table_name = base_table_name + "_events_nlanes"
+    # Note that the FINAL (overlaid) events are written out as the INTERMEDIATE CSV file.
+    # Subsequent processing (by process_csv_file.py) writes out the FINAL CSV file.
+    output_csv_file_name_1 = base_table_name + "_events_output.csv"
+    output_columnar_name_1 = base_table_name + "_events_output_columns"
+    output_csv_file_name_2 = base_table_name + "_events_final.csv"
+
+    # Full paths of generated event tables
+    #
+    # Raw (i.e., unsorted) TMC event table
+    tmc_event_table_raw = tmc_event_table_gdb + "\\" + tmc_event_table_name_raw
+    # Sorted TMC event table
+    tmc_event_table = tmc_event_table_gdb + "\\" + tmc_event_table_name 
+    speed_limit_event_table = speed_limit_event_table_gdb + "\\" + speed_limit_event_table_name
+    num_lanes_event_table = num_lanes_event_table_gdb + "\\" + num_lanes_event_table_name
+
+    # Full path of generated intermediate CSV file
+    #
+    output_csv_1 = output_csv_dir_1 + "\\" + output_csv_file_name_1
+    # Full path of generated intermediate columnar event table directory
+    output_columnar_1 = output_csv_dir_1 + "\\" + output_columnar_name_1
+    #
+    # Full path of generated final CSV file
+    output_csv_2 = output_csv_dir_2 + "\\" + output_csv_file_name_2
+
+    # Processing, per se, begins here
+    #
+    # Each stage's output is cached under a key computed from the stage's inputs (see stage_cache.py):
+    # the route geometry, the TMC selection, a stamp identifying the snapshot of each input data source,
+    # the stage's parameters, and the keys of the stages upon which it depends. A stage whose key
+    # matches that of a cached output is skipped, unless force is True. In particular, when only the list of
+    # TMCs for a route changes, the town, speed limit, and number of lanes events are taken from the cache.
+
+    # Make Feature Layer "INRIX_TMCS": from INRIX TMCs, select TMCs using the INRIX_query_string
+    with run_report.timed_stage(rpt, 'make_tmc_layer'):
+        arcpy.MakeFeatureLayer_management(INRIX_MASSACHUSETTS_TMC_2019, INRIX_TMCS, INRIX_query_string, 
+                                          "", "objectid objectid HIDDEN NONE;tmc tmc VISIBLE NONE;tmctype tmctype VISIBLE NONE;linrtmc linrtmc HIDDEN NONE;frc frc VISIBLE NONE;lenmiles lenmiles VISIBLE NONE;strtlat strtlat HIDDEN NONE;strtlong strtlong HIDDEN NONE;endlat endlat HIDDEN NONE;endlong endlong HIDDEN NONE;roadnum roadnum VISIBLE NONE;roadname roadname VISIBLE NONE;firstnm firstnm VISIBLE NONE;direction direction VISIBLE NONE;country country HIDDEN NONE;state state HIDDEN NONE;zipcode zipcode HIDDEN NONE;shape shape HIDDEN NONE;st_length(shape) st_length(shape) HIDDEN NONE")
+    # with
+
+    # Make Feature Layer "Selected_LRSN_Route": from MASSDOT LRSN_Routes select route with MassDOT_route_id
+    with run_report.timed_stage(rpt, 'make_route_layer'):
+        arcpy.MakeFeatureLayer_management(MASSDOT_LRSN_Routes_19Dec2019, Selected_LRSN_Route, MassDOT_route_query_string, 
+                                           "", "objectid objectid HIDDEN NONE;from_date from_date HIDDEN NONE;to_date to_date HIDDEN NONE;route_system route_system HIDDEN NONE;route_number route_number HIDDEN NONE;route_direction route_direction HIDDEN NONE;route_id route_id VISIBLE NONE;route_type route_type VISIBLE NONE;route_qualifier route_qualifier HIDDEN NONE;alternate_route_number alternate_route_number HIDDEN NONE;created_by created_by HIDDEN NONE;date_created date_created HIDDEN NONE;edited_by edited_by HIDDEN NONE;date_edited date_edited HIDDEN NONE;globalid globalid HIDDEN NONE;shape shape HIDDEN NONE;st_length(shape) st_length(shape) HIDDEN NONE")
+    # with
+
+    # Indices in the vector of fields (i.e., attributes) to be read in from the LRSN route FC
+    route_feat_route_id_ix = 0; route_feat_shape_ix = 1
+    #
+    # Get the geometry of the selected LRSN route
+    with run_report.timed_stage(rpt, 'read_route') as st:
+        # Arrays of route segments (with M-values) used by the TMC locator: taken from the route store if it is current,
+        # sparing the construction of the route's arcpy geometry object, otherwise from the route feature
+        stored_segs = route_store.load_route_segments(route_store_dir, stage_cache.source_stamp(MASSDOT_LRSN_Routes_19Dec2019),
+                                                      [MassDOT_route_id])
+        if stored_segs and MassDOT_route_id in stored_segs:
+            route_sc = arcpy.da.SearchCursor(Selected_LRSN_Route, ['route_id'])
+            route_feat = route_sc.next()
+            del route_sc
+            route_segs = stored_segs[MassDOT_route_id]
+        else:
+            route_sc = arcpy.da.SearchCursor(Selected_LRSN_Route, ['route_id', 'shape@'])
+            route_feat = route_sc.next()
+            del route_sc
+            route_segs = tmc_locator.route_segments(get_route_parts(route_feat[route_feat_shape_ix]))
+        # end_if
+        st['rows_out'] = len(route_segs['x0'])
+    # with
+    route_key = stage_cache.cache_key('route', [route_feat[route_feat_route_id_ix], 
+                                                [route_segs[k] for k in ['x0', 'y0', 'm0', 'x1', 'y1', 'm1']]])
+
+    # Names of fields (i.e., attributes) read in from the TMC FC
+    tmc_fc_fieldnames = ['tmc', 'tmctype','roadnum', 'firstnm', 'direction', 'shape@']
+    # Indices in the vector of fields (i.e., attributes) read in from the TMC FC
+    tmc_feat_tmc_id_ix = 0;  tmc_feat_tmctype_ix = 1; tmc_feat_roadnum_ix = 2; tmc_feat_firstnm_ix = 3; 
+    tmc_feat_direction_ix = 4; tmc_feat_shape_ix = 5
+
+    # Names of output event table fields
+    et_fieldnames = ['route_id', 'from_meas', 'to_meas', 'tmc', 'tmctype', 'roadnum', 'firstnm', 'direction']
+
+    # Read the selected TMC features, which are to be located on the selected route feature,
+    # and collect their attributes and the coordinates of their first and last points.
+    #
+    tmc_attrs = []
+    tmc_from_x = []; tmc_from_y = []; tmc_to_x = []; tmc_to_y = []
+    with run_report.timed_stage(rpt, 'read_tmcs') as st:
+        for tmc_feat in arcpy.da.SearchCursor(INRIX_TMCS, tmc_fc_fieldnames):
+            tmc_attrs.append(list(tmc_feat[:tmc_feat_shape_ix]))
+            tmc_from_x.append(tmc_feat[tmc_feat_shape_ix].firstPoint.X)
+            tmc_from_y.append(tmc_feat[tmc_feat_shape_ix].firstPoint.Y)
+            tmc_to_x.append(tmc_feat[tmc_feat_shape_ix].lastPoint.X)
+            tmc_to_y.append(tmc_feat[tmc_feat_shape_ix].lastPoint.Y)
+        # for tmc_feat
+        st['rows_out'] = len(tmc_attrs)
+    # with
+    run_report.count(rpt, 'tmcs_selected', len(tmc_attrs))
+    tmc_key = stage_cache.cache_key('tmc_events', [route_key, tmc_attrs, tmc_from_x, tmc_from_y, tmc_to_x, tmc_to_y])
+
+    # Stage: generate TMC events
+    # Return value: dict with the fields 'events' (list of TMC events), 'zero_length' (number of zero-length events discarded),
+    #               and 'clamped' (number of TMCs for which a measure was forced to the beginning or end of the route)
+    #
+    def generate_tmc_events():
+        arcpy.AddMessage("Generating TMC events.")
+        # Generate TMC events: "locate" TMCs along MassDOT routes
+        #
+        # NOTE: We found that the out-of-the-box ESRI 'Locate Features Along Routes' doesn't quite do the job we need.
+        #       The original code using the ESRI tool is reatained here as a comment, for reference.
+        #      The code we implmented to perform locating TMC events along the MassDOT routes is found below.
+        #
+        # *** Beginning of original code:
+        #
+        # Locate Features Along Routes: locate selected TMCs along selected MassDOT route
+        # Output is: tmc_event_table
+        # Note: An XY tolerance of ***40*** meters was found to be necessary some cases, e.g., I-95 @ new bridge over Merrimack River.
+        # tmc_event_table_properties = "route_id LINE from_meas to_meas"
+        # arcpy.LocateFeaturesAlongRoutes_lr(INRIX_TMCS, Selected_LRSN_Route, "route_id", XY_tolerance + " Meters", tmc_event_table, 
+        #                                    tmc_event_table_properties, "FIRST", "DISTANCE", "ZERO", "FIELDS", "M_DIRECTON")
+        # Delete un-needed fields from tmc_event_table
+        # arcpy.DeleteField_management(tmc_event_table, "linrtmc;frc;lenmiles;strtlat;strtlong;endlat;endlong;roadname;country;state;zipcode")
+        #
+        # *** End of original code
+        #
+        # *** Beginning of replacement code:
+        #
+        # Locate all the TMCs along the selected route in one call.
+        # If the M-value of the "projected" point lies beyond either the beginning or the end of the route,
+        # it is forced to the M-value of the beginning of the route (0.0) or to the M-value of the end of the route, respectively.
+        with run_report.timed_stage(rpt, 'tmc_events.locate', len(tmc_attrs)):
+            located = tmc_locator.locate_tmcs(route_segs, tmc_from_x, tmc_from_y, tmc_to_x, tmc_to_y)
+        # with
+        zero_length = 0
+
+        # In-memory TMC events, used as input to the overlay
+        tmc_events = []
+
+        for i, attrs in enumerate(tmc_attrs):
+            tmc_id = attrs[tmc_feat_tmc_id_ix]
+            from_meas = float(located['from_meas'][i])
+            to_meas = float(located['to_meas'][i])
+        
+            # debug/trace
+            # print 'Processing ' + tmc_id + ', ' + str(from_meas) + ', ' + str(to_meas)      
+           
+            # Do not write out zero-length events
+            if located['keep'][i]:
+                roh = [route_feat[route_feat_route_id_ix], from_meas, to_meas, 
+                       attrs[tmc_feat_tmc_id_ix], attrs[tmc_feat_tmctype_ix], 
+                       attrs[tmc_feat_roadnum_ix], attrs[tmc_feat_firstnm_ix], attrs[tmc_feat_direction_ix]]   
+                tmc_events.append(dict(zip(et_fieldnames, roh)))
+                arcpy.AddMessage('Inserted event: ' + tmc_id + ', ' + str(from_meas) + ', ' + str(to_meas))
+            else:
+                # Zero-length event
+                zero_length += 1
+                arcpy.AddMessage('Discarded zero-length event: ' + tmc_id + ', ' + str(from_meas) + ', ' + str(to_meas))
+            # if
+        # for
+
+        # If requested, also write the TMC events to the tmc_events geodatabase, for inspection:
+        # a copy of the "template" TMC event table receives the raw (unsorted) events,
+        # which are then sorted in ascending order on the 'from_meas' field
+        if export_tmc_events:
+            with run_report.timed_stage(rpt, 'tmc_events.export', len(tmc_events)):
+                arcpy.CreateTable_management(tmc_event_table_gdb, tmc_event_table_name_raw, tmc_template_event_table)
+                # "Insert" cursor for output event table
+                out_csr = arcpy.da.InsertCursor(tmc_event_table_raw, et_fieldnames)
+                for ev in tmc_events:
+                    out_csr.insertRow([ev[fieldname] for fieldname in et_fieldnames])
+                # for
+                # Close the insert cursor - not exactly the best choice of API name!
+                del out_csr
+                arcpy.Sort_management(tmc_event_table_raw, tmc_event_table, [["from_meas", "ASCENDING"]])
+            # with
+        # end_if
+        #
+        #
+        # *** End of replacement code for 'Locate Features Along Routes'
+        return { 'events' : tmc_events, 'zero_length' : zero_length, 'clamped' : int(located['clamped'].sum()) }
+    # def generate_tmc_events()
+
+    # Stage: generate town events
+    #
+    def generate_town_events():
+        arcpy.AddMessage("Generating town events.")
+        # Generate town events: locate the town polygons along the MassDOT route
+        #
+        # NOTE: The town events were originally generated by locating the statewide towns_pb layer along the route with
+        #       the ESRI 'Locate Features Along Routes' tool. The original code is retained here as a comment, for reference.
+        #       They are now generated by town_events.locate_towns, which computes the measures at which the route crosses
+        #       the town boundaries directly, using town polygons prepared once per process.
+        #
+        # *** Beginning of original code:
+        #
+        # Locate Features Along Routes: locate towns_pb (political boundaries) along selected MassDOT route
+        # output is: town_event_table
+        # town_event_table_properties = "route_id LINE from_meas to_meas"
+        # arcpy.LocateFeaturesAlongRoutes_lr(towns_pb_r, Selected_LRSN_Route, "route_id", "0 Meters", town_event_table, town_event_table_properties, 
+        #                                    "FIRST", "DISTANCE", "NO_ZERO", "FIELDS", "M_DIRECTON")
+        # Delete un-needed fields from town_event_table
+        # arcpy.DeleteField_management(town_event_table, "shape_leng;boundary_link_id")
+        # return read_event_table(town_event_table, ['town', 'town_id'])
+        #
+        # *** End of original code
+        #
+        with run_report.timed_stage(rpt, 'town_events.prepare_polygons'):
+            prepared = get_prepared_town_polygons(towns_pb_r, cache_dir, force)
+        # with
+        with run_report.timed_stage(rpt, 'town_events.locate', len(route_segs['x0'])) as st:
+            retval = town_locator.locate_towns(prepared, route_segs, route_feat[route_feat_route_id_ix])
+            st['rows_out'] = len(retval)
+        # with
+        return retval
+    # def generate_town_events()
+
+    # Stage: generate speed limit events
+    #
+    def generate_speed_limit_events():
+        arcpy.AddMessage("Generating speed limit events.")
+
+        # Make Feature Layer "Speed_Limit_Layer": 
+        with run_report.timed_stage(rpt, 'speed_limit_events.make_layer'):
+            arcpy.MakeFeatureLayer_management(LRSE_Speed_Limit, Speed_Limit_Layer, "to_date IS NULL", "", "objectid objectid HIDDEN NONE;from_date from_date HIDDEN NONE;to_date to_date HIDDEN NONE;event_id event_id HIDDEN NONE;route_id route_id VISIBLE NONE;from_measure from_measure VISIBLE NONE;to_measure to_measure VISIBLE NONE;speed_lim speed_lim VISIBLE NONE;op_dir_sl op_dir_sl VISIBLE NONE;created_by created_by HIDDEN NONE;date_created date_created HIDDEN NONE;edited_by edited_by HIDDEN NONE;date_edited date_edited HIDDEN NONE;locerror locerror HIDDEN NONE;globalid globalid HIDDEN NONE;regulation regulation HIDDEN NONE;amendment amendment HIDDEN NONE;time_per time_per HIDDEN NONE;shape shape HIDDEN NONE;st_length(shape) st_length(shape) HIDDEN NONE")
+        # with
+
+        # Select Layer By Location: from Speed_Limit_Layer, select records that lie WITHIN the Selected_LRSN_Route
+        with run_report.timed_stage(rpt, 'speed_limit_events.select_by_location'):
+            arcpy.SelectLayerByLocation_management(Speed_Limit_Layer, "WITHIN", Selected_LRSN_Route, "", "NEW_SELECTION", "NOT_INVERT")
+        # with
+        #
+        # Attribute-based selection to replace the above spatial selection, if needed
+        # arcpy.SelectLayerByAttribute_management(Speed_Limit_Layer, "NEW_SELECTION", MassDOT_route_query_string)
+
+        # Locate Features Along Routes: locate records in Speed_Limit_Layer along the Selected_LRSN_Route
+        # output is: speed_limit_event_table
+        speed_limit_event_table_properties = "route_id LINE from_meas to_meas"
+        with run_report.timed_stage(rpt, 'speed_limit_events.locate_features'):
+            arcpy.LocateFeaturesAlongRoutes_lr(Speed_Limit_Layer, Selected_LRSN_Route, "route_id", "0.0002 Meters", speed_limit_event_table, speed_limit_event_table_properties, 
+                                               "FIRST", "DISTANCE", "ZERO", "FIELDS", "M_DIRECTON")
+        # with
+
+        # Delete un-needed fields from speed_limit_event_table
+        with run_report.timed_stage(rpt, 'speed_limit_events.delete_fields'):
+            arcpy.DeleteField_management(speed_limit_event_table, "from_date;to_date;event_id;route_id2;from_measure;to_measure;op_dir_sl;created_by;date_created;edited_by;date_edited;locerror;globalid;regulation;amendment;time_per")
+        # with
+        return read_event_table(speed_limit_event_table, ['speed_lim'])
+    # def generate_speed_limit_events()
+
+    # Stage: generate number of lanes events
+    #
+    def generate_num_lanes_events():
+        arcpy.AddMessage("Generating number-of-lanes events.")
+
+        # Make Feature Layer: "Num_Lanes_Layer" (number of travel lanes layer)
+        with run_report.timed_stage(rpt, 'num_lanes_events.make_layer'):
+            arcpy.MakeFeatureLayer_management(LRSE_Number_Travel_Lanes, Num_Lanes_Layer, "to_date IS NULL", "", "objectid objectid HIDDEN NONE;from_date from_date HIDDEN NONE;to_date to_date HIDDEN NONE;event_id event_id HIDDEN NONE;route_id route_id VISIBLE NONE;from_measure from_measure VISIBLE NONE;to_measure to_measure VISIBLE NONE;num_lanes num_lanes VISIBLE NONE;opp_lanes opp_lanes HIDDEN NONE;created_by created_by HIDDEN NONE;date_created date_created HIDDEN NONE;edited_by edited_by HIDDEN NONE;date_edited date_edited HIDDEN NONE;locerror locerror HIDDEN NONE;globalid globalid HIDDEN NONE;shape shape VISIBLE NONE;st_length(shape) st_length(shape) VISIBLE NONE")
+        # with
+
+        # Select Layer By Location: from Num_Lanes_Layer select records that lie WITHIN Selected_LRSN_Route
+        with run_report.timed_stage(rpt, 'num_lanes_events.select_by_location'):
+            arcpy.SelectLayerByLocation_management(Num_Lanes_Layer, "WITHIN", Selected_LRSN_Route, "", "NEW_SELECTION", "NOT_INVERT")
+        # with
+        #
+        # Attribute-based selection to replace the above spatial selection, if needed
+        # arcpy.SelectLayerByAttribute_management(Num_Lanes_Layer, "NEW_SELECTION", MassDOT_route_query_string)
+
+        # Locate Features Along Routes: locate records in Num_Lanes_Layer along the selected LRSN_Route
+        # output is: num_lanes_event_table
+        num_lanes_event_table_properties = "route_id LINE from_meas to_meas"
+        with run_report.timed_stage(rpt, 'num_lanes_events.locate_features'):
+            arcpy.LocateFeaturesAlongRoutes_lr(Num_Lanes_Layer, Selected_LRSN_Route, "route_id", "0.0002 Meters", num_lanes_event_table, num_lanes_event_table_properties, 
+                                               "FIRST", "DISTANCE", "ZERO", "FIELDS", "M_DIRECTON")
+        # with
+
+        # Delete un-needed fields frm num_lanes_event_table
+        with run_report.timed_stage(rpt, 'num_lanes_events.delete_fields'):
+            arcpy.DeleteField_management(num_lanes_event_table, "from_date;to_date;event_id;route_id2;from_measure;to_measure;opp_lanes;created_by;date_created;edited_by;date_edited;locerror;globalid")
+        # with
+        return read_event_table(num_lanes_event_table, ['num_lanes'])
+    # def generate_num_lanes_events()
+
+    # Run (or retrieve the cached output of) a stage, recording its timing, row counts, and whether it was cached
+    def run_stage(stage_name, key, compute, rows_in=None):
+        info = {}
+        with run_report.timed_stage(rpt, stage_name, rows_in) as st:
+            retval = stage_cache.cached_stage(cache_dir, stage_name, key, compute, force, arcpy.AddMessage, info)
+            st['cached'] = info['cached']
+            st['rows_out'] = len(retval['events']) if isinstance(retval, dict) else len(retval)
+        # with
+        return retval
+    # def run_stage()
+
+    tmc_stage_output = run_stage('tmc_events', tmc_key, generate_tmc_events, len(tmc_attrs))
+    tmc_events = tmc_stage_output['events']
+    run_report.count(rpt, 'zero_length_tmc_events_discarded', tmc_stage_output['zero_length'])
+    run_report.count(rpt, 'clamped_tmc_measures', tmc_stage_output['clamped'])
+
+    town_key = stage_cache.cache_key('town_events', [route_key, stage_cache.source_stamp(towns_pb_r), "locate_towns", 1.0e-8])
+    town_events = run_stage('town_events', town_key, generate_town_events)
+
+    speed_limit_key = stage_cache.cache_key('speed_limit_events', [route_key, stage_cache.source_stamp(LRSE_Speed_Limit), 
+                                                                   "to_date IS NULL", "WITHIN", "0.0002 Meters", "ZERO"])
+    speed_limit_events = run_stage('speed_limit_events', speed_limit_key, generate_speed_limit_events)
+
+    num_lanes_key = stage_cache.cache_key('num_lanes_events', [route_key, stage_cache.source_stamp(LRSE_Number_Travel_Lanes), 
+                                                               "to_date IS NULL", "WITHIN", "0.0002 Meters", "ZERO"])
+    num_lanes_events = run_stage('num_lanes_events', num_lanes_key, generate_num_lanes_events)
+
+    # HERE: The TMC, town, speed limit, and number of lanes events have been generated.
+    #       Overlay all four of them.
+    #
+    # NOTE: The overlays were originally performed using three calls to arcpy.OverlayRouteEvents_lr (UNION), 
+    #       each of which wrote its output to a separate geodatabase (overlay_1.gdb, overlay_2.gdb, overlay_3.gdb).
+    #       They are now performed in memory by overlay_events.union_overlay, which produces the same pieces;
+    #       overlay_events.overlay_route_events performs all three, followed by the cleanup operations described below,
+    #       running each of them as a stage here.
+    overlay_1_key = stage_cache.cache_key('overlay_1', [tmc_key, town_key])
+    overlay_2_key = stage_cache.cache_key('overlay_2', [overlay_1_key, speed_limit_key])
+    overlay_3_key = stage_cache.cache_key('overlay_3', [overlay_2_key, num_lanes_key])
+    output_prep_key = stage_cache.cache_key('output_prep', [overlay_3_key, bool(TMC_list_file)])
+    overlay_keys = { 'overlay_1' : overlay_1_key, 'overlay_2' : overlay_2_key, 'overlay_3' : overlay_3_key,
+                     'output_prep' : output_prep_key }
+
+    def run_overlay_stage(stage_name, compute, rows_in):
+        arcpy.AddMessage("Generating " + stage_name + ".")
+        return run_stage(stage_name, overlay_keys[stage_name], compute, rows_in)
+    # def run_overlay_stage()
+
+    # Once overlay #3 has been generated, miscellaneous cleanup operations are performed (the 'output_prep' stage):
+    #
+    # The MassDOT routes and events layers use TOWNS_POLYM to define town boundaries. We're using towns_pb instead (in order to inlcude water, etc. in town boundaries.)
+    # There is a slight difference between these, which results in an occasional overlay event with a TOWN_ID of zero. These are removed.
+    #
+    # If a list of TMCs was specified as an input parameter, it's all but certain that some portions of the
+    # indicated route will have no TMC located along it. In this case, all records where tmc = '' are removed.
+    #
+    # Roads and Highways allows (among other things) events with measure values < 0. In particular, we are concerned with from_measure values < 0.
+    # These are cleaned up by setting the relevant from_measures to 0.
+    #
+    # Finally, zero-length records (i.e., records for which from_meas == to_meas), if any, are removed,
+    # the remaining records are sorted in ascending order on from_meas and tmc, and a "calc_len" (calculated length)
+    # field is added to each record.
+    output_stage_output = overlay_events.overlay_route_events(tmc_events, town_events, speed_limit_events, num_lanes_events,
+                                                              bool(TMC_list_file), run_overlay_stage)
+    output_events = output_stage_output['events']
+    count_output_events(rpt, output_stage_output)
+
+    # Write the output events as a columnar event table, which is read by phase 2 with no parsing,
+    # and export them to a CSV file, if requested.
+    # (This was originally done by exporting the "output_prep" geodatabase table to a CSV file with arcpy.TableToTable_conversion.)
+    arcpy.AddMessage("Writing output event table in columnar form.")
+    write_output_events(rpt, output_events, output_columnar_1, output_csv_1, export_csv)
+
+    arcpy.AddMessage("Finished executing phase 1: " + MassDOT_route_id + ". Intermediate output is in: " + output_columnar_1)
+
+    arcpy.AddMessage("Post-processing CSV file.")
+    # Note that a TMC appears in problem_tmcs once for each attribute for which it has no usable value
+    problem_tmcs = []
+    with run_report.timed_stage(rpt, 'post_processing', len(output_events)) as st:
+        st['rows_out'] = process_csv_file.main_routine(output_csv_dir_1, output_columnar_name_1, output_csv_dir_2, output_csv_file_name_2,
+                                                       out_problem_tmcs=problem_tmcs)
+    # with
+    run_report.count(rpt, 'output_records', st['rows_out'])
+    rpt['details']['problem_tmcs'] = problem_tmcs
+    run_report.count(rpt, 'problem_tmcs', len(set(problem_tmcs)))
+    arcpy.AddMessage("Finished executing phase 2: " + MassDOT_route_id + ". Final output is in: " + output_csv_dir_2 + "\\" + output_csv_file_name_2)
+
+    # Delete the layers created above, so that this routine can be called again (for another route) in the same process
+    with run_report.timed_stage(rpt, 'delete_layers'):
+        for lyr in [INRIX_TMCS, Selected_LRSN_Route, Speed_Limit_Layer, Num_Lanes_Layer]:
+            if arcpy.Exists(lyr):
+                arcpy.Delete_management(lyr)
+            # end_if
+        # for
+    # with
+
+    # Discard the least-recently-used cache entries, if the cache has grown too large
+    if cache_dir:
+        with run_report.timed_stage(rpt, 'evict_cache'):
+            stage_cache.evict(cache_dir, stage_cache_max_bytes, stage_cache_max_age_days)
+        # with
+    # end_if
 
-# Names of output event table fields
-et_fieldnames = ['route_id', 'from_meas', 'to_meas', 'tmc', 'tmctype', 'roadnum', 'firstnm', 'direction']
-# Indices of fields in output event table (actually, this isn't needed)
-et_route_id_ix = 0; et_from_meas_ix = 1; et_to_meas_ix = 2; et_tmc_ix = 3; 
-et_tmctype_ix = 4; et_roadnum_ix = 5; et_firstnm_ix = 6; et_direction_ix = 7
+    # Write the run report
+    wall_sec, cpu_sec = run_report.total_time(rpt)
+    arcpy.AddMessage("Total time: " + str(round(wall_sec, 1)) + " sec (CPU: " + str(round(cpu_sec, 1)) + " sec).")
+    if report_dir:
+        arcpy.AddMessage("Run report is in: " + run_report.write_run_report(rpt, report_dir))
+    # end_if
 
-# "Insert" cursor for output event table
-out_csr = arcpy.da.InsertCursor(tmc_event_table_raw, et_fieldnames)
+    return output_csv_2
+# def conflate_route()
 
-# Loop over the selected TMC features, which are to be located on the selected route feature
-#
-for tmc_feat in arcpy.da.SearchCursor(INRIX_TMCS, tmc_fc_fieldnames):
-    tmc_id = tmc_feat[tmc_feat_tmc_id_ix]
- 
-    tmc_feat_fromPoint = tmc_feat[tmc_feat_shape_ix].firstPoint
-    tmc_feat_toPoint = tmc_feat[tmc_feat_shape_ix].lastPoint
-
-    projected_fromPtGeom = route_feat[route_feat_shape_ix].queryPointAndDistance(tmc_feat_fromPoint)
-    projected_toPtGeom = route_feat[route_feat_shape_ix].queryPointAndDistance(tmc_feat_toPoint)
-
-    # If the M-value of the "projected" point lies beyond either the beginning or the end of the route,
-    # force it to the M-value of the beginning of the route (0.0) or to route_feat_last_m_value, respectively.
-    if projected_fromPtGeom[0].firstPoint.M >= 0.0:
-        from_meas = projected_fromPtGeom[0].firstPoint.M if (projected_fromPtGeom[0].firstPoint.M <= route_feat_last_m_value) else route_feat_last_m_value
-    else:
-        from_meas = 0.0
+# Script parameters
+if __name__ == '__main__':
+    # First parameter, MassDOT route_id is REQUIRED
+    MassDOT_route_id = arcpy.GetParameterAsText(0)
+    if MassDOT_route_id == '#' or not MassDOT_route_id:
+        MassDOT_route_id = "I95 NB"
     # end_if
     
-    if projected_toPtGeom[0].firstPoint.M >= 0.0:
-        to_meas = projected_toPtGeom[0].firstPoint.M if (projected_toPtGeom[0].firstPoint.M <= route_feat_last_m_value) else route_feat_last_m_value
-    else:
-        to_meas = 0.0
-    # end_if
+    # Second parameter, indicating a file containing a specific list of TMCs, is OPTIONAL    
+    TMC_list_file = arcpy.GetParameterAsText(1)
     
-    # OLD CODE:
-    # from_meas = projected_fromPtGeom[0].firstPoint.M if (projected_fromPtGeom[0].firstPoint.M >= 0.0) else 0.0
-    # to_meas = projected_toPtGeom[0].firstPoint.M if (projected_toPtGeom[0].firstPoint.M >= 0.0) else 0.0
+    # Third parameter, XY tolerance for locating TMC events, is OPTIONAL; it defaults to 10 (meters).
+    # Change: 2/12/2020: removed this parameter.
+    # XY_tolerance = TMC_list_file = arcpy.GetParameterAsText(2)
+    # if XY_tolerance == '#' or not XY_tolerance:
+    #    XY_tolerance = '10'
+    #
+    # arcpy.AddMessage("XY tolerance = " + XY_tolerance)
     
-    # debug/trace
-    # print 'Processing ' + tmc_id + ', ' + str(from_meas) + ', ' + str(to_meas)      
-       
-    # Do not write out zero-length events
-    if (from_meas >= 0.0 and to_meas > 0.0) and (from_meas != to_meas):
-        roh = [route_feat[route_feat_route_id_ix], from_meas, to_meas, 
-               tmc_feat[tmc_feat_tmc_id_ix], tmc_feat[tmc_feat_tmctype_ix], 
-               tmc_feat[tmc_feat_roadnum_ix], tmc_feat[tmc_feat_firstnm_ix], tmc_feat[tmc_feat_direction_ix]]   
-        out_csr.insertRow(roh)
-        arcpy.AddMessage('Inserted event: ' + tmc_id + ', ' + str(from_meas) + ', ' + str(to_meas))
-    else:
-        # Zero-length event
-        arcpy.AddMessage('Discarded zero-length event: ' + tmc_id + ', ' + str(from_meas) + ', ' + str(to_meas))
-    # if
-# for tmc_feat
-
-# Close the insert cursor - not exactly the best choice of API name!
-del out_csr 
-arcpy.AddMessage('Closed insert cursor.')
-
-
-# Sort the raw TMC event table in ascending order on the 'from_meas' field
-arcpy.Sort_management(tmc_event_table_raw, tmc_event_table, [["from_meas", "ASCENDING"]])
-#
-#
-# *** End of replacement code for 'Locate Features Along Routes'
-
-arcpy.AddMessage("Generating town events.")
-
-# Locate Features Along Routes: locate towns_pb (political boundaries) along selected MassDOT route
-# output is: town_event_table
-town_event_table_properties = "route_id LINE from_meas to_meas"
-arcpy.LocateFeaturesAlongRoutes_lr(towns_pb_r, Selected_LRSN_Route, "route_id", "0 Meters", town_event_table, town_event_table_properties, 
-                                   "FIRST", "DISTANCE", "NO_ZERO", "FIELDS", "M_DIRECTON")
-                                   
-# Delete un-needed fields from town_event_table
-arcpy.DeleteField_management(town_event_table, "shape_leng;boundary_link_id")                                  
-
-arcpy.AddMessage("Generating overlay #1.")
-                                 
-# HERE: tmc_event_table and town_event_table have been generated.
-#       Generate overlay #1.
-# Overlay Route Events: inputs: overlay tmc_events, town_events
-#                       output: overlay_events_1
-overlay_event_table_1_properties = "route_id LINE from_meas to_meas"
-arcpy.OverlayRouteEvents_lr(tmc_event_table, "route_id LINE from_meas to_meas", 
-                            town_event_table, "route_id LINE from_meas to_meas", "UNION", 
-                            overlay_events_1, overlay_event_table_1_properties, "NO_ZERO", "FIELDS", "INDEX")
-
-# Make Feature Layer "Speed_Limit_Layer": 
-arcpy.MakeFeatureLayer_management(LRSE_Speed_Limit, Speed_Limit_Layer, "to_date IS NULL", "", "objectid objectid HIDDEN NONE;from_date from_date HIDDEN NONE;to_date to_date HIDDEN NONE;event_id event_id HIDDEN NONE;route_id route_id VISIBLE NONE;from_measure from_measure VISIBLE NONE;to_measure to_measure VISIBLE NONE;speed_lim speed_lim VISIBLE NONE;op_dir_sl op_dir_sl VISIBLE NONE;created_by created_by HIDDEN NONE;date_created date_created HIDDEN NONE;edited_by edited_by HIDDEN NONE;date_edited date_edited HIDDEN NONE;locerror locerror HIDDEN NONE;globalid globalid HIDDEN NONE;regulation regulation HIDDEN NONE;amendment amendment HIDDEN NONE;time_per time_per HIDDEN NONE;shape shape HIDDEN NONE;st_length(shape) st_length(shape) HIDDEN NONE")
-
-# Select Layer By Location: from Speed_Limit_Layer, select records that lie WITHIN the Selected_LRSN_Route
-arcpy.SelectLayerByLocation_management(Speed_Limit_Layer, "WITHIN", Selected_LRSN_Route, "", "NEW_SELECTION", "NOT_INVERT")
-#
-# Attribute-based selection to replace the above spatial selection, if needed
-# arcpy.SelectLayerByAttribute_management(Speed_Limit_Layer, "NEW_SELECTION", MassDOT_route_query_string)
-
-arcpy.AddMessage("Generating speed limit events.")
-
-# Locate Features Along Routes: locate records in Speed_Limit_Layer along the Selected_LRSN_Route
-# output is: speed_limit_event_table
-speed_limit_event_table_properties = "route_id LINE from_meas to_meas"
-arcpy.LocateFeaturesAlongRoutes_lr(Speed_Limit_Layer, Selected_LRSN_Route, "route_id", "0.0002 Meters", speed_limit_event_table, speed_limit_event_table_properties, 
-                                   "FIRST", "DISTANCE", "ZERO", "FIELDS", "M_DIRECTON")
-
-# Delete un-needed fields from speed_limit_event_table
-arcpy.DeleteField_management(speed_limit_event_table, "from_date;to_date;event_id;route_id2;from_measure;to_measure;op_dir_sl;created_by;date_created;edited_by;date_edited;locerror;globalid;regulation;amendment;time_per")
-  
-arcpy.AddMessage("Generating overlay #2.")
-  
-# HERE: overlay_events_1 and speed_limit_events have been generated.
-#       Generate overlay #2.
-# Overlay Route Events: inputs: overlay overlay_events_1, speed_limit_events
-#                       output: overlay_events_2
-overlay_event_table_2_properties = "route_id LINE from_meas to_meas"
-arcpy.OverlayRouteEvents_lr(overlay_events_1, "route_id LINE from_meas to_meas", 
-                            speed_limit_event_table, "route_id LINE from_meas to_meas", "UNION", 
-                            overlay_events_2, overlay_event_table_2_properties, "NO_ZERO", "FIELDS", "INDEX")
-
-
-# Make Feature Layer: "Num_Lanes_Layer" (number of travel lanes layer)
-arcpy.MakeFeatureLayer_management(LRSE_Number_Travel_Lanes, Num_Lanes_Layer, "to_date IS NULL", "", "objectid objectid HIDDEN NONE;from_date from_date HIDDEN NONE;to_date to_date HIDDEN NONE;event_id event_id HIDDEN NONE;route_id route_id VISIBLE NONE;from_measure from_measure VISIBLE NONE;to_measure to_measure VISIBLE NONE;num_lanes num_lanes VISIBLE NONE;opp_lanes opp_lanes HIDDEN NONE;created_by created_by HIDDEN NONE;date_created date_created HIDDEN NONE;edited_by edited_by HIDDEN NONE;date_edited date_edited HIDDEN NONE;locerror locerror HIDDEN NONE;globalid globalid HIDDEN NONE;shape shape VISIBLE NONE;st_length(shape) st_length(shape) VISIBLE NONE")
-
-# Select Layer By Location: from Num_Lanes_Layer select records that lie WITHIN Selected_LRSN_Route
-arcpy.SelectLayerByLocation_management(Num_Lanes_Layer, "WITHIN", Selected_LRSN_Route, "", "NEW_SELECTION", "NOT_INVERT")
-#
-# Attribute-based selection to replace the above spatial selection, if needed
-# arcpy.SelectLayerByAttribute_management(Num_Lanes_Layer, "NEW_SELECTION", MassDOT_route_query_string)
-
-arcpy.AddMessage("Generating number-of-lanes events.")
-
-# Locate Features Along Routes: locate records in Num_Lanes_Layer along the selected LRSN_Route
-# output is: num_lanes_event_table
-num_lanes_event_table_properties = "route_id LINE from_meas to_meas"
-arcpy.LocateFeaturesAlongRoutes_lr(Num_Lanes_Layer, Selected_LRSN_Route, "route_id", "0.0002 Meters", num_lanes_event_table, num_lanes_event_table_properties, 
-                                   "FIRST", "DISTANCE", "ZERO", "FIELDS", "M_DIRECTON")
-
-# Delete un-needed fields frm num_lanes_event_table
-arcpy.DeleteField_management(num_lanes_event_table, "from_date;to_date;event_id;route_id2;from_measure;to_measure;opp_lanes;created_by;date_created;edited_by;date_edited;locerror;globalid")
-
-arcpy.AddMessage("Generating overlay #3.")
-
-# HERE: overlay_events_2 and num_lanes event_table have been generated
-#       Generate overlay #3
-# Overlay Route Events: inputs: overlay overlay_events_2, num_lanes_event_table
-#                       output: overlay_events_3
-overlay_event_table_3_properties = "route_id LINE from_meas to_meas"
-arcpy.OverlayRouteEvents_lr(overlay_events_2, "route_id LINE from_meas to_meas", 
-                            num_lanes_event_table, "route_id LINE from_meas to_meas", "UNION", 
-                            overlay_events_3, overlay_event_table_3_properties, "ZERO", "FIELDS", "INDEX")
-
-# HERE: overlay_events_3 has been generated
-#       Perform miscellaneous cleanup operations, and generate intermediate CSV file
-
-# Make Table View of overlay_events_3
-overlay_events_3_View = "overlay_event_table_3_View"
-arcpy.MakeTableView_management(overlay_events_3, overlay_events_3_View, "", "", "objectid objectid VISIBLE NONE;route_id route_id VISIBLE NONE;from_meas from_meas VISIBLE NONE;to_meas to_meas VISIBLE NONE;tmc tmc VISIBLE NONE;tmctype tmctype VISIBLE NONE;roadnum roadnum VISIBLE NONE;firstnm firstnm VISIBLE NONE;direction direction VISIBLE NONE;town town VISIBLE NONE;town_id town_id VISIBLE NONE;st_area_shape_ st_area_shape_ VISIBLE NONE;st_perimeter_shape_ st_perimeter_shape_ VISIBLE NONE;route_id_1 route_id_1 VISIBLE NONE;speed_lim speed_lim VISIBLE NONE;route_id_12 route_id_12 VISIBLE NONE;num_lanes num_lanes VISIBLE NONE;st_length_shape_ st_length_shape_ VISIBLE NONE")
-
-# The MassDOT routes and events layers use TOWNS_POLYM to define town boundaries. We're using towns_pb instead (in order to inlcude water, etc. in town boundaries.)
-# There is a slight difference between these, which results in an occasional overlay event with a TOWN_ID of zero. Remove these.
-#
-# Select records in overlay_events_3 with town_id = 0, delete them, and then clear selection
-arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "NEW_SELECTION", "\"town_id\" = 0")
-arcpy.DeleteRows_management(overlay_events_3_View)
-arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "CLEAR_SELECTION", "")
-
-# If a list of TMCs was specified as an input parameter, it's all but certain that some portions of the
-# indicated route will have no TMC located along it. In this case, delete all records where tmc = ''.
-if TMC_list_file:
-    # Select records in overlay_events_3 with tmc = '', delete them, and then clear selection
-    arcpy.AddMessage("Pruning records with tmc = ''.")
-    arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "NEW_SELECTION", "tmc = ''")
-    arcpy.DeleteRows_management(overlay_events_3_View)
-    arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "CLEAR_SELECTION", "")
+    # Third parameter, "force", is OPTIONAL; if 'true', every stage is re-run, even those whose output is cached.
+    force = arcpy.GetParameterAsText(2).lower() == 'true'
+    
+    # Fourth parameter, "export_tmc_events", is OPTIONAL; if 'true', the TMC events are also written to the tmc_events geodatabase.
+    export_tmc_events = arcpy.GetParameterAsText(3).lower() == 'true'
+    
+    conflate_route(MassDOT_route_id, TMC_list_file, force=force, export_tmc_events=export_tmc_events)
 # end_if
-
-# Roads and Highways allows (among other things) events with measure values < 0. In particular, we are concerned with from_measure values < 0.
-# Clean these up by setting the relevant from_measures to 0.
-#
-# Select records in overlay_events_3 with from_meas < 0, set the from_meas of these records to 0, and clear selection
-arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "NEW_SELECTION", "from_meas < 0")
-arcpy.CalculateField_management(overlay_events_3_View, "from_meas", "0.0", "PYTHON_9.3", "")
-arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "CLEAR_SELECTION", "")
-
-# Remove zero-length records (i.e., records for which from_meas == to_meas), if any
-arcpy.AddMessage("Pruning zero-length records.")
-arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "NEW_SELECTION", "from_meas = to_meas")
-arcpy.DeleteRows_management(overlay_events_3_View)
-arcpy.SelectLayerByAttribute_management(overlay_events_3_View, "CLEAR_SELECTION", "")
-
-
-# Sort the table in ascending order on from_meas, and add a "calc_len" (calculated length) field to each record, 
-# and calculate its value appropriately.
-# output is in output_event_table
-# These operations could be performed in the subsequent processing of the generated CSV file, but we do them here anyway.
-arcpy.Sort_management(overlay_events_3_View, output_event_table, "from_meas ASCENDING;tmc ASCENDING", "UR")
-
-arcpy.AddMessage("Generating output event table.")
-
-# Add a "calc_len" field to output_event_table, and calc it to (to_meas - from_meas)
-arcpy.AddField_management(output_event_table, "calc_len", "DOUBLE", "", "", "", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.CalculateField_management(output_event_table, "calc_len", "!to_meas! - !from_meas!", "PYTHON_9.3", "")
-
-
-arcpy.AddMessage("Exporting output event table to CSV file.")
-
-# Export final_event_table to CSV file
-#
-# Code generated by model:
-arcpy.TableToTable_conversion(output_event_table, output_csv_dir_1, output_csv_file_name_1)
-#
-#
-# ... and if that doesn't work, the following has been known to do so in the past:
-# (Source: http://gis.stackexchange.com/questions/109008/python-script-to-export-csv-tables-from-gdb)
-#
-# fields = arcpy.ListFields(output_event_table)
-# field_names = [field.name for field in fields]
-# with open(output_csv_1,'wb') as f:
-#    w = csv.writer(f)
-#    w.writerow(field_names)
-#    for row in arcpy.SearchCursor(output_event_table):
-#        field_vals = [row.getValue(field.name) for field in fields]
-#        w.writerow(field_vals)
-#    del row
-#
-arcpy.AddMessage("Finished executing phase 1: " + MassDOT_route_id + ". Intermediate output is in: " + output_csv_dir_1 + "\\" + output_csv_file_name_1)
-
-arcpy.AddMessage("Post-processing CSV file.")
-process_csv_file.main_routine(output_csv_dir_1, output_csv_file_name_1, output_csv_dir_2, output_csv_file_name_2)
-arcpy.AddMessage("Finished executing phase 2: " + MassDOT_route_id + ". Final output is in: " + output_csv_dir_2 + "\\" + output_csv_file_name_2)
\ No newline at end of file
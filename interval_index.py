@@ -0,0 +1,187 @@
+# interval_index.py - index of linear-referenced events by route_id and range of measures, for fast range queries
+#
+# The attributes along a route (TMC, town, speed limit, number of lanes) otherwise live only in event tables, so that
+# a question such as "what speed limits and numbers of lanes apply between measures a and b on I93 NB" requires an
+# overlay. An interval index answers such questions directly, for any number of ranges at once.
+#
+# For each route_id, the index holds the route's events sorted on from_meas, together with the running maximum of their
+# to_meas values. The events overlapping a range [lo, hi] are then among those from the first whose running maximum
+# to_meas exceeds lo to the last whose from_meas is less than hi; both bounds are found by binary search, so a query
+# costs O(log N) plus the number of candidates examined.
+#
+# An event overlaps a range if they share a stretch of non-zero length; for a zero-length range (a single measure),
+# an event overlaps it if the measure lies within the event, including at either of its ends. The coverage of an event
+# is the length of the stretch it shares with the range.
+#
+# Usage (for ad-hoc queries): python interval_index.py <event table> <route_id> <from_meas> <to_meas>
+#     <event table> - an intermediate event table, in columnar form (see columnar_events.py) or as a CSV file
+#
+# 10/18/2026
+
+import csv
+import sys
+
+import numpy as np
+
+import columnar_events
+
+# build_interval_index: Build an interval index over a set of events
+#
+# Parameters: route_ids, from_meas, to_meas - sequences of the route_id and measures of each event
+# Return value: dict mapping route_id to dict of arrays, each sorted on from_meas:
+#               from_meas, to_meas - the event's measures (from_meas <= to_meas)
+#               max_to - running maximum of to_meas
+#               event - index of the event in the input
+#
+# An event whose from_meas is greater than its to_meas is indexed as if they were exchanged.
+#
+def build_interval_index(route_ids, from_meas, to_meas):
+    from_meas = np.asarray(from_meas, dtype=np.float64); to_meas = np.asarray(to_meas, dtype=np.float64)
+    lo = np.minimum(from_meas, to_meas); hi = np.maximum(from_meas, to_meas)
+    by_route = {}
+    for i, route_id in enumerate(route_ids):
+        by_route.setdefault(route_id, []).append(i)
+    # for
+    retval = {}
+    for route_id, ixs in by_route.items():
+        ixs = np.array(ixs, dtype=np.int64)
+        order = ixs[np.argsort(lo[ixs], kind='mergesort')]
+        retval[route_id] = { 'from_meas' : lo[order], 'to_meas' : hi[order],
+                             'max_to' : np.maximum.accumulate(hi[order]), 'event' : order }
+    # for
+    return retval
+# def build_interval_index()
+
+# index_events: Build an interval index over a list of event dicts
+#
+# Parameter: events - list of dicts, each with (at least) the fields route_id, from_meas, and to_meas
+# Return value: interval index (see build_interval_index); the 'event' arrays index the list of events
+#
+def index_events(events):
+    return build_interval_index([ev['route_id'] for ev in events], [ev['from_meas'] for ev in events],
+                                [ev['to_meas'] for ev in events])
+# def index_events()
+
+# query_route: Find the events on one route overlapping each of a batch of ranges of measures
+#
+# Parameters: route_index - the entry of an interval index for one route_id
+#             lo, hi - arrays of the lower and upper bounds of the ranges
+# Return value: tuple of three arrays, with one entry for each overlapping (range, event) pair, sorted by range number,
+#               then by the events' from_meas: (range number, event index, coverage)
+#
+def query_route(route_index, lo, hi):
+    lo = np.asarray(lo, dtype=np.float64); hi = np.asarray(hi, dtype=np.float64)
+    point = lo == hi
+    ev_from = route_index['from_meas']; ev_to = route_index['to_meas']
+    # Candidates: from the first event whose running maximum to_meas reaches lo (exceeds it, for a range) ...
+    first = np.where(point, np.searchsorted(route_index['max_to'], lo, 'left'), np.searchsorted(route_index['max_to'], lo, 'right'))
+    # ... up to the last event whose from_meas is less than hi (or equal to it, for a single measure)
+    stop = np.where(point, np.searchsorted(ev_from, hi, 'right'), np.searchsorted(ev_from, hi, 'left'))
+    counts = np.maximum(stop - first, 0)
+    rng = np.repeat(np.arange(len(lo)), counts)
+    pos = np.repeat(first, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    # Not every candidate overlaps its range: the running maximum only bounds the candidates' to_meas from above
+    ok = np.where(point[rng], ev_to[pos] >= lo[rng], ev_to[pos] > lo[rng])
+    rng = rng[ok]; pos = pos[ok]
+    coverage = np.minimum(ev_to[pos], hi[rng]) - np.maximum(ev_from[pos], lo[rng])
+    return rng, route_index['event'][pos], coverage
+# def query_route()
+
+# query_batch: Find the events overlapping each of a batch of ranges of measures, on any number of routes
+#
+# Parameters: index - interval index
+#             route_ids - list of the route_id of each range
+#             from_meas, to_meas - sequences of the bounds of each range
+# Return value: list, with one entry per range (in input order), of lists of (event index, coverage) tuples,
+#               in ascending order of the events' from_meas
+#
+def query_batch(index, route_ids, from_meas, to_meas):
+    from_meas = np.asarray(from_meas, dtype=np.float64); to_meas = np.asarray(to_meas, dtype=np.float64)
+    lo = np.minimum(from_meas, to_meas); hi = np.maximum(from_meas, to_meas)
+    retval = [[] for i in range(len(route_ids))]
+    by_route = {}
+    for i, route_id in enumerate(route_ids):
+        by_route.setdefault(route_id, []).append(i)
+    # for
+    for route_id, ixs in by_route.items():
+        if route_id not in index:
+            continue
+        # end_if
+        ixs = np.array(ixs, dtype=np.int64)
+        rng, event, coverage = query_route(index[route_id], lo[ixs], hi[ixs])
+        for r, e, c in zip(ixs[rng].tolist(), event.tolist(), coverage.tolist()):
+            retval[r].append((e, c))
+        # for
+    # for
+    return retval
+# def query_batch()
+
+# query: Find the events overlapping a single range of measures on a route
+#
+# Parameters: index - interval index
+#             route_id - MassDOT route_id
+#             from_meas, to_meas - bounds of the range
+# Return value: list of (event index, coverage) tuples, in ascending order of the events' from_meas
+#
+def query(index, route_id, from_meas, to_meas):
+    return query_batch(index, [route_id], [from_meas], [to_meas])[0]
+# def query()
+
+# attribute_coverage: Summarize the values of an attribute over each of a batch of ranges of measures
+#
+# Parameters: index - interval index
+#             values - sequence of the value of the attribute for each indexed event
+#             route_ids, from_meas, to_meas - the ranges (see query_batch)
+# Return value: list, with one entry per range, of lists of (value, total coverage) tuples, in order of each value's
+#               first appearance along the range; e.g., [(55, 0.8), (65, 1.2)] for the speed limits of a 2-mile range
+#
+def attribute_coverage(index, values, route_ids, from_meas, to_meas):
+    retval = []
+    for hits in query_batch(index, route_ids, from_meas, to_meas):
+        totals = {}; order = []
+        for e, c in hits:
+            v = values[e]
+            if v not in totals:
+                totals[v] = 0.0
+                order.append(v)
+            # end_if
+            totals[v] += c
+        # for
+        retval.append([(v, totals[v]) for v in order])
+    # for
+    return retval
+# def attribute_coverage()
+
+# load_event_table: Load an intermediate event table, in columnar form or as a CSV file, into a list of dicts
+#
+def load_event_table(path):
+    if columnar_events.is_columnar(path):
+        return columnar_events.columns_to_records(columnar_events.load_columnar(path))
+    # end_if
+    with open(path) as csvfile:
+        retval = [row for row in csv.DictReader(csvfile)]
+    # with
+    for row in retval:
+        row['from_meas'] = float(row['from_meas']); row['to_meas'] = float(row['to_meas'])
+    # for
+    return retval
+# def load_event_table()
+
+def main():
+    if len(sys.argv) != 5:
+        print('Usage: python interval_index.py <event table> <route_id> <from_meas> <to_meas>')
+        return 1
+    # end_if
+    events = load_event_table(sys.argv[1])
+    index = index_events(events)
+    for e, c in query(index, sys.argv[2], float(sys.argv[3]), float(sys.argv[4])):
+        ev = events[e]
+        print(str(ev['from_meas']) + ' - ' + str(ev['to_meas']) + ' (coverage ' + str(round(c, 6)) + '): ' +
+              ', '.join([name + '=' + str(ev[name]) for name in ['tmc', 'town', 'speed_lim', 'num_lanes'] if name in ev]))
+    # for
+    return 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
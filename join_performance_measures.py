@@ -0,0 +1,200 @@
+# join_performance_measures.py - build expressway_performance_measures with a hash join in Python, without a database
+#
+# The rows of expressway_performance_measures are those of the conflated road inventory attributes (one per TMC of each
+# route) that have a row in Inrix_2019_cmp_exp_avg_length, extended by one value from each INRIX CMP metric table
+# (see cmp_metric_tables.py). Rather than importing every table into a database and joining them there (see
+# populate_performance_measures_db.py), this script:
+#     1. Builds the output rows from the road inventory attributes (taken from the final CSV files of the conflation,
+#        or from a CSV export of Inrix_2019_cmp_exp_roadinv_attrib), and one hash index over them, mapping each TMC ID
+#        to its row(s).
+#     2. Streams Inrix_2019_cmp_exp_avg_length through the index, setting distance and lane_miles (distance * num_lanes),
+#        and drops the rows whose TMC it does not contain.
+#     3. Streams each metric table through the index once, setting its column of the rows of each TMC it contains.
+#     4. Writes the rows to a CSV file, and/or to a columnar table directory (see columnar_events.py).
+# Each input table is read exactly once, and only one row of it is held in memory at a time, so that the time taken
+# grows linearly with the number (and size) of the metric tables, and the memory used only with the number of TMCs.
+#
+# Note: The results are those of populate_performance_measures_db.populate_single_pass: a TMC without a row in a
+#       metric table gets an empty (NULL) value for that measure, and if a TMC appears more than once in a metric
+#       table, its last row is used.
+#       In the columnar output, every numeric column (including rid, lanes, and spd_limit) is stored as float64, with
+#       NaN for an empty value, and every text column as a Unicode string, with '' for an empty value.
+#
+# Usage: python join_performance_measures.py --metric-dir <dir> [--final <file or dir>] [--out-csv <file>]
+#                                            [--out-columnar <dir>]
+#     --metric-dir   - directory containing the CSV files of the INRIX CMP metric tables, <table name>.csv
+#     --final        - final CSV file (e.g., csv_final\statewide_events_final.csv) or directory of final CSV files from
+#                      which the road inventory attributes are taken; if omitted, they are read from
+#                      Inrix_2019_cmp_exp_roadinv_attrib.csv in the metric directory
+#     --out-csv      - CSV file to which expressway_performance_measures is written
+#                      (default: expressway_performance_measures.csv in the metric directory)
+#     --out-columnar - directory to which expressway_performance_measures is written as a columnar table
+#
+# 10/18/2026
+
+import argparse
+import os
+import sys
+import time
+
+import cmp_metric_tables as cmp
+
+# Writing the columnar output (see columnar_events.py) requires NumPy; the CSV output can be written without it.
+#
+try:
+    import columnar_events
+    columnar_present = True
+except ImportError:
+    columnar_present = False
+# end_try_except
+
+# Index of each column in a row of expressway_performance_measures
+column_index = dict([(name, i) for i, (name, sql_type) in enumerate(cmp.performance_measures_columns)])
+
+# Columns of expressway_performance_measures taken from the road inventory attributes, and the fields they are taken from
+roadinv_columns = [ ('rid', 'rid'), ('tmc', 'tmc'), ('from_meas', 'from_meas'), ('to_meas', 'to_meas'),
+                    ('route_id', 'route_id'), ('route_num', 'route_num'), ('road_name', 'road_name'),
+                    ('direction', 'direction'), ('seg_begin', 'seg_begin'), ('seg_end', 'seg_end'),
+                    ('community', 'community'), ('lanes', 'num_lanes'), ('spd_limit', 'speed_limit') ]
+
+# build_tmc_index: Build the initial rows of expressway_performance_measures, and a hash index over them
+#
+# Parameter: roadinv_rows - list of dicts, rows of Inrix_2019_cmp_exp_roadinv_attrib
+# Return value: tuple of (rows, index); rows is a list of lists of values, one per road inventory row, in the order of
+#               cmp.performance_measures_columns, with only the road inventory columns set; index is a dict mapping
+#               each TMC ID to the list of its rows
+#
+def build_tmc_index(roadinv_rows):
+    rows = []
+    index = {}
+    positions = [(column_index[column], field) for column, field in roadinv_columns]
+    for rec in roadinv_rows:
+        row = [None] * len(cmp.performance_measures_columns)
+        for i, field in positions:
+            row[i] = rec[field]
+        # for
+        rows.append(row)
+        index.setdefault(rec['tmc'], []).append(row)
+    # for
+    return rows, index
+# def build_tmc_index()
+
+# join_avg_length: Stream Inrix_2019_cmp_exp_avg_length through the TMC index, setting distance and lane_miles
+#
+# Parameters: rows - rows, as returned by build_tmc_index
+#             index - TMC index, as returned by build_tmc_index
+#             metric_dir - full path of the directory containing the CSV files of the tables
+# Return value: list of the rows whose TMC is in Inrix_2019_cmp_exp_avg_length, in their original order
+#               (this is the INNER JOIN of populate_expressway_performance_measures.sql)
+#
+def join_avg_length(rows, index, metric_dir):
+    distance_ix = column_index['distance']; lanes_ix = column_index['lanes']; lane_miles_ix = column_index['lane_miles']
+    matched = set()
+    for tmc_id, value in cmp.iter_keyed_table(metric_dir, cmp.avg_length_table, cmp.avg_length_field):
+        for row in index.get(tmc_id, []):
+            row[distance_ix] = value
+            row[lane_miles_ix] = value * row[lanes_ix] if value is not None and row[lanes_ix] is not None else None
+        # for
+        matched.add(tmc_id)
+    # for
+    tmc_ix = column_index['tmc']
+    return [row for row in rows if row[tmc_ix] in matched]
+# def join_avg_length()
+
+# join_metric_table: Stream one metric table through the TMC index, setting its column of expressway_performance_measures
+#
+# Parameters: index - TMC index, as returned by build_tmc_index
+#             metric_dir - full path of the directory containing the CSV files of the tables
+#             column, table, field - an entry of cmp.metric_tables
+# Return value: number of rows of the metric table read
+#
+def join_metric_table(index, metric_dir, column, table, field):
+    retval = 0
+    i = column_index[column]
+    for tmc_id, value in cmp.iter_keyed_table(metric_dir, table, field):
+        for row in index.get(tmc_id, []):
+            row[i] = value
+        # for
+        retval += 1
+    # for
+    return retval
+# def join_metric_table()
+
+# join_performance_measures: Build the rows of expressway_performance_measures
+#
+# Parameters: roadinv_rows - list of dicts, rows of Inrix_2019_cmp_exp_roadinv_attrib
+#             metric_dir - full path of the directory containing the CSV files of the tables
+# Return value: tuple of (rows, counts); rows is a list of lists of values, in the order of cmp.performance_measures_columns,
+#               counts a dict mapping the name of each table streamed to the number of its rows read
+#
+def join_performance_measures(roadinv_rows, metric_dir):
+    rows, index = build_tmc_index(roadinv_rows)
+    rows = join_avg_length(rows, index, metric_dir)
+    # Rows dropped by join_avg_length are still in the index, but are never output
+    counts = {}
+    for column, table, field in cmp.metric_tables:
+        counts[table] = join_metric_table(index, metric_dir, column, table, field)
+    # for
+    return rows, counts
+# def join_performance_measures()
+
+# write_performance_measures_columnar: Write the rows of expressway_performance_measures as a columnar table directory
+#
+# Parameters: out_dir - full path of the directory to be written
+#             rows - list of lists of values, in the order of cmp.performance_measures_columns
+# Return value: none
+#
+def write_performance_measures_columnar(out_dir, rows):
+    columns = [(name, None if sql_type == 'TEXT' else '<f8') for name, sql_type in cmp.performance_measures_columns]
+    nan = float('nan')
+    empty = [('' if dtype is None else nan) for name, dtype in columns]
+    names = [name for name, dtype in columns]
+    records = [dict(zip(names, [e if v is None else v for v, e in zip(row, empty)])) for row in rows]
+    columnar_events.write_columnar(out_dir, records, columns)
+# def write_performance_measures_columnar()
+
+def main():
+    parser = argparse.ArgumentParser(description='Build expressway_performance_measures with a hash join in Python.')
+    parser.add_argument('--metric-dir', required=True)
+    parser.add_argument('--final', default='')
+    parser.add_argument('--out-csv', default='')
+    parser.add_argument('--out-columnar', default='')
+    args = parser.parse_args()
+    if args.out_columnar and not columnar_present:
+        print('Writing columnar output requires NumPy.')
+        return 1
+    # end_if
+
+    start = time.time()
+    if args.final:
+        roadinv_rows = cmp.roadinv_attrib_from_final_records(cmp.read_final_records(args.final))
+    else:
+        roadinv_rows = cmp.read_roadinv_attrib(args.metric_dir)
+    # end_if
+    read_sec = time.time() - start
+    start = time.time()
+    rows, counts = join_performance_measures(roadinv_rows, args.metric_dir)
+    join_sec = time.time() - start
+    for table in sorted(counts.keys()):
+        print('    ' + table + ': ' + str(counts[table]) + ' rows streamed')
+    # for
+    print('Read ' + str(len(roadinv_rows)) + ' road inventory rows in ' + str(round(read_sec, 3)) + ' sec.')
+    print('Joined ' + str(len(rows)) + ' rows of expressway_performance_measures in ' + str(round(join_sec, 3)) + ' sec.')
+    out_csv = args.out_csv
+    if not out_csv and not args.out_columnar:
+        out_csv = os.path.join(args.metric_dir, 'expressway_performance_measures.csv')
+    # end_if
+    if out_csv:
+        n = cmp.write_performance_measures_csv(out_csv, rows)
+        print('Wrote ' + str(n) + ' rows to: ' + out_csv)
+    # end_if
+    if args.out_columnar:
+        write_performance_measures_columnar(args.out_columnar, rows)
+        print('Wrote ' + str(len(rows)) + ' rows to: ' + args.out_columnar)
+    # end_if
+    return 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
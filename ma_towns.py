@@ -1,4 +1,12 @@
 # ma_towns.py - module to map MassGIS town_id to town name
+#
+# ma_towns is the original list of { town_id, town } dicts; town_names is a compact, immutable equivalent,
+# indexed by town_id. A set of towns is represented as a bitset - an integer with bit <town_id> set for each town
+# (town_set_bits / town_ids_from_bits) - and town_bits_string returns the (memoized) "+"-separated string of names
+# for such a set; town_set_string does the same for a list of town_ids.
+
+import sys
+
 ma_towns = [ 	{ 'town_id' : 0, 'town' : "" },
 		{ 'town_id' : 1, 'town' :  "Abington" },
 		{ 'town_id' : 2, 'town' :  "Acton" },
@@ -352,3 +360,72 @@ ma_towns = [ 	{ 'town_id' : 0, 'town' : "" },
 		{ 'town_id' : 350, 'town' :  "Wrentham" },
 		{ 'town_id' : 351, 'town' :  "Yarmouth" }
 ]
+
+# Town names, indexed by town_id, as an immutable tuple of interned strings
+#
+if sys.version_info[0] < 3:
+    town_names = tuple([intern(t['town']) for t in ma_towns])
+else:
+    town_names = tuple([sys.intern(t['town']) for t in ma_towns])
+# end_if
+
+# Cache of the strings generated by town_bits_string, keyed by bitset (see town_set_bits)
+_town_set_strings = {}
+
+# town_bits_string: Return the "+"-separated string of the names of a set of towns, given as a bitset
+#
+# Parameter: bits - integer, as returned by town_set_bits
+# Return value: string of town names, in ascending order of town_id, delimited by "+ "
+#               (see process_csv_file.town_ids_to_town_names)
+#
+# The strings are memoized: since successive TMCs almost always lie in the same set of towns,
+# generating the string is almost always a dict lookup on a (small) integer.
+#
+def town_bits_string(bits):
+    retval = _town_set_strings.get(bits)
+    if retval is None:
+        retval = '+ '.join([town_names[town_id] for town_id in town_ids_from_bits(bits)])
+        _town_set_strings[bits] = retval
+    # end_if
+    return retval
+# def town_bits_string()
+
+# town_set_string: Return the "+"-separated string of the names of a set of towns
+#
+# Parameter: town_ids - iterable of MassGIS TOWN_IDs; duplicates are ignored
+# Return value: string of town names, in ascending order of town_id, delimited by "+ "
+#
+def town_set_string(town_ids):
+    return town_bits_string(town_set_bits(town_ids))
+# def town_set_string()
+
+# town_set_bits: Return the bitset representation of a set of towns - an integer with bit <town_id> set for each town
+#
+# Parameter: town_ids - iterable of MassGIS TOWN_IDs
+# Return value: integer
+#
+def town_set_bits(town_ids):
+    retval = 0
+    for town_id in town_ids:
+        retval |= (1 << int(town_id))
+    # for
+    return retval
+# def town_set_bits()
+
+# town_ids_from_bits: Return the tuple of town_ids, in ascending order, in the bitset representation of a set of towns
+#
+# Parameter: bits - integer, as returned by town_set_bits
+# Return value: tuple of MassGIS TOWN_IDs
+#
+def town_ids_from_bits(bits):
+    retval = []
+    town_id = 0
+    while bits:
+        if bits & 1:
+            retval.append(town_id)
+        # end_if
+        bits >>= 1
+        town_id += 1
+    # while
+    return tuple(retval)
+# def town_ids_from_bits()
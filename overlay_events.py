@@ -0,0 +1,375 @@
+# overlay_events.py - in-memory replacement for the ESRI 'Overlay Route Events' (UNION) tool
+#
+# An "event table" here is a list of dicts, each of which has 'route_id', 'from_meas', and 'to_meas'
+# keys plus any number of attribute keys, e.g.:
+#     { 'route_id' : 'I95 NB', 'from_meas' : 1.25, 'to_meas' : 2.5, 'speed_lim' : 65 }
+#
+# union_overlay produces the same pieces as
+#     arcpy.OverlayRouteEvents_lr(<a>, "route_id LINE from_meas to_meas", <b>, "route_id LINE from_meas to_meas",
+#                                 "UNION", <out>, "route_id LINE from_meas to_meas", <zero>, "FIELDS", "INDEX")
+# i.e., one output event for each maximal range of measures over which a given pair of input events
+# (one from each input table, either of which may be absent) overlaps. Where an event from one table
+# has no counterpart in the other table, the attributes of the missing event are filled in with
+# default values - 0 for numeric fields and '' for string fields - which is what the downstream
+# processing in process_csv_file.py expects.
+#
+# The overlay is computed by a sweep over the sorted breakpoints of each route, so its cost is
+# O(n log n) in the total number of input events (plus the size of the output), and no intermediate
+# geodatabase tables are written.
+#
+# 10/18/2026
+
+import bisect
+
+# Fields common to every event table
+key_fields = ['route_id', 'from_meas', 'to_meas']
+
+# default_attrs: Return a dict of default values for the attribute fields of an event table
+#
+# Parameter: events - event table (list of dicts)
+# Return value: dict mapping each attribute field name to its default value:
+#               0 for numeric fields, '' for all others
+#
+def default_attrs(events):
+    retval = {}
+    for ev in events:
+        for field in ev:
+            if field in key_fields or field in retval:
+                continue
+            # end_if
+            val = ev[field]
+            if val is None:
+                continue
+            # end_if
+            retval[field] = 0 if isinstance(val, (int, float)) and not isinstance(val, bool) else ''
+        # for
+    # for
+    return retval
+# def default_attrs()
+
+# _group_by_route: Return dict mapping route_id to list of (index, event) tuples, in input order
+#
+def _group_by_route(events):
+    retval = {}
+    for ix, ev in enumerate(events):
+        retval.setdefault(ev['route_id'], []).append((ix, ev))
+    # for
+    return retval
+# def _group_by_route()
+
+# _sweep_route: Compute the UNION of the (non-zero-length) events of two tables on a single route
+#
+# Parameters: a_evs, b_evs - lists of (index, from_meas, to_meas) tuples for each table, where from_meas < to_meas
+# Return value: list of (from_meas, to_meas, a_index, b_index) tuples; a_index or b_index is None
+#               where there is no event from the corresponding table
+#
+# The open output pieces are updated at each breakpoint only from the events that begin and end there: a piece is
+# closed when either of its events ends (or, for a piece lacking an event of one table, when that table's first event
+# begins), and opened when one of its events begins (or, for a piece lacking an event of one table, when that table's
+# last active event ends). Each piece is thus opened and closed once, and the cost of the sweep is that of sorting
+# the events, plus the size of the output.
+#
+def _sweep_route(a_evs, b_evs):
+    breakpoints = sorted(set([ev[1] for ev in a_evs + b_evs] + [ev[2] for ev in a_evs + b_evs]))
+    a_starts = sorted(a_evs, key=lambda ev: (ev[1], ev[0])); a_ends = sorted(a_evs, key=lambda ev: (ev[2], ev[0]))
+    b_starts = sorted(b_evs, key=lambda ev: (ev[1], ev[0])); b_ends = sorted(b_evs, key=lambda ev: (ev[2], ev[0]))
+    a_start_next = 0; a_end_next = 0; b_start_next = 0; b_end_next = 0
+    # Active events in each table
+    a_active = set(); b_active = set()
+    # Output pieces that are still "open", keyed by (a_index, b_index), with their starting measure; and for each
+    # event of either table (or None), the set of events of the other table (or None) with which it has an open piece
+    open_pieces = {}
+    a_open = {}; b_open = {}
+    retval = []
+
+    def open_piece(a_ix, b_ix, meas):
+        open_pieces[(a_ix, b_ix)] = meas
+        a_open.setdefault(a_ix, set()).add(b_ix)
+        b_open.setdefault(b_ix, set()).add(a_ix)
+    # def open_piece()
+
+    def close_piece(a_ix, b_ix, meas):
+        retval.append((open_pieces.pop((a_ix, b_ix)), meas, a_ix, b_ix))
+        # The entry of an event that has ended has already been removed
+        if a_ix in a_open:
+            a_open[a_ix].discard(b_ix)
+        # end_if
+        if b_ix in b_open:
+            b_open[b_ix].discard(a_ix)
+        # end_if
+    # def close_piece()
+
+    for meas in breakpoints:
+        a_ending = []; b_ending = []; a_starting = []; b_starting = []
+        while a_end_next < len(a_ends) and a_ends[a_end_next][2] == meas:
+            a_ending.append(a_ends[a_end_next][0]); a_end_next += 1
+        # while
+        while b_end_next < len(b_ends) and b_ends[b_end_next][2] == meas:
+            b_ending.append(b_ends[b_end_next][0]); b_end_next += 1
+        # while
+        while a_start_next < len(a_starts) and a_starts[a_start_next][1] == meas:
+            a_starting.append(a_starts[a_start_next][0]); a_start_next += 1
+        # while
+        while b_start_next < len(b_starts) and b_starts[b_start_next][1] == meas:
+            b_starting.append(b_starts[b_start_next][0]); b_start_next += 1
+        # while
+        a_was_active = len(a_active) > 0; b_was_active = len(b_active) > 0
+
+        # Close the pieces of the events ending here
+        for a_ix in a_ending:
+            for b_ix in list(a_open.pop(a_ix, ())):
+                close_piece(a_ix, b_ix, meas)
+            # for
+            a_active.discard(a_ix)
+        # for
+        for b_ix in b_ending:
+            for a_ix in list(b_open.pop(b_ix, ())):
+                close_piece(a_ix, b_ix, meas)
+            # for
+            b_active.discard(b_ix)
+        # for
+        a_active.update(a_starting); b_active.update(b_starting)
+        # Close the pieces lacking an event of a table whose first event begins here
+        if not a_was_active and a_active:
+            for b_ix in list(a_open.get(None, ())):
+                close_piece(None, b_ix, meas)
+            # for
+        # end_if
+        if not b_was_active and b_active:
+            for a_ix in list(b_open.get(None, ())):
+                close_piece(a_ix, None, meas)
+            # for
+        # end_if
+
+        # Open the pieces of the events beginning here, and those lacking an event of a table whose last active event ends here
+        a_new = set(a_starting); b_new = set(b_starting)
+        for a_ix in a_starting:
+            for b_ix in (b_active if b_active else [None]):
+                open_piece(a_ix, b_ix, meas)
+            # for
+        # for
+        for b_ix in b_starting:
+            for a_ix in (a_active - a_new if a_active else [None]):
+                open_piece(a_ix, b_ix, meas)
+            # for
+        # for
+        if a_was_active and not a_active:
+            for b_ix in b_active - b_new:
+                open_piece(None, b_ix, meas)
+            # for
+        # end_if
+        if b_was_active and not b_active:
+            for a_ix in a_active - a_new:
+                open_piece(a_ix, None, meas)
+            # for
+        # end_if
+    # for
+    return retval
+# def _sweep_route()
+
+# _stab_route: Pair each zero-length event of one table with the events of the other table that contain its measure
+#
+# Parameters: zero_evs - list of (index, meas) tuples for the zero-length events
+#             other_evs - list of (index, from_meas, to_meas) tuples for all events of the other table
+# Return value: list of (meas, zero_event_index, other_event_index or None) tuples
+#
+# As in interval_index.py, the other events are sorted on from_meas, with the running maximum of their to_meas:
+# the events containing a measure are among those from the first whose running maximum reaches it up to the last
+# beginning at or before it, both found by binary search.
+#
+def _stab_route(zero_evs, other_evs):
+    others = sorted(other_evs, key=lambda ev: (ev[1], ev[0]))
+    from_meas = [ev[1] for ev in others]
+    max_to = []
+    for ev in others:
+        max_to.append(ev[2] if not max_to else max(max_to[-1], ev[2]))
+    # for
+    retval = []
+    for z_ix, meas in zero_evs:
+        first = bisect.bisect_left(max_to, meas)
+        stop = bisect.bisect_right(from_meas, meas)
+        hits = sorted([others[k][0] for k in range(first, stop) if others[k][2] >= meas])
+        if not hits:
+            hits = [None]
+        # end_if
+        for o_ix in hits:
+            retval.append((meas, z_ix, o_ix))
+        # for
+    # for
+    return retval
+# def _stab_route()
+
+# _merge_attrs: Build an output event from a pair of input events
+#
+def _merge_attrs(route_id, from_meas, to_meas, a_ev, b_ev, a_defaults, b_defaults, b_renames):
+    retval = { 'route_id' : route_id, 'from_meas' : from_meas, 'to_meas' : to_meas }
+    for field in a_defaults:
+        val = a_ev.get(field) if a_ev is not None else None
+        retval[field] = a_defaults[field] if val is None else val
+    # for
+    for field in b_defaults:
+        val = b_ev.get(field) if b_ev is not None else None
+        retval[b_renames[field]] = b_defaults[field] if val is None else val
+    # for
+    return retval
+# def _merge_attrs()
+
+# union_overlay: Overlay two event tables, producing the UNION of the two
+#
+# Parameters: a_events - first input event table (list of dicts)
+#             b_events - second input event table (list of dicts)
+#             keep_zero - True to keep zero-length output events (ESRI "ZERO"), False to discard them (ESRI "NO_ZERO")
+#             a_defaults, b_defaults - OPTIONAL dicts mapping each attribute field of the corresponding table
+#                                      to the value used where that table has no event; if not supplied,
+#                                      these are derived from the data by default_attrs
+# Return value: output event table (list of dicts), sorted on route_id, from_meas, and to_meas.
+#               If an attribute field of b_events has the same name as one in a_events, it is
+#               renamed by appending '_1' (then '_12', '_123', ...), as the ESRI tool does.
+#
+def union_overlay(a_events, b_events, keep_zero=False, a_defaults=None, b_defaults=None):
+    if a_defaults is None:
+        a_defaults = default_attrs(a_events)
+    # end_if
+    if b_defaults is None:
+        b_defaults = default_attrs(b_events)
+    # end_if
+    b_renames = {}
+    for field in b_defaults:
+        new_name = field
+        suffix = 1
+        while new_name in a_defaults or new_name in key_fields:
+            new_name += str(suffix) if new_name != field else '_' + str(suffix)
+            suffix += 1
+        # while
+        b_renames[field] = new_name
+    # for
+
+    a_by_route = _group_by_route(a_events)
+    b_by_route = _group_by_route(b_events)
+    route_ids = sorted(set(a_by_route.keys()) | set(b_by_route.keys()))
+    retval = []
+    for route_id in route_ids:
+        # Normalize each event to (index, low measure, high measure), and set aside zero-length events
+        a_lines = []; a_zeros = []; b_lines = []; b_zeros = []
+        for evs, lines, zeros in ((a_by_route.get(route_id, []), a_lines, a_zeros),
+                                  (b_by_route.get(route_id, []), b_lines, b_zeros)):
+            for ix, ev in evs:
+                lo = min(ev['from_meas'], ev['to_meas'])
+                hi = max(ev['from_meas'], ev['to_meas'])
+                if lo < hi:
+                    lines.append((ix, lo, hi))
+                else:
+                    zeros.append((ix, lo))
+                # end_if
+            # for
+        # for
+        pieces = []
+        for lo, hi, a_ix, b_ix in _sweep_route(a_lines, b_lines):
+            pieces.append((lo, hi, a_ix, b_ix))
+        # for
+        if keep_zero:
+            for meas, a_ix, b_ix in _stab_route(a_zeros, b_lines + [(ix, m, m) for ix, m in b_zeros]):
+                pieces.append((meas, meas, a_ix, b_ix))
+            # for
+            for meas, b_ix, a_ix in _stab_route(b_zeros, a_lines):
+                pieces.append((meas, meas, a_ix, b_ix))
+            # for
+        # end_if
+        pieces.sort(key=lambda p: (p[0], p[1], -1 if p[2] is None else p[2], -1 if p[3] is None else p[3]))
+        for lo, hi, a_ix, b_ix in pieces:
+            a_ev = a_events[a_ix] if a_ix is not None else None
+            b_ev = b_events[b_ix] if b_ix is not None else None
+            retval.append(_merge_attrs(route_id, lo, hi, a_ev, b_ev, a_defaults, b_defaults, b_renames))
+        # for
+    # for
+    return retval
+# def union_overlay()
+
+# tidy_overlay_events: Perform the clean-up operations applied to the final overlay before it is exported
+#
+# Parameters: events - final overlay event table (list of dicts)
+#             prune_empty_tmcs - True if records with tmc = '' are to be removed (i.e., a list of TMCs was specified)
+#             counts - OPTIONAL dict in which the number of records affected by each clean-up operation is accumulated,
+#                      under the keys 'town_id_0', 'empty_tmc', 'negative_from_meas', and 'zero_length'
+# Return value: cleaned-up event table, sorted in ascending order on from_meas and tmc,
+#               with a 'calc_len' field added to each record
+#
+# The clean-up operations are, in order:
+#     1. Remove records with a town_id of 0 (slivers resulting from differences between towns_pb and TOWNS_POLYM)
+#     2. If requested, remove records with tmc = ''
+#     3. Set from_meas values < 0 to 0
+#     4. Remove zero-length records
+#
+def tidy_overlay_events(events, prune_empty_tmcs, counts=None):
+    if counts is None:
+        counts = {}
+    # end_if
+    for key in ['town_id_0', 'empty_tmc', 'negative_from_meas', 'zero_length']:
+        counts[key] = counts.get(key, 0)
+    # for
+    retval = []
+    for ev in events:
+        if ev.get('town_id') == 0:
+            counts['town_id_0'] += 1
+            continue
+        # end_if
+        if prune_empty_tmcs and ev.get('tmc') == '':
+            counts['empty_tmc'] += 1
+            continue
+        # end_if
+        # Copy each kept event, so that the caller's events are left as they were
+        ev = dict(ev)
+        if ev['from_meas'] < 0:
+            counts['negative_from_meas'] += 1
+            ev['from_meas'] = 0.0
+        # end_if
+        if ev['from_meas'] == ev['to_meas']:
+            counts['zero_length'] += 1
+            continue
+        # end_if
+        ev['calc_len'] = ev['to_meas'] - ev['from_meas']
+        retval.append(ev)
+    # for
+    retval.sort(key=lambda ev: (ev['from_meas'], ev.get('tmc', '')))
+    return retval
+# def tidy_overlay_events()
+
+# Default attribute values of the TMC events, used where a piece of the overlay has no TMC event
+tmc_event_defaults = { 'tmc' : '', 'tmctype' : '', 'roadnum' : '', 'firstnm' : '', 'direction' : '' }
+
+# The overlays of a route's TMC events with its town, speed limit, and number of lanes events, in order:
+# for each, the name of the stage, whether zero-length output events are kept, and the default attribute values
+# of the accumulated overlay and of the events overlaid onto it (see union_overlay)
+route_overlay_stages = [ ('overlay_1', False, tmc_event_defaults, { 'town' : '', 'town_id' : 0 }),
+                         ('overlay_2', False, dict(tmc_event_defaults, town='', town_id=0), { 'speed_lim' : 0 }),
+                         ('overlay_3', True, dict(tmc_event_defaults, town='', town_id=0, speed_lim=0), { 'num_lanes' : 0 }) ]
+
+# overlay_route_events: Overlay the TMC, town, speed limit, and number of lanes events of a route, and tidy the result
+#
+# Parameters: tmc_events, town_events, speed_limit_events, num_lanes_events - event tables (lists of dicts) of the route
+#             prune_empty_tmcs - True if records with tmc = '' are to be removed (see tidy_overlay_events)
+#             run_stage - OPTIONAL function called as run_stage(stage_name, compute, rows_in) to run each stage
+#                         (the overlays of route_overlay_stages, then 'output_prep'), returning compute();
+#                         the caller may time it or retrieve its output from a cache instead
+# Return value: dict with the fields 'events' (tidied event table) and 'counts' (number of records affected by each
+#               clean-up operation, as accumulated by tidy_overlay_events)
+#
+def overlay_route_events(tmc_events, town_events, speed_limit_events, num_lanes_events, prune_empty_tmcs, run_stage=None):
+    if run_stage is None:
+        run_stage = lambda stage_name, compute, rows_in: compute()
+    # end_if
+    events = tmc_events
+    for (stage_name, keep_zero, a_defaults, b_defaults), b_events in zip(route_overlay_stages,
+                                                                         [town_events, speed_limit_events, num_lanes_events]):
+        def compute(a_events=events, b_events=b_events, keep_zero=keep_zero, a_defaults=a_defaults, b_defaults=b_defaults):
+            return union_overlay(a_events, b_events, keep_zero, a_defaults, b_defaults)
+        # def compute()
+        events = run_stage(stage_name, compute, len(events) + len(b_events))
+    # for
+
+    def tidy(events=events):
+        counts = {}
+        return { 'events' : tidy_overlay_events(events, prune_empty_tmcs, counts), 'counts' : counts }
+    # def tidy()
+    return run_stage('output_prep', tidy, len(events))
+# def overlay_route_events()
@@ -0,0 +1,229 @@
+# populate_performance_measures_db.py - build expressway_performance_measures in a local SQLite database
+#
+# In the MS Access database, expressway_performance_measures is built by 17 statements (see cmp_metric_tables.py):
+# an INSERT...SELECT, then 16 UPDATE...INNER JOINs, each of which rescans the whole table to set one or three columns.
+# This script instead:
+#     1. Imports the conflated road inventory attributes (from the final CSV files of the conflation, or from a CSV
+#        export of Inrix_2019_cmp_exp_roadinv_attrib), Inrix_2019_cmp_exp_avg_length, and the INRIX CMP metric tables
+#        into a SQLite database, each metric table keyed (PRIMARY KEY) on tmc.
+#     2. Populates every column of expressway_performance_measures in a single INSERT...SELECT, which LEFT JOINs each
+#        metric table on its key.
+#     3. Optionally writes the table to a CSV file, for the dashboard.
+# With --compare, the table is also built by the equivalent of the 17 Access statements, both builds are timed,
+# and their results are compared.
+#
+# Note: A TMC without a row in a metric table gets a NULL value for that measure, as with the INNER JOIN UPDATEs.
+#       If a TMC appears more than once in a metric table, its last row is used. If a TMC appears in more than one row
+#       of the road inventory attributes, each of its rows gets its own lanes and spd_limit, whereas the UPDATE would
+#       give all of them those of one of the rows; this is the only way in which the two builds can differ.
+#
+# Usage: python populate_performance_measures_db.py --metric-dir <dir> [--final <file or dir>] [--db <file>]
+#                                                  [--out-csv <file>] [--compare]
+#     --metric-dir - directory containing the CSV files of the INRIX CMP metric tables, <table name>.csv
+#     --final      - final CSV file (e.g., csv_final\statewide_events_final.csv) or directory of final CSV files from
+#                    which the road inventory attributes are taken; if omitted, they are read from
+#                    Inrix_2019_cmp_exp_roadinv_attrib.csv in the metric directory
+#     --db         - SQLite database file (default: expressway_performance_measures.sqlite in the metric directory);
+#                    any existing tables of the same names are replaced
+#     --out-csv    - CSV file to which expressway_performance_measures is written
+#     --compare    - also build the table with the sequence of 17 statements, and compare the two
+#
+# 10/18/2026
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import cmp_metric_tables as cmp
+
+# Name of the output table
+performance_measures_table = 'expressway_performance_measures'
+
+# create_tables: (Re)create the input and output tables in a SQLite database
+#
+# Parameter: conn - sqlite3 connection
+# Return value: none
+#
+def create_tables(conn):
+    roadinv_types = { 'rid' : 'INTEGER', 'from_meas' : 'REAL', 'to_meas' : 'REAL', 'num_lanes' : 'INTEGER', 'speed_limit' : 'INTEGER' }
+    statements = ['DROP TABLE IF EXISTS ' + cmp.roadinv_attrib_table,
+                  'CREATE TABLE ' + cmp.roadinv_attrib_table + ' (' +
+                  ', '.join([field + ' ' + roadinv_types.get(field, 'TEXT') for field in cmp.roadinv_attrib_fields]) + ')',
+                  'DROP TABLE IF EXISTS ' + cmp.avg_length_table,
+                  'CREATE TABLE ' + cmp.avg_length_table + ' (tmc TEXT PRIMARY KEY, ' + cmp.avg_length_field + ' REAL)']
+    for column, table, field in cmp.metric_tables:
+        statements.append('DROP TABLE IF EXISTS ' + table)
+        statements.append('CREATE TABLE ' + table + ' (tmc TEXT PRIMARY KEY, ' + field + ' REAL)')
+    # for
+    statements.append('DROP TABLE IF EXISTS ' + performance_measures_table)
+    statements.append('CREATE TABLE ' + performance_measures_table + ' (' +
+                      ', '.join([name + ' ' + sql_type for name, sql_type in cmp.performance_measures_columns]) + ')')
+    for statement in statements:
+        conn.execute(statement)
+    # for
+# def create_tables()
+
+# import_tables: Bulk-import the input tables into a SQLite database
+#
+# Parameters: conn - sqlite3 connection, in which create_tables has been run
+#             roadinv_rows - list of dicts, rows of Inrix_2019_cmp_exp_roadinv_attrib
+#             metric_dir - full path of the directory containing the CSV files of the metric tables
+# Return value: dict mapping table name to number of rows imported
+#
+def import_tables(conn, roadinv_rows, metric_dir):
+    retval = {}
+    conn.executemany('INSERT INTO ' + cmp.roadinv_attrib_table + ' VALUES (' + ', '.join(['?'] * len(cmp.roadinv_attrib_fields)) + ')',
+                     [[row[field] for field in cmp.roadinv_attrib_fields] for row in roadinv_rows])
+    conn.execute('CREATE INDEX ' + cmp.roadinv_attrib_table + '_tmc ON ' + cmp.roadinv_attrib_table + ' (tmc)')
+    retval[cmp.roadinv_attrib_table] = len(roadinv_rows)
+    keyed = [(cmp.avg_length_table, cmp.avg_length_field)] + [(table, field) for column, table, field in cmp.metric_tables]
+    for table, field in keyed:
+        values = cmp.read_keyed_table(metric_dir, table, field)
+        conn.executemany('INSERT INTO ' + table + ' VALUES (?, ?)', values.items())
+        retval[table] = len(values)
+    # for
+    conn.commit()
+    return retval
+# def import_tables()
+
+# populate_single_pass: Populate expressway_performance_measures with a single INSERT...SELECT
+#
+# Parameter: conn - sqlite3 connection, in which import_tables has been run
+# Return value: number of rows inserted
+#
+def populate_single_pass(conn):
+    r = cmp.roadinv_attrib_table; l = cmp.avg_length_table
+    select = [r + '.' + name for name in ['rid', 'tmc', 'from_meas', 'to_meas']] + [l + '.' + cmp.avg_length_field] + \
+             [r + '.' + name for name in ['route_id', 'route_num', 'road_name', 'direction', 'seg_begin', 'seg_end', 'community',
+                                          'num_lanes']] + \
+             [l + '.' + cmp.avg_length_field + ' * ' + r + '.num_lanes', r + '.speed_limit'] + \
+             [table + '.' + field for column, table, field in cmp.metric_tables]
+    joins = ['LEFT JOIN ' + table + ' ON ' + table + '.tmc = ' + r + '.tmc' for column, table, field in cmp.metric_tables]
+    conn.execute('DELETE FROM ' + performance_measures_table)
+    cur = conn.execute('INSERT INTO ' + performance_measures_table + ' (' +
+                       ', '.join([name for name, sql_type in cmp.performance_measures_columns]) + ') ' +
+                       'SELECT ' + ', '.join(select) + ' FROM ' + r + ' INNER JOIN ' + l + ' ON ' + r + '.tmc = ' + l + '.tmc ' +
+                       ' '.join(joins) + ' ORDER BY ' + r + '.rowid')
+    conn.commit()
+    return cur.rowcount
+# def populate_single_pass()
+
+# populate_sequential: Populate expressway_performance_measures as the 17 Access statements in the sql directory do
+#
+# Parameter: conn - sqlite3 connection, in which import_tables has been run
+# Return value: number of rows inserted
+#
+# SQLite has no UPDATE...INNER JOIN; each UPDATE sets its column(s) from a correlated subquery, for the rows whose TMC
+# is in the joined table, which is what the INNER JOIN does.
+#
+def populate_sequential(conn):
+    r = cmp.roadinv_attrib_table; l = cmp.avg_length_table; epm = performance_measures_table
+    conn.execute('DELETE FROM ' + epm)
+    # populate_expressway_performance_measures.sql
+    cur = conn.execute('INSERT INTO ' + epm + ' (rid, tmc, from_meas, to_meas, distance, route_id, route_num, road_name, ' +
+                       'direction, seg_begin, seg_end, community) ' +
+                       'SELECT ' + r + '.rid, ' + r + '.tmc, ' + r + '.from_meas, ' + r + '.to_meas, ' + l + '.' + cmp.avg_length_field +
+                       ', ' + r + '.route_id, ' + r + '.route_num, ' + r + '.road_name, ' + r + '.direction, ' + r + '.seg_begin, ' +
+                       r + '.seg_end, ' + r + '.community FROM ' + r + ' INNER JOIN ' + l + ' ON ' + r + '.tmc = ' + l + '.tmc ' +
+                       'ORDER BY ' + r + '.rowid')
+    retval = cur.rowcount
+    # populate_exp_perf_measures_lanes_spd_limit.sql
+    lookup = lambda field : '(SELECT ' + field + ' FROM ' + r + ' WHERE ' + r + '.tmc = ' + epm + '.tmc)'
+    conn.execute('UPDATE ' + epm + ' SET lanes = ' + lookup('num_lanes') + ', lane_miles = distance * ' + lookup('num_lanes') +
+                 ', spd_limit = ' + lookup('speed_limit') + ' WHERE tmc IN (SELECT tmc FROM ' + r + ')')
+    # populate_exp_perf_measures_<measure>.sql
+    for column, table, field in cmp.metric_tables:
+        conn.execute('UPDATE ' + epm + ' SET ' + column + ' = (SELECT ' + field + ' FROM ' + table + ' WHERE ' + table +
+                     '.tmc = ' + epm + '.tmc) WHERE tmc IN (SELECT tmc FROM ' + table + ')')
+    # for
+    conn.commit()
+    return retval
+# def populate_sequential()
+
+# read_performance_measures: Return the rows of expressway_performance_measures, in order of rid
+#
+def read_performance_measures(conn):
+    return conn.execute('SELECT ' + ', '.join([name for name, sql_type in cmp.performance_measures_columns]) +
+                        ' FROM ' + performance_measures_table + ' ORDER BY rid, rowid').fetchall()
+# def read_performance_measures()
+
+# build_database: Import the input tables into a SQLite database, and populate expressway_performance_measures
+#
+# Parameters: db_path - full path of the SQLite database file
+#             metric_dir - full path of the directory containing the CSV files of the metric tables
+#             final_path - OPTIONAL full path of the final CSV file, or directory of final CSV files, from which the road
+#                          inventory attributes are taken; if '', they are read from the metric directory
+#             compare - OPTIONAL; if True, also populate the table with populate_sequential, and compare the results
+# Return value: dict of timings (seconds) and counts
+#
+def build_database(db_path, metric_dir, final_path='', compare=False):
+    retval = {}
+    start = time.time()
+    if final_path:
+        roadinv_rows = cmp.roadinv_attrib_from_final_records(cmp.read_final_records(final_path))
+    else:
+        roadinv_rows = cmp.read_roadinv_attrib(metric_dir)
+    # end_if
+    conn = sqlite3.connect(db_path)
+    try:
+        create_tables(conn)
+        retval['imported'] = import_tables(conn, roadinv_rows, metric_dir)
+        retval['import_sec'] = time.time() - start
+        if compare:
+            start = time.time()
+            populate_sequential(conn)
+            retval['sequential_sec'] = time.time() - start
+            sequential_rows = read_performance_measures(conn)
+        # end_if
+        start = time.time()
+        retval['rows'] = populate_single_pass(conn)
+        retval['single_pass_sec'] = time.time() - start
+        if compare:
+            single_pass_rows = read_performance_measures(conn)
+            retval['mismatched_rows'] = len([1 for a, b in zip(sequential_rows, single_pass_rows) if a != b]) + \
+                                        abs(len(sequential_rows) - len(single_pass_rows))
+        # end_if
+    finally:
+        conn.close()
+    # try/finally
+    return retval
+# def build_database()
+
+def main():
+    parser = argparse.ArgumentParser(description='Build expressway_performance_measures in a local SQLite database.')
+    parser.add_argument('--metric-dir', required=True)
+    parser.add_argument('--final', default='')
+    parser.add_argument('--db', default='')
+    parser.add_argument('--out-csv', default='')
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(args.metric_dir, 'expressway_performance_measures.sqlite')
+    result = build_database(db_path, args.metric_dir, args.final, args.compare)
+    for table in sorted(result['imported'].keys()):
+        print('    ' + table + ': ' + str(result['imported'][table]) + ' rows imported')
+    # for
+    print('Imported tables in ' + str(round(result['import_sec'], 3)) + ' sec.')
+    print('Populated ' + performance_measures_table + ' (' + str(result['rows']) + ' rows) in a single pass in ' +
+          str(round(result['single_pass_sec'], 3)) + ' sec.')
+    if args.compare:
+        print('Populated it with the 17-statement sequence in ' + str(round(result['sequential_sec'], 3)) + ' sec; ' +
+              str(result['mismatched_rows']) + ' rows differ.')
+    # end_if
+    if args.out_csv:
+        conn = sqlite3.connect(db_path)
+        try:
+            n = cmp.write_performance_measures_csv(args.out_csv, read_performance_measures(conn))
+        finally:
+            conn.close()
+        # try/finally
+        print('Wrote ' + str(n) + ' rows to: ' + args.out_csv)
+    # end_if
+    return 1 if args.compare and result['mismatched_rows'] > 0 else 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
@@ -0,0 +1,179 @@
+# prefetch.py - overlap the reading of inputs and the writing of outputs with computation, using background threads
+#
+# Reads from the SDE database (on \\lindalino) and from the file geodatabases and CSV files on \\lilliput spend most of
+# their time waiting on the network, during which the CPU would otherwise sit idle. The functions here run such I/O on
+# background threads while the main thread computes:
+#     prefetch            - load the inputs of the next item(s) of a sequence while the current one is processed
+#     run_concurrently    - run several independent loads at the same time, and wait for all of them
+#     start_write_behind, submit, finish_write_behind - write outputs in the background, in order of submission
+# Every queue is bounded, so that no more than a fixed number of items' inputs or outputs are held in memory at once.
+# Errors raised on a background thread (including SystemExit, e.g., from get_inrix_attrs) are caught there and handed
+# back to the main thread.
+#
+# Note: The wall-clock time of a pipeline of reading, computing, and writing approaches the greatest of the three,
+#       rather than their sum. CPU times recorded in run reports (see run_report.py) are those of the whole process,
+#       and so include the work done on background threads during a stage.
+#
+# 10/18/2026
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+# end_try_except
+
+# _load_item: Load one item, catching any error
+#
+# Return value: tuple of (result, error); result is None if an error was raised, error is None if not
+#
+def _load_item(load, item):
+    try:
+        return load(item), None
+    except BaseException as e:
+        return None, e
+    # try/except
+# def _load_item()
+
+# prefetch: Iterate over the inputs of a sequence of items, loading those of the next items in the background
+#
+# Parameters: items - sequence of items (e.g., route_ids)
+#             load - function of one item returning its inputs
+#             depth - OPTIONAL maximum number of items whose inputs are loaded (or being loaded) but not yet consumed
+#             num_threads - OPTIONAL number of background threads loading items; at most depth
+# Return value: generator of (item, result, error) tuples, in order of items; result is the value returned by load,
+#               error the exception it raised (exactly one of the two is None)
+#
+def prefetch(items, load, depth=2, num_threads=1):
+    items = list(items)
+    num_threads = max(1, min(num_threads, depth, len(items)))
+    slots = threading.Semaphore(depth)
+    ready = threading.Condition()
+    state = { 'next' : 0, 'stop' : False }
+    results = {}
+
+    def worker():
+        while True:
+            slots.acquire()
+            with ready:
+                i = state['next']
+                if state['stop'] or i >= len(items):
+                    slots.release()
+                    return
+                # end_if
+                state['next'] += 1
+            # with
+            result = _load_item(load, items[i])
+            with ready:
+                results[i] = result
+                ready.notify_all()
+            # with
+        # while
+    # def worker()
+
+    threads = [threading.Thread(target=worker) for n in range(num_threads)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    # for
+    try:
+        for i in range(len(items)):
+            with ready:
+                while i not in results:
+                    ready.wait()
+                # while
+                result, error = results.pop(i)
+            # with
+            slots.release()
+            yield items[i], result, error
+        # for
+    finally:
+        # If the consumer stops early, let the workers finish the item in hand and exit
+        with ready:
+            state['stop'] = True
+        # with
+        for t in threads:
+            slots.release()
+        # for
+    # try/finally
+# def prefetch()
+
+# run_concurrently: Run several independent loads at the same time
+#
+# Parameter: loads - dict mapping a name to a function of no arguments
+# Return value: dict mapping each name to the value returned by its function
+#
+# All the loads are run to completion; if any raised an error, the first such error (in order of name) is then raised.
+#
+def run_concurrently(loads):
+    names = sorted(loads.keys())
+    outcomes = {}
+    def run(name):
+        outcomes[name] = _load_item(lambda f : f(), loads[name])
+    # def run()
+    threads = [threading.Thread(target=run, args=(name,)) for name in names]
+    for t in threads:
+        t.start()
+    # for
+    for t in threads:
+        t.join()
+    # for
+    for name in names:
+        if outcomes[name][1] is not None:
+            raise outcomes[name][1]
+        # end_if
+    # for
+    return dict([(name, outcomes[name][0]) for name in names])
+# def run_concurrently()
+
+# start_write_behind: Start a background thread that runs write jobs in order of submission
+#
+# Parameter: depth - OPTIONAL maximum number of jobs submitted but not yet started; submit blocks while it is reached
+# Return value: write-behind worker (dict); 'errors' is the list of (job number, exception) for jobs that raised one
+#
+def start_write_behind(depth=2):
+    retval = { 'queue' : queue.Queue(depth), 'errors' : [], 'submitted' : 0 }
+    def worker():
+        while True:
+            job = retval['queue'].get()
+            if job is None:
+                return
+            # end_if
+            n, fn, args = job
+            result, error = _load_item(lambda a : fn(*a), args)
+            if error is not None:
+                retval['errors'].append((n, error))
+            # end_if
+        # while
+    # def worker()
+    retval['thread'] = threading.Thread(target=worker)
+    retval['thread'].daemon = True
+    retval['thread'].start()
+    return retval
+# def start_write_behind()
+
+# submit: Submit a write job to a write-behind worker
+#
+# Parameters: worker - write-behind worker, as returned by start_write_behind
+#             fn - function to be called on the worker's thread
+#             args - arguments with which fn is called
+# Return value: job number (0 for the first job submitted, and so on)
+#
+def submit(worker, fn, *args):
+    n = worker['submitted']
+    worker['queue'].put((n, fn, args))
+    worker['submitted'] += 1
+    return n
+# def submit()
+
+# finish_write_behind: Wait for all the jobs submitted to a write-behind worker to be finished, and stop it
+#
+# Parameter: worker - write-behind worker
+# Return value: list of (job number, exception) for jobs that raised one
+#
+def finish_write_behind(worker):
+    worker['queue'].put(None)
+    worker['thread'].join()
+    return worker['errors']
+# def finish_write_behind()
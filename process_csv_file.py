@@ -6,7 +6,9 @@
 
 import csv
 import math
+import os
 import pydash
+import csv_util
 import ma_towns
 
 # The following is to allow this script to be run stand-alone outside of ArcMap.
@@ -17,6 +19,26 @@ try:
 except:
     arcpy_present = False
 # end_try_except
+
+# Reading the intermediate event table in columnar form (see columnar_events.py) requires NumPy;
+# the CSV form can be read without it.
+#
+try:
+    import columnar_events
+    columnar_present = True
+except ImportError:
+    columnar_present = False
+# end_try_except
+
+# Likewise, aggregating the records of all TMCs at once (see aggregate_tmcs.py) requires NumPy;
+# without it, the records of each TMC are processed by process_one_tmc_id.
+#
+try:
+    import aggregate_tmcs
+    aggregate_present = True
+except ImportError:
+    aggregate_present = False
+# end_try_except
     
 def report(msg):
     if arcpy_present:
@@ -36,7 +58,7 @@ problem_tmcs = []
 # Return value: list of dicts containing records read from CSV file
 # 
 def load_csv(in_csv_dir, in_csv_file):
-    open_fn = in_csv_dir + '\\' + in_csv_file
+    open_fn = os.path.join(in_csv_dir, in_csv_file)
     retval = []
     with open(open_fn) as csvfile:
         reader = csv.DictReader(csvfile)
@@ -54,26 +76,66 @@ def load_csv(in_csv_dir, in_csv_file):
     return retval
 # def load_csv()
 
-# write_csv: Write, in CSV format, list of dicts containing data to be output
+# load_events: Load the intermediate event table, in either columnar or CSV form, into a list of dicts
+#
+# Parameters: in_dir - full path of directory containing the intermediate event table
+#             in_name - name of the intermediate event table: either a columnar event table directory
+#                       (see columnar_events.py) or a CSV file
+# Return value: list of dicts containing the records of the event table
+#
+# Note: The columns of a columnar event table already have the correct data types, so no parsing is performed.
+#
+def load_events(in_dir, in_name):
+    in_path = os.path.join(in_dir, in_name)
+    if columnar_present and columnar_events.is_columnar(in_path):
+        return columnar_events.columns_to_records(columnar_events.load_columnar(in_path, mmap=True))
+    # end_if
+    return load_csv(in_dir, in_name)
+# def load_events()
+
+# open_csv_for_writing: Open a file for writing by a csv.writer or csv.DictWriter (see csv_util.py)
+#
+open_csv_for_writing = csv_util.open_csv_for_writing
+
+# Fields of the output CSV file, in order
+output_fieldnames = ['tmc', 'tmctype', 'route_id', 'roadnum', 'direction', 'firstnm',
+                     'from_meas', 'to_meas', 'length', 'speed_limit', 'num_lanes', 'towns']
+
+# Number of rows written to the output CSV file at a time
+write_chunk_rows = 1000
+
+# write_csv: Write, in CSV format, the records (dicts) to be output
 #
 # Parameters: out_csv_dir - full path of directory into which output CSV file is to be written
 #             out_csv_file - name of output CSV file
-# Return value: none
+#             output_data - iterable of dicts (e.g., a list, or a generator); it is consumed one record at a time,
+#                           so that at most write_chunk_rows rows are held in memory
+# Return value: number of records written
 #
 def write_csv(out_csv_dir, out_csv_file, output_data):
-    open_fn = out_csv_dir + '\\' + out_csv_file
-    # Note we have to open the CSV file in 'wb' mode on Windows in order to prevent each record being written out with and EXTRA newline.
-    with open(open_fn, 'wb') as csvfile:
-        fieldnames = ['tmc', 'tmctype', 'route_id', 'roadnum', 'direction', 'firstnm', \
-                      'from_meas', 'to_meas', 'length', 'speed_limit', 'num_lanes', 'towns']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in output_data:
-            writer.writerow({ 'tmc' : row['tmc'], 'tmctype' : row['tmctype'], 'route_id' : row['route_id'], 'roadnum' : row['roadnum'], 'direction' : row['direction'], \
-                              'firstnm' : row['firstnm'], 'from_meas' : row['from_meas'], 'to_meas' : row['to_meas'], 'length' : row['length'], \
-                              'speed_limit' : row['speed_limit'], 'num_lanes' : row['num_lanes'], 'towns' : row['towns'] })
+    open_fn = os.path.join(out_csv_dir, out_csv_file)
+    num_fields = len(output_fieldnames)
+    # The rows of a chunk are lists allocated once, and refilled with the values of each chunk's records
+    chunk = [[None] * num_fields for i in range(write_chunk_rows)]
+    n = 0; retval = 0
+    with open_csv_for_writing(open_fn) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(output_fieldnames)
+        for rec in output_data:
+            row = chunk[n]
+            for i in range(num_fields):
+                row[i] = rec[output_fieldnames[i]]
+            # for
+            n += 1
+            if n == write_chunk_rows:
+                writer.writerows(chunk)
+                retval += n; n = 0
+            # end_if
         # for
+        writer.writerows(chunk[:n])
+        retval += n
     # with
+    return retval
 # def write_csv()
 
 # get_uniq_tmc_ids: Return list of unique TMC IDs in the given list of csv_records
@@ -89,6 +151,29 @@ def get_uniq_tmc_ids(csv_records):
     return uniq_tmc_list
 # def get_uniq_tmc_ids() 
 
+# group_records_by_tmc: Partition the list of csv_records by TMC ID in a single pass
+#
+# Parameter: csv_records - list of dicts from input CSV file
+# Return value: list of (tmc_id, list of dicts for that TMC ID) tuples, in order of each TMC ID's first
+#               appearance in csv_records; since the input CSV file is sorted on from_meas, this is also
+#               the order of the TMCs' starting measures. The records for each TMC ID retain their input order.
+#
+def group_records_by_tmc(csv_records):
+    index = {}
+    retval = []
+    for rec in csv_records:
+        tmc_id = rec['tmc']
+        recs = index.get(tmc_id)
+        if recs is None:
+            recs = []
+            index[tmc_id] = recs
+            retval.append((tmc_id, recs))
+        # end_if
+        recs.append(rec)
+    # for
+    return retval
+# def group_records_by_tmc()
+
 # get_uniq_town_ids: Return list of uniqe TOWN_IDs, sorted in ascending order 
 #
 # Parameter: list of dicts from input CSV data
@@ -110,24 +195,24 @@ def get_uniq_town_ids(rec_list):
 # Note: We delimit the town names with "+" rather than "," since this data is destinted to be a field in
 #       a CSV (i.e., COMMA-separated values) file; delimiting the town names with commas will confuse 
 #       code and other apps concerned with parsing the CSV file.
+#       The string for each distinct set of towns is generated only once (see ma_towns.town_set_string);
+#       town_id_list is not modified.
 #
 def town_ids_to_town_names(town_id_list):
-    town_names_str = ''
-    town_names_str += ma_towns.ma_towns[int(town_id_list[0])]['town']
-    del town_id_list[0]
-    for town_id in town_id_list:
-        town_names_str += '+ ' + ma_towns.ma_towns[int(town_id)]['town']
-    # for
-    return town_names_str
+    return ma_towns.town_set_string(town_id_list)
 # def town_ids_to_town_names()
 
 # process_one_tmc_id: Process the records from the input CSV file for one TMC ID
 #
-# Parameter: rec_list - list of dicts from input CSV file for a single TMC ID
+# Parameters: rec_list - list of dicts from input CSV file for a single TMC ID
+#             out_problem_tmcs - OPTIONAL list to which the TMC ID is appended for each attribute for which
+#                                no usable value is found; by default, the module's problem_tmcs list
 # Return value: a single dict summarizing the 1..N records for the given TMC ID
 #
-def process_one_tmc_id(rec_list):
-    global problem_tmcs
+def process_one_tmc_id(rec_list, out_problem_tmcs=None):
+    if out_problem_tmcs is None:
+        out_problem_tmcs = problem_tmcs
+    # end_if
     # Fields in retval: tmc, tmctype, from_meas, to_meas, length, 
     #                   route_id, roadnum, direction, firstnm, 
     #                   towns, town_ids (?), speed_limit, num_lanes
@@ -169,7 +254,7 @@ def process_one_tmc_id(rec_list):
     if len(sl_rec_list) == 0:
         report("    No usable speed limit records for TMC " +  rec_list[0]['tmc']) 
         sl_for_tmc = -1
-        problem_tmcs.append(rec_list[0]['tmc'])
+        out_problem_tmcs.append(rec_list[0]['tmc'])
     else:
         speed_limit = 0
         for rec in sl_rec_list:
@@ -193,7 +278,7 @@ def process_one_tmc_id(rec_list):
     if len(nl_rec_list) == 0:
         report("    No usable number of lanes records for TMC " +  rec_list[0]['tmc']) 
         nl_for_tmc = -1
-        problem_tmcs.append(rec_list[0]['tmc'])
+        out_problem_tmcs.append(rec_list[0]['tmc'])
     else:   
         num_lanes = 0
         for rec in nl_rec_list:
@@ -214,35 +299,72 @@ def process_one_tmc_id(rec_list):
     return retval
 # def process_one_tmc_id()
 
+# _appending: Generate the records of an iterable, appending each to a list as it is generated
+#
+def _appending(records, out_records):
+    for rec in records:
+        out_records.append(rec)
+        yield rec
+    # for
+# def _appending()
+
 # main_routine: Given an input CSV file with 1..N records per TMC ID,
 #               generate an output CSV file with a single record per TMC ID.
 #
 # Parameters: in_csv_dir - full path of directory containing input CSV file
-#             in_csv_file - name of input CSV file
+#             in_csv_file - name of input CSV file, or of input columnar event table directory (see load_events)
 #             out_csv_dir - full path of directory into which output CSV file is to be written
 #             out_csv_dir - name out output CSV file
-# Return value: none
-#
-def main_routine(in_csv_dir, in_csv_file, out_csv_dir, out_csv_file):
-    global problem_tmcs
-    # List of CSV data loaded - 1 to N records per TMC
-    csv_loaded = []
-    # List of processed CSV data - 1 record per TMC, ready for output
-    csv_processed = []
-    csv_loaded = load_csv(in_csv_dir, in_csv_file)
-    # Get unique TMC IDs
-    uniq_tmc_ids = get_uniq_tmc_ids(csv_loaded)
-    for tmc_id in uniq_tmc_ids:
-        recs_to_process = pydash.collections.filter_(csv_loaded, lambda x: x['tmc'] == tmc_id)
-        output_rec = process_one_tmc_id(recs_to_process)
-        csv_processed.append(output_rec)
-    # for
-    pydash.arrays.sort(csv_processed,comparator=None,key=lambda x : x['from_meas'],reverse=False)
-    write_csv(out_csv_dir, out_csv_file, csv_processed)
-    if len(problem_tmcs) > 0:
+#             out_records - OPTIONAL list to which the output records (dicts) are appended, e.g., to be merged
+#                           with those of other routes
+#             out_problem_tmcs - OPTIONAL list to which the TMCs for which no usable attribute value was found are
+#                                appended, once for each such attribute; if not given, they are accumulated
+#                                in the module's problem_tmcs list, which is emptied first
+# Return value: number of records (i.e., TMCs) written to the output CSV file
+#
+def main_routine(in_csv_dir, in_csv_file, out_csv_dir, out_csv_file, out_records=None, out_problem_tmcs=None):
+    if out_problem_tmcs is None:
+        # Start with an empty list of problem TMCs, in case this routine is called more than once in the same process
+        out_problem_tmcs = problem_tmcs
+        del problem_tmcs[:]
+    # end_if
+    first_problem_ix = len(out_problem_tmcs)
+    if aggregate_present:
+        # Generate the output records for all TMCs at once, in from_meas order, and write each as it is generated.
+        # A columnar input table is used as-is, with no parsing; a CSV input file is read directly into typed columns.
+        in_path = os.path.join(in_csv_dir, in_csv_file)
+        if columnar_present and columnar_events.is_columnar(in_path):
+            cols = columnar_events.load_columnar(in_path, mmap=True)
+        elif columnar_present:
+            cols = columnar_events.load_csv_columns(in_path, [(name, dtype) for name, dtype in columnar_events.event_columns
+                                                              if name in aggregate_tmcs.aggregation_fields])
+        else:
+            cols = aggregate_tmcs.records_to_columns(load_csv(in_csv_dir, in_csv_file))
+        # end_if
+        report("Processing " + str(len(cols['tmc'])) + " records.")
+        csv_processed = aggregate_tmcs.iter_aggregate_by_tmc(cols, report, out_problem_tmcs, True)
+    else:
+        # List of CSV data loaded - 1 to N records per TMC
+        csv_loaded = load_events(in_csv_dir, in_csv_file)
+        # List of processed CSV data - 1 record per TMC, ready for output
+        csv_processed = []
+        # Group the records by TMC ID in a single pass over the loaded data
+        # (rather than filtering the entire list of loaded records once per unique TMC ID)
+        for tmc_id, recs_to_process in group_records_by_tmc(csv_loaded):
+            output_rec = process_one_tmc_id(recs_to_process, out_problem_tmcs)
+            csv_processed.append(output_rec)
+        # for
+        pydash.arrays.sort(csv_processed,comparator=None,key=lambda x : x['from_meas'],reverse=False)
+    # end_if
+    if out_records is not None:
+        csv_processed = _appending(csv_processed, out_records)
+    # end_if
+    num_written = write_csv(out_csv_dir, out_csv_file, csv_processed)
+    if len(out_problem_tmcs) > first_problem_ix:
         report("*** No usable attribute value(s) were found for the following TMCs:")
-        for tmc in problem_tmcs:
+        for tmc in out_problem_tmcs[first_problem_ix:]:
             report("    " + tmc)
         # end_for
     # end_if
+    return num_written
 # def main_routine()
\ No newline at end of file
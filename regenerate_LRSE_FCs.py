@@ -4,27 +4,37 @@
 # to LRSN route geometry. This was found to be the case, for example, for SR2 EB and WB in the "LRSN + LRSE" data copied from
 # MassDOT on 19 December 2019.
 #
-# This script performs the conversion one 'route' at a time; the result are two sets of FC's, each set to be subsequently combined
-# into a single FC using the 'Merge' tool.
+# This script originally performed the conversion one 'route' at a time (SelectLayerByAttribute, TableToTable,
+# MakeRouteEventLayer_lr, and CopyFeatures, for each attribute), the result being two sets of FC's, each set to be
+# subsequently combined into a single FC using the 'Merge' tool. It now does the following, in a single pass:
+#     1. Read the geometry of all the selected LRSN routes, with one search cursor (or from the route store, if it is current).
+#     2. For each LRSE attribute (speed limit, number of travel lanes), read the events on all the selected routes
+#        from the LRSE FC's attribute table, with one search cursor.
+#     3. Slice the route geometry by the measures of all the events, using route_measures.py
+#        (this replaces MakeRouteEventLayer_lr).
+#     4. Write all the events of each attribute, with their regenerated geometry, to a single feature class,
+#        which has the same fields as the MassDOT LRSE FC; no merging is required.
 #
 # Ben Krepp, attending metaphysician
 # 02/20/2020 - what a cool-looking date string, YOWSAH!
+# 10/18/2026
 
 import arcpy
+import expressway_routes
+import route_measures
+import route_store
+import stage_cache
+import tmc_locator
 
-# Single (optional) parameter, specifying a file containing a newline-delimited list of MassDOT route_ids.  
-route_list_file_name = arcpy.GetParameterAsText(0)  
+# Single (optional) parameter, specifying a file containing a newline-delimited list of MassDOT route_ids.
+route_list_file_name = arcpy.GetParameterAsText(0)
 if route_list_file_name != '':
-    f = open(route_list_file_name, 'r')
-    s = f.read()
-    route_list = s.split('\n')
+    route_list = expressway_routes.read_route_list_file(route_list_file_name)
     for route_id in route_list:
         arcpy.AddMessage(route_id)
-    # for   
+    # for
 else:
-    route_list = [ 'I90 EB', 'I90 WB', 'I93 NB', 'I93 SB', 'I95 NB', 'I95 SB', 'I290 EB', 'I290 WB', 'I495 NB', 'I495 SB',
-                   'US1 NB', 'US1 SB', 'US3 NB', 'US3 SB', 'US44 EB', 'US44 WB', 'SR2 EB', 'SR2 WB', 'SR3 NB', 'SR3 SB',
-                   'SR24 NB', 'SR24 SB', 'SR140 NB', 'SR140 SB', 'SR146 NB', 'SR146 SB', 'SR213 EB', 'SR213 WB', 'N087 NB', 'N482 SB' ]
+    route_list = expressway_routes.expressway_route_ids
 # end_if
 
 # Connection file for read-only connection to ArcGIS 10.6 SDE mpodata.mpodata database
@@ -38,60 +48,139 @@ MASSDOT_LRSN_Routes_19Dec2019 = sde_mpodata_ro_connection + '\mpodata.mpodata.CT
 #
 LRSE_Speed_Limit = sde_mpodata_ro_connection + '\mpodata.mpodata.CTPS_RoadInventory_for_INRIX_2019\mpodata.mpodata.LRSE_Speed_Limit'
 
-# Layer containing data selected from the above
-#
-Speed_Limit_Layer = "Speed_Limit_Layer"
-
 # MassDOT number of travel lanes LRSE - geometry here may be out of sync w.r.t. LRSN_Routes; event table data is assumed to be OK.
 #
 LRSE_Number_Travel_Lanes = sde_mpodata_ro_connection + '\mpodata.mpodata.CTPS_RoadInventory_for_INRIX_2019\mpodata.mpodata.LRSE_Number_Travel_Lanes'
-# Layer containing data selected from the above
 
-Num_Lanes_Layer = "Num_Lanes_Layer"
-               
 # Path to "base directory"
 base_dir = r'\\lilliput\groups\Data_Resources\conflate-tmcs-and-massdot-expressways'
 
-# Path to GDB for event tables extracted from MassDOT LRSE Speed Limit FC
-speed_limit_events_gdb = base_dir + '\\LRSE_Speed_Limit_events.gdb'
-
-# Path to GDB for event tables extracted from MassDOT Number of Travel Lanes FC
-num_lanes_events_gdb = base_dir + '\\LRSE_Number_Travel_Lanes_events.gdb'
+# Path to the route store (see route_store.py), from which the route geometry is taken if it is current
+route_store_dir = base_dir + '\\route_store'
 
-# Path to GDB for regenerated LRSE_Speed_Limit FCs
+# Path to GDB for regenerated LRSE_Speed_Limit FC
 speed_limit_gdb = base_dir + '\\LRSE_Speed_Limit_FC_redux.gdb'
 
-# Path to GDB for regenerated LRSE_Number_Travel_Lanes FCs
+# Path to GDB for regenerated LRSE_Number_Travel_Lanes FC
 num_lanes_gdb = base_dir + '\\LRSE_Number_Travel_Lanes_FC_redux.gdb'
 
+# The LRSE FCs to be regenerated: (source FC, output GDB, output FC name)
+# The output FCs are those read by generate_tmc_events_for_expressways.py
+lrse_fcs = [ (LRSE_Speed_Limit, speed_limit_gdb, 'LRSE_Speed_Limit'),
+             (LRSE_Number_Travel_Lanes, num_lanes_gdb, 'LRSE_Number_Travel_Lanes') ]
 
-# Layers for raw MassDOT LRSE Speed Limit FC and raw MassDOT LRSE Number of Travel Lanes FC
-arcpy.MakeFeatureLayer_management(LRSE_Speed_Limit, Speed_Limit_Layer)
-arcpy.MakeFeatureLayer_management(LRSE_Number_Travel_Lanes, Num_Lanes_Layer)
+# route_id_query_string: Return a query string selecting the features with any of a list of route_ids
+#
+def route_id_query_string(route_ids):
+    return "route_id IN (" + ", ".join(["'" + route_id + "'" for route_id in route_ids]) + ")"
+# def route_id_query_string()
 
+# read_route_segments: Read the geometry of a set of routes
+#
+# Parameters: routes_fc - full path of the LRSN routes FC
+#             route_ids - list of route_ids
+# Return value: tuple of (dict mapping route_id to dict of route segment arrays (see tmc_locator.route_segments),
+#                         spatial reference of the routes FC); a route with no segments is omitted
+#
+# The geometry is taken from the route store if it is current; the geometry of any route not in the store
+# (or of every route, if the store isn't current) is read from routes_fc, as in statewide_session.load_session.
+#
+def read_route_segments(routes_fc, route_ids):
+    retval = route_store.load_route_segments(route_store_dir, stage_cache.source_stamp(routes_fc), route_ids)
+    if retval is not None:
+        arcpy.AddMessage("Using route geometry from route store " + route_store_dir)
+    else:
+        retval = {}
+    # end_if
+    missing = [route_id for route_id in route_ids if route_id not in retval]
+    if len(missing) == 0:
+        return retval, arcpy.Describe(routes_fc).spatialReference
+    # end_if
+    for route_feat in arcpy.da.SearchCursor(routes_fc, ['route_id', 'shape@'], route_id_query_string(missing)):
+        if route_feat[1] is None:
+            continue
+        # end_if
+        parts = []
+        for part in route_feat[1]:
+            x = []; y = []; m = []
+            for pnt in part:
+                if pnt:
+                    x.append(pnt.X); y.append(pnt.Y); m.append(pnt.M)
+                # end_if
+            # for
+            parts.append((x, y, m))
+        # for
+        try:
+            retval[route_feat[0]] = tmc_locator.route_segments(parts)
+        except ValueError:
+            # Route geometry contains no segments; reported by the caller as a route without geometry
+            pass
+        # try/except
+    # for
+    return retval, arcpy.Describe(routes_fc).spatialReference
+# def read_route_segments()
+
+# make_polyline: Make an M-aware arcpy Polyline from a list of parts, each a list of (x, y, m) tuples
+#
+def make_polyline(parts, spatial_reference):
+    if len(parts) == 0:
+        return None
+    # end_if
+    array = arcpy.Array([arcpy.Array([arcpy.Point(x, y, None, m) for (x, y, m) in part]) for part in parts])
+    return arcpy.Polyline(array, spatial_reference, False, True)
+# def make_polyline()
+
+# regenerate_lrse_fc: Regenerate one LRSE FC from the events on a set of routes
+#
+# Parameters: route_segs - dict mapping route_id to dict of route segment arrays
+#             spatial_reference - spatial reference of the routes
+#             route_ids - list of route_ids of the routes whose events are to be regenerated
+#             source_fc - full path of the MassDOT LRSE FC whose attribute table contains the events
+#             out_gdb - full path of GDB in which the regenerated FC is written
+#             out_fc_name - name of the regenerated FC; any existing FC of this name is replaced
+# Return value: tuple of (number of events written, number of those for which no geometry could be generated)
+#
+def regenerate_lrse_fc(route_segs, spatial_reference, route_ids, source_fc, out_gdb, out_fc_name):
+    # The fields of the events, as they are in the MassDOT LRSE FC
+    fieldnames = [f.name for f in arcpy.ListFields(source_fc) if f.type not in ['OID', 'Geometry'] and f.editable]
+    route_id_ix = fieldnames.index('route_id')
+    from_ix = fieldnames.index('from_measure'); to_ix = fieldnames.index('to_measure')
+
+    arcpy.AddMessage('    Reading events from ' + source_fc)
+    rows = [row for row in arcpy.da.SearchCursor(source_fc, fieldnames, route_id_query_string(route_ids))]
+
+    arcpy.AddMessage('    Generating geometry of ' + str(len(rows)) + ' events.')
+    geoms = route_measures.slice_events(route_segs, [row[route_id_ix] for row in rows],
+                                        [row[from_ix] for row in rows], [row[to_ix] for row in rows])
+
+    out_fc = out_gdb + '\\' + out_fc_name
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    # end_if
+    arcpy.CreateFeatureclass_management(out_gdb, out_fc_name, "POLYLINE", source_fc, "ENABLED", "DISABLED", spatial_reference)
+    no_geometry = 0
+    out_csr = arcpy.da.InsertCursor(out_fc, fieldnames + ['shape@'])
+    for row, parts in zip(rows, geoms):
+        shape = make_polyline(parts, spatial_reference)
+        if shape is None:
+            no_geometry += 1
+        # end_if
+        out_csr.insertRow(list(row) + [shape])
+    # for
+    del out_csr
+    return len(rows), no_geometry
+# def regenerate_lrse_fc()
+
+arcpy.AddMessage("Reading geometry of " + str(len(route_list)) + " routes.")
+route_segs, spatial_reference = read_route_segments(MASSDOT_LRSN_Routes_19Dec2019, route_list)
 for route_id in route_list:
-    arcpy.AddMessage("Processing " + route_id)
-    
-    MassDOT_route_query_string = "route_id = " + "'" + route_id + "'"   
-    normalized_route_id = route_id.replace(' ', '_')    
-    sl_et_name = normalized_route_id + '_sl_events'
-    sl_layer_name = normalized_route_id + '_sl_layer'
-    sl_fc_name = normalized_route_id + '_sl_fc'    
-    nl_et_name = normalized_route_id + '_nl_events'
-    nl_layer_name = normalized_route_id + '_nl_layer'
-    nl_fc_name = normalized_route_id + '_nl_fc'
-      
-    arcpy.AddMessage('    Generating speed limit FC.')
-    arcpy.SelectLayerByAttribute_management(Speed_Limit_Layer, "NEW_SELECTION", MassDOT_route_query_string)
-    arcpy.TableToTable_conversion("Speed_Limit_Layer", speed_limit_events_gdb, sl_et_name)  
-    arcpy.MakeRouteEventLayer_lr(MASSDOT_LRSN_Routes_19Dec2019, "route_id", 
-                                 speed_limit_events_gdb + '\\' + sl_et_name, "route_id LINE from_measure to_measure", sl_layer_name)
-    arcpy.CopyFeatures_management(sl_layer_name, speed_limit_gdb + '\\' + sl_fc_name)
-    
-    arcpy.AddMessage('    Generating number of travel lanes FC.')
-    arcpy.SelectLayerByAttribute_management(Num_Lanes_Layer, "NEW_SELECTION", MassDOT_route_query_string)
-    arcpy.TableToTable_conversion("Num_Lanes_Layer", num_lanes_events_gdb, nl_et_name)
-    arcpy.MakeRouteEventLayer_lr(MASSDOT_LRSN_Routes_19Dec2019, "route_id", 
-                                 num_lanes_events_gdb + '\\' + nl_et_name, "route_id LINE from_measure to_measure", nl_layer_name)                                   
-    arcpy.CopyFeatures_management(nl_layer_name, num_lanes_gdb + '\\' + nl_fc_name )
-# end_for over route_list
\ No newline at end of file
+    if route_id not in route_segs:
+        arcpy.AddWarning("Route " + route_id + " not found in LRSN routes, or has no geometry.")
+    # end_if
+# for
+
+for (source_fc, out_gdb, out_fc_name) in lrse_fcs:
+    arcpy.AddMessage("Generating " + out_fc_name + " FC.")
+    num_events, no_geometry = regenerate_lrse_fc(route_segs, spatial_reference, route_list, source_fc, out_gdb, out_fc_name)
+    arcpy.AddMessage("    " + str(num_events) + " events written; " + str(no_geometry) + " without geometry.")
+# for
@@ -0,0 +1,204 @@
+# route_measures.py - arcpy-independent "dynamic segmentation": slice M-aware route geometry by ranges of measures
+#
+# This does for a batch of line events what arcpy.MakeRouteEventLayer_lr does for an event table: it produces,
+# for each (route_id, from_measure, to_measure) event, the portion of the route's polyline lying between the
+# two measures. The routes are passed in as dicts of segment arrays (see tmc_locator.route_segments), and all
+# the events on a route are sliced in a single NumPy-vectorized computation:
+#     1. The segments overlapping each event's range of measures are found - by binary search if the route's
+#        measures never decrease along it (the usual case), otherwise by testing every segment.
+#     2. Each overlapping segment is clipped to the event's range of measures, by linear interpolation.
+#     3. The clipped pieces of consecutive, connected segments are chained into the parts of the event's polyline.
+# Like MakeRouteEventLayer_lr, an event whose range of measures extends beyond the route gets the portion of the route
+# within the range, an event whose from_measure is greater than its to_measure is treated as if they were exchanged,
+# and an event on a route that doesn't exist, that lies entirely beyond the route, or is zero-length gets no geometry.
+#
+# It likewise does for a batch of point events what MakeRouteEventLayer_lr does for a point event table (measure_points,
+# locate_measures): each measure is mapped to the point at which it lies along the route, found by binary search over
+# the segments' M-values, and interpolated along its segment. A measure that doesn't lie on the route gets no point.
+#
+# 10/18/2026
+
+import numpy as np
+
+# measures_monotonic: Determine whether the measures of a route never decrease along it
+#
+# Parameter: segs - dict of route segment arrays, as returned by tmc_locator.route_segments
+# Return value: True if the measures never decrease, otherwise False
+#
+def measures_monotonic(segs):
+    return bool(np.all(segs['m0'] <= segs['m1']) and np.all(segs['m1'][:-1] <= segs['m0'][1:]))
+# def measures_monotonic()
+
+# overlapping_segments: Find the segments of a route overlapping each of a batch of ranges of measures
+#
+# Parameters: segs - dict of route segment arrays
+#             lo, hi - arrays of the lower and upper bounds of the ranges of measures
+# Return value: tuple of two arrays, (range number, segment number), with one entry for each overlapping pair,
+#               sorted by range number, then by segment number
+#
+# A segment overlaps a range if some part of it of non-zero length lies within the range.
+#
+def overlapping_segments(segs, lo, hi):
+    lo = np.asarray(lo, dtype=np.float64); hi = np.asarray(hi, dtype=np.float64)
+    if measures_monotonic(segs):
+        # The overlapping segments of each range are a contiguous run: from the first segment ending after lo
+        # up to the last segment beginning before hi
+        first = np.searchsorted(segs['m1'], lo, 'right')
+        stop = np.maximum(np.searchsorted(segs['m0'], hi, 'left'), first)
+        counts = stop - first
+        rng = np.repeat(np.arange(len(lo)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rng, np.repeat(first, counts) + offsets
+    # end_if
+    seg_lo = np.minimum(segs['m0'], segs['m1']); seg_hi = np.maximum(segs['m0'], segs['m1'])
+    rng = []; seg = []
+    for i in range(len(lo)):
+        s = np.nonzero((seg_lo < hi[i]) & (seg_hi > lo[i]))[0]
+        rng.append(np.full(len(s), i, dtype=np.int64)); seg.append(s)
+    # for
+    if len(rng) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # end_if
+    return np.concatenate(rng), np.concatenate(seg)
+# def overlapping_segments()
+
+# slice_route: Return the portions of a route lying between each of a batch of pairs of measures
+#
+# Parameters: segs - dict of route segment arrays
+#             from_meas, to_meas - arrays of the measures delimiting each event
+# Return value: list, with one entry per event, of the event's geometry: a list of parts, each a list of (x, y, m) tuples;
+#               the list of parts is empty for an event that has no geometry
+#
+def slice_route(segs, from_meas, to_meas):
+    from_meas = np.asarray(from_meas, dtype=np.float64); to_meas = np.asarray(to_meas, dtype=np.float64)
+    lo = np.minimum(from_meas, to_meas); hi = np.maximum(from_meas, to_meas)
+    rng, seg = overlapping_segments(segs, lo, hi)
+
+    # Clip each overlapping segment to its range: parameters t_a <= t_b along the segment, and the corresponding measures
+    m0 = segs['m0'][seg]; m1 = segs['m1'][seg]
+    dm = m1 - m0
+    flat = dm == 0.0
+    safe = np.where(flat, 1.0, dm)
+    t_lo = np.where(flat, 0.0, (lo[rng] - m0) / safe)
+    t_hi = np.where(flat, 1.0, (hi[rng] - m0) / safe)
+    t_a = np.clip(np.minimum(t_lo, t_hi), 0.0, 1.0)
+    t_b = np.clip(np.maximum(t_lo, t_hi), 0.0, 1.0)
+    # Measures at the clipped ends are taken from the range itself where a bound falls within the segment, so that
+    # the pieces of an event begin and end exactly at its from_measure and to_measure
+    ma = np.where(t_a == 0.0, m0, np.where(t_a == 1.0, m1, np.where(dm > 0.0, lo[rng], hi[rng])))
+    mb = np.where(t_b == 0.0, m0, np.where(t_b == 1.0, m1, np.where(dm > 0.0, hi[rng], lo[rng])))
+    dx = segs['x1'][seg] - segs['x0'][seg]; dy = segs['y1'][seg] - segs['y0'][seg]
+    xa = segs['x0'][seg] + t_a * dx; ya = segs['y0'][seg] + t_a * dy
+    xb = segs['x0'][seg] + t_b * dx; yb = segs['y0'][seg] + t_b * dy
+
+    # A piece continues the current part if it is the next segment of the same event, connects with the previous
+    # segment, and neither piece was cut short at the join
+    joined = np.zeros(len(seg), dtype=bool)
+    if len(seg) > 1:
+        joined[1:] = ((rng[1:] == rng[:-1]) & (seg[1:] == seg[:-1] + 1) &
+                      (segs['x0'][seg[1:]] == segs['x1'][seg[:-1]]) & (segs['y0'][seg[1:]] == segs['y1'][seg[:-1]]) &
+                      (t_b[:-1] == 1.0) & (t_a[1:] == 0.0))
+    # end_if
+
+    retval = [[] for i in range(len(lo))]
+    rng_l = rng.tolist(); joined_l = joined.tolist()
+    xa = xa.tolist(); ya = ya.tolist(); ma = ma.tolist(); xb = xb.tolist(); yb = yb.tolist(); mb = mb.tolist()
+    for k in range(len(rng_l)):
+        parts = retval[rng_l[k]]
+        if joined_l[k]:
+            parts[-1].append((xb[k], yb[k], mb[k]))
+        else:
+            parts.append([(xa[k], ya[k], ma[k]), (xb[k], yb[k], mb[k])])
+        # end_if
+    # for
+    # Zero-length events get no geometry (a zero-length piece can only arise from a degenerate segment)
+    for i in np.nonzero(lo == hi)[0].tolist():
+        retval[i] = []
+    # for
+    return retval
+# def slice_route()
+
+# slice_events: Return the geometry of a batch of line events on any number of routes
+#
+# Parameters: route_segs - dict mapping route_id to dict of route segment arrays
+#             route_ids - list of the route_id of each event
+#             from_meas, to_meas - lists of the from_measure and to_measure of each event
+# Return value: list, with one entry per event (in input order), of the event's geometry, as returned by slice_route
+#
+def slice_events(route_segs, route_ids, from_meas, to_meas):
+    retval = [[] for i in range(len(route_ids))]
+    by_route = {}
+    for i, route_id in enumerate(route_ids):
+        by_route.setdefault(route_id, []).append(i)
+    # for
+    from_meas = np.asarray(from_meas, dtype=np.float64); to_meas = np.asarray(to_meas, dtype=np.float64)
+    for route_id, ixs in by_route.items():
+        if route_id not in route_segs:
+            continue
+        # end_if
+        ixs = np.array(ixs, dtype=np.int64)
+        for i, geom in zip(ixs.tolist(), slice_route(route_segs[route_id], from_meas[ixs], to_meas[ixs])):
+            retval[i] = geom
+        # for
+    # for
+    return retval
+# def slice_events()
+
+# measure_points: Return the point at which each of a batch of measures lies along a route
+#
+# Parameters: segs - dict of route segment arrays
+#             meas - array of measures
+# Return value: tuple of (x, y, seg_ix) arrays, with one entry per measure: the coordinates of the point, and the index
+#               of the segment on which it lies; x and y are NaN and seg_ix is -1 for a measure that doesn't lie on the route
+#
+# A measure lying on more than one segment (e.g., at a vertex) is located on the first of them. A measure lying on a
+# segment along which the measure does not change is located at the segment's first vertex.
+#
+def measure_points(segs, meas):
+    meas = np.asarray(meas, dtype=np.float64)
+    n = len(segs['m0'])
+    if measures_monotonic(segs):
+        # The first segment ending at or after the measure is the only candidate
+        seg_ix = np.minimum(np.searchsorted(segs['m1'], meas, 'left'), n - 1)
+        on_route = (segs['m0'][seg_ix] <= meas) & (meas <= segs['m1'][seg_ix])
+    else:
+        seg_lo = np.minimum(segs['m0'], segs['m1']); seg_hi = np.maximum(segs['m0'], segs['m1'])
+        seg_ix = np.zeros(len(meas), dtype=np.int64); on_route = np.zeros(len(meas), dtype=bool)
+        for i in range(len(meas)):
+            s = np.nonzero((seg_lo <= meas[i]) & (meas[i] <= seg_hi))[0]
+            if len(s) > 0:
+                seg_ix[i] = s[0]; on_route[i] = True
+            # end_if
+        # for
+    # end_if
+    m0 = segs['m0'][seg_ix]; dm = segs['m1'][seg_ix] - m0
+    t = np.where(dm == 0.0, 0.0, (meas - m0) / np.where(dm == 0.0, 1.0, dm))
+    x = segs['x0'][seg_ix] + t * (segs['x1'][seg_ix] - segs['x0'][seg_ix])
+    y = segs['y0'][seg_ix] + t * (segs['y1'][seg_ix] - segs['y0'][seg_ix])
+    return np.where(on_route, x, np.nan), np.where(on_route, y, np.nan), np.where(on_route, seg_ix, -1)
+# def measure_points()
+
+# locate_measures: Return the points at which a batch of measures on any number of routes lie
+#
+# Parameters: route_segs - dict mapping route_id to dict of route segment arrays
+#             route_ids - list of the route_id of each measure
+#             meas - list of measures
+# Return value: tuple of (x, y) arrays, with one entry per measure (in input order); NaN for a measure on a route that
+#               doesn't exist, or that doesn't lie on its route
+#
+def locate_measures(route_segs, route_ids, meas):
+    x = np.full(len(route_ids), np.nan); y = np.full(len(route_ids), np.nan)
+    by_route = {}
+    for i, route_id in enumerate(route_ids):
+        by_route.setdefault(route_id, []).append(i)
+    # for
+    meas = np.asarray(meas, dtype=np.float64)
+    for route_id, ixs in by_route.items():
+        if route_id not in route_segs:
+            continue
+        # end_if
+        ixs = np.array(ixs, dtype=np.int64)
+        x[ixs], y[ixs], seg_ix = measure_points(route_segs[route_id], meas[ixs])
+    # for
+    return x, y
+# def locate_measures()
@@ -0,0 +1,234 @@
+# route_store.py - compact, memory-mapped on-disk store of LRSN route geometry
+#
+# Reading route geometry from the SDE database, and constructing arcpy geometry objects from it, dominates the startup
+# time of the tools that use it (generate_tmc_events_for_expressways.py, statewide_session.py, regenerate_LRSE_FCs.py).
+# A route store holds the geometry of all the routes as flat arrays, written once (by running this module as a script)
+# and memory-mapped by every tool that uses it, so that opening it is instantaneous and its pages are shared by all the
+# processes using it.
+#
+# Layout of a route store directory:
+#     manifest.json        - format version, source stamp (see stage_cache.source_stamp) of the routes feature class from
+#                            which the store was built, date built, numbers of routes, parts, vertices, and segments,
+#                            and the list of route_ids, in store order
+#     x.npy, y.npy, m.npy  - X, Y, and M values of the vertices of all routes (float64)
+#     part_start.npy       - offset of the first vertex of each part (int64; number of parts + 1 entries)
+#     route_part.npy       - offset of the first part of each route (int64; number of routes + 1 entries)
+#     seg_vertex.npy       - offset of the first vertex of each segment (int64)
+#     route_seg.npy        - offset of the first segment of each route (int64; number of routes + 1 entries)
+#     seg_min_x.npy, seg_min_y.npy, seg_max_x.npy, seg_max_y.npy - bounding box of each segment (float64)
+#     cum_len.npy          - length along the route (in map units) to the start of each segment (float64)
+# A segment joins two consecutive vertices of a part; parts with fewer than 2 vertices have no segments.
+#
+# Usage (to build the store): python route_store.py [<store_dir>]
+#
+# 10/18/2026
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Version of the route store format
+route_store_format_version = 1
+
+# Name of the manifest file in a route store directory
+manifest_file_name = 'manifest.json'
+
+# Names of the array files in a route store directory
+route_store_arrays = ['x', 'y', 'm', 'part_start', 'route_part', 'seg_vertex', 'route_seg',
+                      'seg_min_x', 'seg_min_y', 'seg_max_x', 'seg_max_y', 'cum_len']
+
+# build_route_store: Write a route store
+#
+# Parameters: store_dir - full path of the route store directory; it is created if necessary
+#             routes - list of (route_id, parts) tuples, where parts is a list of (x, y, m) tuples, one per part of the
+#                      route polyline, each of x, y, and m being a sequence of vertex values
+#                      (e.g., as returned by generate_tmc_events_for_expressways.get_route_parts)
+#             source_stamp - string identifying the snapshot of the routes feature class from which routes were read
+# Return value: none
+#
+# Note: The manifest is written last, so that a partially-written store is never mistaken for a complete one.
+#
+def build_route_store(store_dir, routes, source_stamp):
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir)
+    # end_if
+    manifest_fn = os.path.join(store_dir, manifest_file_name)
+    if os.path.exists(manifest_fn):
+        os.remove(manifest_fn)
+    # end_if
+    x = []; y = []; m = []
+    part_start = [0]; route_part = [0]; seg_vertex = []; route_seg = [0]
+    num_vertices = 0
+    for route_id, parts in routes:
+        for part in parts:
+            n = len(part[0])
+            x.append(np.asarray(part[0], dtype=np.float64)); y.append(np.asarray(part[1], dtype=np.float64))
+            m.append(np.asarray(part[2], dtype=np.float64))
+            if n >= 2:
+                seg_vertex.append(np.arange(num_vertices, num_vertices + n - 1, dtype=np.int64))
+            # end_if
+            num_vertices += n
+            part_start.append(num_vertices)
+        # for
+        route_part.append(len(part_start) - 1)
+        route_seg.append(route_seg[-1] + sum([max(len(part[0]) - 1, 0) for part in parts]))
+    # for
+    empty = np.zeros(0, dtype=np.float64)
+    arrays = { 'x' : np.concatenate(x) if x else empty, 'y' : np.concatenate(y) if y else empty,
+               'm' : np.concatenate(m) if m else empty,
+               'part_start' : np.array(part_start, dtype=np.int64), 'route_part' : np.array(route_part, dtype=np.int64),
+               'seg_vertex' : np.concatenate(seg_vertex) if seg_vertex else np.zeros(0, dtype=np.int64),
+               'route_seg' : np.array(route_seg, dtype=np.int64) }
+    sv = arrays['seg_vertex']
+    x0 = arrays['x'][sv]; y0 = arrays['y'][sv]; x1 = arrays['x'][sv + 1]; y1 = arrays['y'][sv + 1]
+    arrays['seg_min_x'] = np.minimum(x0, x1); arrays['seg_min_y'] = np.minimum(y0, y1)
+    arrays['seg_max_x'] = np.maximum(x0, x1); arrays['seg_max_y'] = np.maximum(y0, y1)
+    # Cumulative length restarts at 0.0 at the beginning of each route
+    seg_len = np.hypot(x1 - x0, y1 - y0)
+    cum_len = np.concatenate([[0.0], np.cumsum(seg_len)])[:-1] if len(seg_len) > 0 else empty
+    rs = arrays['route_seg']
+    route_of_seg = np.repeat(np.arange(len(routes)), np.diff(rs))
+    arrays['cum_len'] = cum_len - cum_len[rs[:-1][route_of_seg]] if len(seg_len) > 0 else empty
+
+    for name in route_store_arrays:
+        np.save(os.path.join(store_dir, name + '.npy'), arrays[name])
+    # for
+    manifest = { 'format_version' : route_store_format_version, 'source_stamp' : source_stamp,
+                 'built' : time.strftime('%Y-%m-%d %H:%M:%S'), 'num_routes' : len(routes),
+                 'num_parts' : len(part_start) - 1, 'num_vertices' : num_vertices, 'num_segments' : len(sv),
+                 'route_ids' : [route_id for route_id, parts in routes] }
+    with open(manifest_fn, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    # with
+# def build_route_store()
+
+# open_route_store: Open a route store, memory-mapping its arrays
+#
+# Parameters: store_dir - full path of the route store directory
+#             source_stamp - OPTIONAL source stamp of the routes feature class; if given, and it differs from that
+#                            from which the store was built, the store is stale
+# Return value: route store (dict) containing the manifest, each of the arrays (read-only memory maps),
+#               and 'route_index', a dict mapping route_id to its position in the store;
+#               None if there is no (complete) store in store_dir, or it is stale or of another format version
+#
+def open_route_store(store_dir, source_stamp=None):
+    manifest_fn = os.path.join(store_dir, manifest_file_name)
+    if not os.path.isfile(manifest_fn):
+        return None
+    # end_if
+    with open(manifest_fn, 'r') as f:
+        manifest = json.load(f)
+    # with
+    if manifest['format_version'] != route_store_format_version:
+        return None
+    # end_if
+    if source_stamp is not None and manifest['source_stamp'] != source_stamp:
+        return None
+    # end_if
+    retval = { 'manifest' : manifest }
+    for name in route_store_arrays:
+        retval[name] = np.load(os.path.join(store_dir, name + '.npy'), mmap_mode='r')
+    # for
+    # If a route_id occurs more than once, the first occurrence is used, as a search cursor's first row would be
+    retval['route_index'] = {}
+    for i, route_id in enumerate(manifest['route_ids']):
+        retval['route_index'].setdefault(route_id, i)
+    # for
+    return retval
+# def open_route_store()
+
+# route_parts: Return the parts of a route in a route store
+#
+# Parameters: store - route store, as returned by open_route_store
+#             route_id - MassDOT route_id
+# Return value: list of (x, y, m) tuples of arrays, one per part of the route (the form accepted by
+#               tmc_locator.route_segments), or None if the route isn't in the store
+#
+def route_parts(store, route_id):
+    i = store['route_index'].get(route_id)
+    if i is None:
+        return None
+    # end_if
+    retval = []
+    for p in range(int(store['route_part'][i]), int(store['route_part'][i + 1])):
+        lo = int(store['part_start'][p]); hi = int(store['part_start'][p + 1])
+        retval.append((store['x'][lo:hi], store['y'][lo:hi], store['m'][lo:hi]))
+    # for
+    return retval
+# def route_parts()
+
+# route_segments: Return the segment arrays of a route in a route store
+#
+# Parameters: store - route store
+#             route_id - MassDOT route_id
+# Return value: dict of segment arrays, in the form returned by tmc_locator.route_segments, plus the segments'
+#               bounding boxes (min_x, min_y, max_x, max_y) and cumulative lengths (cum_len); None if the route isn't in the store
+#
+def route_segments(store, route_id):
+    i = store['route_index'].get(route_id)
+    if i is None:
+        return None
+    # end_if
+    lo = int(store['route_seg'][i]); hi = int(store['route_seg'][i + 1])
+    if lo == hi:
+        raise ValueError("Route geometry contains no segments.")
+    # end_if
+    sv = np.asarray(store['seg_vertex'][lo:hi])
+    last_vertex = int(store['part_start'][int(store['route_part'][i + 1])]) - 1
+    retval = { 'x0' : store['x'][sv], 'y0' : store['y'][sv], 'm0' : store['m'][sv],
+               'x1' : store['x'][sv + 1], 'y1' : store['y'][sv + 1], 'm1' : store['m'][sv + 1],
+               'last_m' : float(store['m'][last_vertex]),
+               'min_x' : store['seg_min_x'][lo:hi], 'min_y' : store['seg_min_y'][lo:hi],
+               'max_x' : store['seg_max_x'][lo:hi], 'max_y' : store['seg_max_y'][lo:hi],
+               'cum_len' : store['cum_len'][lo:hi] }
+    return retval
+# def route_segments()
+
+# load_route_segments: Return the segment arrays of a list of routes from a route store, if there is a current one
+#
+# Parameters: store_dir - full path of the route store directory
+#             source_stamp - source stamp of the routes feature class
+#             route_ids - list of route_ids
+# Return value: dict mapping route_id to dict of segment arrays (see route_segments) for those of the routes in the store,
+#               or None if there is no current store; a route with no segments is omitted, so that the caller's
+#               per-route path reads (and reports) it as it would a route not in the store
+#
+def load_route_segments(store_dir, source_stamp, route_ids):
+    store = open_route_store(store_dir, source_stamp)
+    if store is None:
+        return None
+    # end_if
+    retval = {}
+    for route_id in route_ids:
+        i = store['route_index'].get(route_id)
+        if i is not None and store['route_seg'][i + 1] > store['route_seg'][i]:
+            retval[route_id] = route_segments(store, route_id)
+        # end_if
+    # for
+    return retval
+# def load_route_segments()
+
+def main():
+    import arcpy
+    import generate_tmc_events_for_expressways as driver
+    import stage_cache
+
+    store_dir = sys.argv[1] if len(sys.argv) > 1 else driver.route_store_dir
+    routes_fc = driver.MASSDOT_LRSN_Routes_19Dec2019
+    print('Reading routes from: ' + routes_fc)
+    routes = []
+    for route_feat in arcpy.da.SearchCursor(routes_fc, ['route_id', 'shape@']):
+        if route_feat[1] is not None:
+            routes.append((route_feat[0], driver.get_route_parts(route_feat[1])))
+        # end_if
+    # for
+    build_route_store(store_dir, routes, stage_cache.source_stamp(routes_fc))
+    print('Wrote ' + str(len(routes)) + ' routes to route store: ' + store_dir)
+# def main()
+
+if __name__ == '__main__':
+    main()
+# end_if
@@ -0,0 +1,355 @@
+# run_benchmarks.py - time the stages of the conflation pipeline on synthetic data
+#
+# Usage: python run_benchmarks.py [--routes <N>] [--statewide <K>] [--seed <S>] [--repeat <R>]
+#                                 [--baseline-file <file>] [--compare <file>] [--tolerance <T>]
+#
+#     --routes, --statewide, --seed - size and seed of the synthetic data set (see generate_synthetic_data.py)
+#     --repeat        - number of times each benchmark is run; the fastest run is reported (default: 3)
+#     --baseline-file - JSON file to which the results are written (default: benchmark_baseline.json)
+#     --compare       - JSON file containing previous results; if any benchmark is slower than its previous
+#                       result by more than the tolerance, the script exits with a non-zero status
+#     --tolerance     - maximum allowed ratio of current time to previous time (default: 1.25)
+#
+# The following stages are benchmarked separately, over all routes in the data set:
+#     locator         - tmc_locator.route_segments and tmc_locator.locate_tmcs
+#     towns           - town_events.prepare_town_polygons (once) and town_events.locate_towns (for each route)
+#     overlay         - overlay_events.overlay_route_events: the three union_overlay calls and tidy_overlay_events
+#     post_processing - process_csv_file.group_records_by_tmc and process_csv_file.process_one_tmc_id
+#     aggregation     - aggregate_tmcs.aggregate_by_tmc, which computes the same output records for all TMCs at once
+#     csv_write       - writing the intermediate CSV files
+#     csv_read        - reading the intermediate CSV files with process_csv_file.load_csv
+#     csv_read_typed  - reading the intermediate CSV files into typed columns with columnar_events.load_csv_columns
+#     main_routine    - process_csv_file.main_routine, end-to-end
+# For each stage, the wall-clock time, throughput (rows per second), and peak memory allocated
+# (measured in a separate run, using tracemalloc, where available) are recorded.
+#
+# None of these stages depends upon arcpy, so the benchmarks can be run outside of ArcMap.
+#
+# 10/18/2026
+
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import tracemalloc
+    tracemalloc_present = True
+except ImportError:
+    tracemalloc_present = False
+# end_try_except
+
+import aggregate_tmcs
+import columnar_events
+import expressway_routes
+import generate_synthetic_data
+import overlay_events
+import process_csv_file
+import tmc_locator
+import town_events
+
+# Version of the format of the JSON baseline file
+baseline_format_version = 1
+
+# Fields of the intermediate CSV file
+intermediate_csv_fieldnames = ['route_id', 'from_meas', 'to_meas', 'tmc', 'tmctype', 'roadnum', 'firstnm', 'direction',
+                               'town', 'town_id', 'speed_lim', 'num_lanes', 'calc_len']
+
+# group_by_route: Return dict mapping route_id to the list of records for that route
+#
+def group_by_route(records):
+    retval = {}
+    for rec in records:
+        retval.setdefault(rec['route_id'], []).append(rec)
+    # for
+    return retval
+# def group_by_route()
+
+# run_locator: Locate the TMCs of every route
+#
+# Parameter: dataset - synthetic data set, as returned by generate_synthetic_data.make_dataset
+# Return value: dict mapping route_id to the list of (non-zero-length) TMC events on the route
+#
+def run_locator(dataset):
+    tmcs_by_route = group_by_route(dataset['tmcs'])
+    et_fieldnames = ['tmc', 'tmctype', 'roadnum', 'firstnm', 'direction']
+    retval = {}
+    for route in dataset['routes']:
+        route_id = route['route_id']
+        tmcs = tmcs_by_route.get(route_id, [])
+        segs = tmc_locator.route_segments(route['parts'])
+        located = tmc_locator.locate_tmcs(segs, [t['from_x'] for t in tmcs], [t['from_y'] for t in tmcs],
+                                          [t['to_x'] for t in tmcs], [t['to_y'] for t in tmcs])
+        events = []
+        for i, tmc in enumerate(tmcs):
+            if located['keep'][i]:
+                ev = { 'route_id' : route_id, 'from_meas' : float(located['from_meas'][i]), 'to_meas' : float(located['to_meas'][i]) }
+                for name in et_fieldnames:
+                    ev[name] = tmc[name]
+                # for
+                events.append(ev)
+            # end_if
+        # for
+        retval[route_id] = events
+    # for
+    return retval
+# def run_locator()
+
+# run_towns: Prepare the town polygons, and generate the town events of every route
+#
+# Parameter: dataset - synthetic data set
+# Return value: total number of town events generated
+#
+def run_towns(dataset):
+    polygons = [{ 'town_id' : poly['town_id'], 'town' : poly['town'], 'rings' : [poly['ring']] } for poly in dataset['towns']['polygons']]
+    prepared = town_events.prepare_town_polygons(polygons)
+    retval = 0
+    for route in dataset['routes']:
+        segs = tmc_locator.route_segments(route['parts'])
+        retval += len(town_events.locate_towns(prepared, segs, route['route_id']))
+    # for
+    return retval
+# def run_towns()
+
+# run_overlay: Overlay the TMC, town, speed limit, and number of lanes events of every route, and tidy the result
+#
+# Parameters: dataset - synthetic data set
+#             tmc_events - dict mapping route_id to list of TMC events, as returned by run_locator
+# Return value: dict mapping route_id to the list of intermediate (overlaid and tidied) records for the route
+#
+def run_overlay(dataset, tmc_events):
+    town_events = group_by_route(dataset['town_events'])
+    speed_limit_events = group_by_route(dataset['speed_limit_events'])
+    num_lanes_events = group_by_route(dataset['num_lanes_events'])
+    retval = {}
+    for route in dataset['routes']:
+        route_id = route['route_id']
+        retval[route_id] = overlay_events.overlay_route_events(tmc_events[route_id], town_events.get(route_id, []),
+                                                               speed_limit_events.get(route_id, []),
+                                                               num_lanes_events.get(route_id, []), True)['events']
+    # for
+    return retval
+# def run_overlay()
+
+# run_post_processing: Generate one record per TMC from the intermediate records of every route
+#
+# Parameter: intermediate - dict mapping route_id to list of intermediate records, as returned by run_overlay
+# Return value: total number of output records
+#
+def run_post_processing(intermediate):
+    retval = 0
+    for route_id in sorted(intermediate.keys()):
+        for tmc_id, recs in process_csv_file.group_records_by_tmc(intermediate[route_id]):
+            process_csv_file.process_one_tmc_id(recs)
+            retval += 1
+        # for
+    # for
+    return retval
+# def run_post_processing()
+
+# run_aggregation: Generate one record per TMC from the intermediate records of every route, using aggregate_tmcs
+#
+# Parameter: cols - dict mapping route_id to dict of column arrays of the route's intermediate records
+# Return value: total number of output records
+#
+def run_aggregation(cols):
+    retval = 0
+    for route_id in sorted(cols.keys()):
+        output, problems = aggregate_tmcs.aggregate_by_tmc(cols[route_id])
+        retval += len(output)
+    # for
+    return retval
+# def run_aggregation()
+
+# intermediate_csv_file_name: Return the name of the intermediate CSV file for a route_id
+#
+def intermediate_csv_file_name(route_id):
+    return route_id.lower().replace(' ', '_') + '_events_output.csv'
+# def intermediate_csv_file_name()
+
+# run_csv_write: Write the intermediate CSV file for every route
+#
+# Parameters: intermediate - dict mapping route_id to list of intermediate records
+#             csv_dir - directory in which the CSV files are written
+# Return value: none
+#
+def run_csv_write(intermediate, csv_dir):
+    for route_id in sorted(intermediate.keys()):
+        with process_csv_file.open_csv_for_writing(os.path.join(csv_dir, intermediate_csv_file_name(route_id))) as f:
+            w = csv.DictWriter(f, fieldnames=intermediate_csv_fieldnames, extrasaction='ignore')
+            w.writeheader()
+            w.writerows(intermediate[route_id])
+        # with
+    # for
+# def run_csv_write()
+
+# run_csv_read: Read the intermediate CSV file for every route
+#
+# Return value: total number of records read
+#
+def run_csv_read(route_ids, csv_dir):
+    retval = 0
+    for route_id in route_ids:
+        retval += len(process_csv_file.load_csv(csv_dir, intermediate_csv_file_name(route_id)))
+    # for
+    return retval
+# def run_csv_read()
+
+# run_csv_read_typed: Read the intermediate CSV file for every route into typed columns
+#
+# Return value: total number of records read
+#
+def run_csv_read_typed(route_ids, csv_dir):
+    retval = 0
+    for route_id in route_ids:
+        retval += len(columnar_events.load_csv_columns(os.path.join(csv_dir, intermediate_csv_file_name(route_id)))['tmc'])
+    # for
+    return retval
+# def run_csv_read_typed()
+
+# run_main_routine: Post-process the intermediate CSV file for every route, end-to-end
+#
+def run_main_routine(route_ids, csv_dir):
+    for route_id in route_ids:
+        out_name = route_id.lower().replace(' ', '_') + '_events_final.csv'
+        process_csv_file.main_routine(csv_dir, intermediate_csv_file_name(route_id), csv_dir, out_name)
+    # for
+# def run_main_routine()
+
+# measure: Run a benchmark, recording its fastest wall-clock time and (in a separate run) its peak memory allocation
+#
+# Parameters: fn - function of no arguments to be benchmarked
+#             rows - number of rows processed by one call to fn, used to compute throughput
+#             repeat - number of timed runs
+# Return value: tuple of (dict of results, value returned by the last call to fn)
+#
+def measure(fn, rows, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        value = fn()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # for
+    peak = None
+    if tracemalloc_present:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    # end_if
+    retval = { 'seconds' : round(best, 6), 'rows' : rows,
+               'rows_per_sec' : round(rows / best, 1) if best > 0 else None, 'peak_mem_bytes' : peak }
+    return retval, value
+# def measure()
+
+# run_benchmarks: Run all benchmarks on a synthetic data set
+#
+# Parameters: dataset - synthetic data set
+#             repeat - number of timed runs of each benchmark
+# Return value: dict mapping benchmark name to dict of results (see measure)
+#
+def run_benchmarks(dataset, repeat):
+    results = {}
+    route_ids = [route['route_id'] for route in dataset['routes']]
+    # process_csv_file reports on every TMC it processes; don't let that be part of what is measured
+    saved_report = process_csv_file.report
+    process_csv_file.report = lambda msg: None
+    csv_dir = tempfile.mkdtemp()
+    try:
+        results['locator'], tmc_events = measure(lambda: run_locator(dataset), len(dataset['tmcs']), repeat)
+        num_tmc_events = sum([len(evs) for evs in tmc_events.values()])
+        results['towns'], n = measure(lambda: run_towns(dataset), len(dataset['routes']), repeat)
+        results['overlay'], intermediate = measure(lambda: run_overlay(dataset, tmc_events), num_tmc_events, repeat)
+        num_intermediate = sum([len(recs) for recs in intermediate.values()])
+        results['post_processing'], n = measure(lambda: run_post_processing(intermediate), num_intermediate, repeat)
+        cols = dict([(route_id, aggregate_tmcs.records_to_columns(recs)) for route_id, recs in intermediate.items()])
+        results['aggregation'], n = measure(lambda: run_aggregation(cols), num_intermediate, repeat)
+        results['csv_write'], n = measure(lambda: run_csv_write(intermediate, csv_dir), num_intermediate, repeat)
+        results['csv_read'], n = measure(lambda: run_csv_read(route_ids, csv_dir), num_intermediate, repeat)
+        results['csv_read_typed'], n = measure(lambda: run_csv_read_typed(route_ids, csv_dir), num_intermediate, repeat)
+        results['main_routine'], n = measure(lambda: run_main_routine(route_ids, csv_dir), num_intermediate, repeat)
+    finally:
+        process_csv_file.report = saved_report
+        shutil.rmtree(csv_dir, True)
+    # try/finally
+    return results
+# def run_benchmarks()
+
+# compare_results: Compare benchmark results against a previous baseline
+#
+# Parameters: results - dict of current results
+#             baseline - dict of previous results (the 'results' field of a baseline file)
+#             tolerance - maximum allowed ratio of current time to previous time
+# Return value: list of names of benchmarks that regressed
+#
+def compare_results(results, baseline, tolerance):
+    retval = []
+    for name in sorted(results.keys()):
+        if name not in baseline or not baseline[name]['seconds']:
+            continue
+        # end_if
+        ratio = results[name]['seconds'] / baseline[name]['seconds']
+        status = 'REGRESSION' if ratio > tolerance else 'ok'
+        print('    ' + name + ': ' + str(round(ratio, 2)) + 'x baseline - ' + status)
+        if ratio > tolerance:
+            retval.append(name)
+        # end_if
+    # for
+    return retval
+# def compare_results()
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the stages of the conflation pipeline on synthetic data.')
+    parser.add_argument('--routes', type=int, default=1)
+    parser.add_argument('--statewide', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline-file', default='benchmark_baseline.json')
+    parser.add_argument('--compare', default='')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args()
+
+    num_routes = args.statewide * len(expressway_routes.expressway_route_ids) if args.statewide else args.routes
+    dataset = generate_synthetic_data.make_dataset(num_routes, args.seed)
+    print('Synthetic data set: ' + str(len(dataset['routes'])) + ' routes, ' + str(len(dataset['tmcs'])) + ' TMCs.')
+
+    results = run_benchmarks(dataset, args.repeat)
+    for name in ['locator', 'towns', 'overlay', 'post_processing', 'aggregation', 'csv_write', 'csv_read', 'csv_read_typed', 'main_routine']:
+        res = results[name]
+        print('    ' + name + ': ' + str(res['seconds']) + ' sec, ' + str(res['rows_per_sec']) + ' rows/sec, peak ' +
+              str(res['peak_mem_bytes']) + ' bytes')
+    # for
+
+    baseline = { 'format_version' : baseline_format_version, 'timestamp' : time.strftime('%Y-%m-%d %H:%M:%S'),
+                 'python' : sys.version.split(' ')[0], 'platform' : platform.platform(),
+                 'num_routes' : num_routes, 'seed' : args.seed, 'repeat' : args.repeat, 'results' : results }
+    with open(args.baseline_file, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+    # with
+    print('Results written to: ' + args.baseline_file)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        # with
+        if previous['num_routes'] != num_routes or previous['seed'] != args.seed:
+            print('Warning: ' + args.compare + ' was generated from a different synthetic data set.')
+        # end_if
+        regressions = compare_results(results, previous['results'], args.tolerance)
+        if len(regressions) > 0:
+            print('Performance regressions: ' + ', '.join(regressions))
+            return 1
+        # end_if
+    # end_if
+    return 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
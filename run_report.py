@@ -0,0 +1,139 @@
+# run_report.py - structured per-stage timing and counters for a run of the conflation pipeline
+#
+# A run report is a dict, created by new_run_report, containing:
+#     route_id   - the MassDOT route_id processed
+#     started    - the date and time at which the run started
+#     stages     - list of dicts, one per stage, in the order in which the stages ran, each with the fields:
+#                  name, depth, wall_sec, cpu_sec, rows_in, rows_out, and cached (True if the stage's output was
+#                  taken from the stage cache, False if it was computed, None if the stage isn't cached);
+#                  depth is 0 for a top-level stage, 1 for a step within a top-level stage, etc.
+#     counters   - dict of named counts, e.g., the number of zero-length TMC events discarded
+#     details    - dict of any other information, e.g., the list of problem TMCs
+#
+# A stage is timed by wrapping it in a "with timed_stage(report, name):" block; counters are incremented with count.
+# write_run_report writes the report as a JSON file, and the stages and counters as a CSV file, so that
+# the numbers can be tracked over time from one refresh of the data to the next.
+#
+# 10/18/2026
+
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+import csv_util
+
+# Names of the counters every run report contains
+standard_counters = [ 'tmcs_selected', 'zero_length_tmc_events_discarded', 'clamped_tmc_measures',
+                      'town_id_0_records_deleted', 'empty_tmc_records_deleted', 'negative_from_meas_fixed',
+                      'zero_length_records_deleted', 'intermediate_records', 'output_records', 'problem_tmcs' ]
+
+# Fields of the CSV form of a run report
+run_report_csv_fieldnames = ['route_id', 'started', 'kind', 'name', 'depth', 'wall_sec', 'cpu_sec', 'rows_in', 'rows_out', 'cached', 'value']
+
+# cpu_time: Return the CPU time used by this process, in seconds
+#
+def cpu_time():
+    if sys.version_info[0] < 3:
+        return time.clock()
+    else:
+        return time.process_time()
+    # end_if
+# def cpu_time()
+
+# new_run_report: Create an empty run report
+#
+# Parameter: route_id - MassDOT route_id
+# Return value: run report (dict)
+#
+def new_run_report(route_id):
+    retval = { 'route_id' : route_id, 'started' : time.strftime('%Y-%m-%d %H:%M:%S'),
+               'stages' : [], 'open_stages' : 0, 'counters' : {}, 'details' : {} }
+    for name in standard_counters:
+        retval['counters'][name] = 0
+    # for
+    return retval
+# def new_run_report()
+
+# timed_stage: Context manager timing a stage of the run
+#
+# Parameters: report - run report
+#             name - name of the stage
+#             rows_in - OPTIONAL number of rows input to the stage
+# Yields: the dict recording the stage, in which the caller may set 'rows_out' (and 'rows_in', 'cached')
+#
+# Stages may be nested; a stage started within another is recorded as a step of that stage (see 'depth', above).
+# The wall-clock and CPU times are recorded even if the stage raises an exception.
+#
+@contextlib.contextmanager
+def timed_stage(report, name, rows_in=None):
+    stage = { 'name' : name, 'depth' : report['open_stages'], 'wall_sec' : None, 'cpu_sec' : None,
+              'rows_in' : rows_in, 'rows_out' : None, 'cached' : None }
+    report['stages'].append(stage)
+    report['open_stages'] += 1
+    wall_start = time.time()
+    cpu_start = cpu_time()
+    try:
+        yield stage
+    finally:
+        stage['wall_sec'] = round(time.time() - wall_start, 6)
+        stage['cpu_sec'] = round(cpu_time() - cpu_start, 6)
+        report['open_stages'] -= 1
+    # try/finally
+# def timed_stage()
+
+# count: Add to a counter in a run report
+#
+# Parameters: report - run report
+#             name - name of the counter
+#             n - OPTIONAL amount to be added (default: 1)
+# Return value: none
+#
+def count(report, name, n=1):
+    report['counters'][name] = report['counters'].get(name, 0) + int(n)
+# def count()
+
+# total_time: Return the total wall-clock and CPU time of the (top-level) stages in a run report
+#
+# Return value: tuple of (wall_sec, cpu_sec)
+#
+def total_time(report):
+    top = [stage for stage in report['stages'] if stage['depth'] == 0]
+    wall = sum([stage['wall_sec'] or 0.0 for stage in top])
+    cpu = sum([stage['cpu_sec'] or 0.0 for stage in top])
+    return wall, cpu
+# def total_time()
+
+# write_run_report: Write a run report as a JSON file and a CSV file
+#
+# Parameters: report - run report
+#             out_dir - directory in which the files are written; it is created if necessary
+# Return value: full path of the JSON file; the CSV file has the same name, with the extension .csv
+#
+# The names of the files are <route_id>_<date>_<time>.json/.csv, so that the reports of successive runs accumulate.
+#
+def write_run_report(report, out_dir):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    # end_if
+    stamp = report['started'].replace('-', '').replace(':', '').replace(' ', '_')
+    base_fn = os.path.join(out_dir, report['route_id'].lower().replace(' ', '_') + '_' + stamp)
+    # open_stages is bookkeeping for timed_stage, not part of the report
+    with open(base_fn + '.json', 'w') as f:
+        json.dump(dict([(k, v) for k, v in report.items() if k != 'open_stages']), f, indent=1, sort_keys=True)
+    # with
+    with csv_util.open_csv_for_writing(base_fn + '.csv') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=run_report_csv_fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for stage in report['stages']:
+            writer.writerow(dict(stage, route_id=report['route_id'], started=report['started'], kind='stage'))
+        # for
+        for name in sorted(report['counters'].keys()):
+            writer.writerow({ 'route_id' : report['route_id'], 'started' : report['started'], 'kind' : 'counter',
+                              'name' : name, 'value' : report['counters'][name] })
+        # for
+    # with
+    return base_fn + '.json'
+# def write_run_report()
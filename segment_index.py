@@ -0,0 +1,251 @@
+# segment_index.py - uniform-grid spatial index over line segments
+#
+# The index is built over the segments of one or more polylines (e.g., the segments of MassDOT LRSN routes,
+# as returned by tmc_locator.route_segments) and answers, for a batch of points:
+#     1. which segments lie within a given tolerance of each point (segments_within), and
+#     2. which segment is nearest to each point (nearest_segments).
+# Each segment is registered in every grid cell its bounding box overlaps, so a query only examines the
+# segments in the cells near each point; the per-point cost does not grow with the number of routes indexed.
+# Both queries are computed for all points at once using NumPy.
+#
+# The index is a dict of NumPy arrays:
+#     x0, y0, x1, y1 - segment endpoint coordinates
+#     min_x, min_y, cell_size, n_cols, n_rows - grid geometry
+#     cell_start - offsets into cell_segs of the segments registered in each cell (length n_cols * n_rows + 1)
+#     cell_segs - segment indices, ordered by cell
+#
+# 10/18/2026
+
+import numpy as np
+
+# Maximum number of grid cells, expressed as a multiple of the number of segments indexed
+max_cells_per_segment = 4
+
+# point_segment_distance: Compute the distance from points to segments, pairwise
+#
+# Parameters: px, py - arrays of point coordinates
+#             x0, y0, x1, y1 - arrays of segment endpoint coordinates (broadcastable against px and py)
+# Return value: tuple of (squared distance, parameter t in [0, 1] of the nearest point along the segment)
+#
+def point_segment_distance(px, py, x0, y0, x1, y1):
+    dx = x1 - x0
+    dy = y1 - y0
+    len_sq = dx * dx + dy * dy
+    safe_len_sq = np.where(len_sq > 0.0, len_sq, 1.0)
+    t = ((px - x0) * dx + (py - y0) * dy) / safe_len_sq
+    t = np.clip(np.where(len_sq > 0.0, t, 0.0), 0.0, 1.0)
+    qx = x0 + t * dx
+    qy = y0 + t * dy
+    return (px - qx) ** 2 + (py - qy) ** 2, t
+# def point_segment_distance()
+
+# _expand_ranges: Enumerate the integer pairs in a batch of rectangular ranges
+#
+# Parameters: c0, c1, r0, r1 - arrays giving the (inclusive) column and row range of each rectangle
+# Return value: tuple of (rectangle index, column, row) arrays, with one entry per cell in each rectangle
+#
+def _expand_ranges(c0, c1, r0, r1):
+    widths = c1 - c0 + 1
+    counts = widths * (r1 - r0 + 1)
+    owner = np.repeat(np.arange(len(c0)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = c0[owner] + local % widths[owner]
+    rows = r0[owner] + local // widths[owner]
+    return owner, cols, rows
+# def _expand_ranges()
+
+# _cell_range: Return the (clipped) range of grid columns and rows covered by a batch of boxes
+#
+def _cell_range(index, lo_x, lo_y, hi_x, hi_y):
+    cs = index['cell_size']
+    c0 = np.clip(np.floor((lo_x - index['min_x']) / cs).astype(np.int64), 0, index['n_cols'] - 1)
+    c1 = np.clip(np.floor((hi_x - index['min_x']) / cs).astype(np.int64), 0, index['n_cols'] - 1)
+    r0 = np.clip(np.floor((lo_y - index['min_y']) / cs).astype(np.int64), 0, index['n_rows'] - 1)
+    r1 = np.clip(np.floor((hi_y - index['min_y']) / cs).astype(np.int64), 0, index['n_rows'] - 1)
+    return c0, c1, r0, r1
+# def _cell_range()
+
+# build_segment_index: Build a uniform-grid index over a set of segments
+#
+# Parameters: x0, y0, x1, y1 - arrays of segment endpoint coordinates
+#             cell_size - OPTIONAL size of a grid cell (in the units of the coordinates); by default,
+#                         chosen so that each cell holds a small number of segments
+# Return value: index dict (see above)
+#
+def build_segment_index(x0, y0, x1, y1, cell_size=None):
+    x0 = np.asarray(x0, dtype=np.float64); y0 = np.asarray(y0, dtype=np.float64)
+    x1 = np.asarray(x1, dtype=np.float64); y1 = np.asarray(y1, dtype=np.float64)
+    n = len(x0)
+    lo_x = np.minimum(x0, x1); hi_x = np.maximum(x0, x1)
+    lo_y = np.minimum(y0, y1); hi_y = np.maximum(y0, y1)
+    min_x = float(lo_x.min()); max_x = float(hi_x.max())
+    min_y = float(lo_y.min()); max_y = float(hi_y.max())
+    width = max(max_x - min_x, 1e-9)
+    height = max(max_y - min_y, 1e-9)
+    if cell_size is None:
+        # Start from the typical segment extent, but don't let the grid get too fine
+        extent = np.maximum(hi_x - lo_x, hi_y - lo_y)
+        cell_size = max(float(np.median(extent)), np.sqrt(width * height / max(n, 1)))
+    # end_if
+    cell_size = max(cell_size, np.sqrt(width * height / (max_cells_per_segment * max(n, 1))), 1e-9)
+    n_cols = int(width // cell_size) + 1
+    n_rows = int(height // cell_size) + 1
+
+    index = { 'x0' : x0, 'y0' : y0, 'x1' : x1, 'y1' : y1,
+              'min_x' : min_x, 'min_y' : min_y, 'cell_size' : float(cell_size), 'n_cols' : n_cols, 'n_rows' : n_rows }
+    c0, c1, r0, r1 = _cell_range(index, lo_x, lo_y, hi_x, hi_y)
+    seg, cols, rows = _expand_ranges(c0, c1, r0, r1)
+    cells = rows * n_cols + cols
+    order = np.lexsort((seg, cells))
+    index['cell_segs'] = seg[order]
+    counts = np.bincount(cells, minlength=n_cols * n_rows)
+    index['cell_start'] = np.concatenate([[0], np.cumsum(counts)])
+    return index
+# def build_segment_index()
+
+# segments_in_boxes: Return the (box, segment) pairs for segments registered in the grid cells overlapped by each of a batch of boxes
+#
+# Parameters: index - segment index
+#             lo_x, lo_y, hi_x, hi_y - arrays of box bounds
+# Return value: tuple of (box index, segment index) arrays, free of duplicates, sorted on box and segment;
+#               every segment whose bounding box overlaps a box is included (along with some that don't)
+#
+def segments_in_boxes(index, lo_x, lo_y, hi_x, hi_y):
+    c0, c1, r0, r1 = _cell_range(index, np.asarray(lo_x, dtype=np.float64), np.asarray(lo_y, dtype=np.float64),
+                                 np.asarray(hi_x, dtype=np.float64), np.asarray(hi_y, dtype=np.float64))
+    box, cols, rows = _expand_ranges(c0, c1, r0, r1)
+    cells = rows * index['n_cols'] + cols
+    starts = index['cell_start'][cells]
+    counts = index['cell_start'][cells + 1] - starts
+    pair_box = np.repeat(box, counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_seg = index['cell_segs'][np.repeat(starts, counts) + local]
+    n_segs = len(index['x0'])
+    keys = np.unique(pair_box.astype(np.int64) * n_segs + pair_seg)
+    return keys // n_segs, keys % n_segs
+# def segments_in_boxes()
+
+# _candidates: Return the (point, segment) pairs for segments registered in cells within radius of each point
+#
+# Parameters: index - segment index
+#             px, py - arrays of point coordinates
+#             radius - array of search radii, one per point
+# Return value: tuple of (point index, segment index) arrays, free of duplicates, sorted on point and segment
+#
+def _candidates(index, px, py, radius):
+    return segments_in_boxes(index, px - radius, py - radius, px + radius, py + radius)
+# def _candidates()
+
+# segments_within: Find all segments within a tolerance of each of a batch of points
+#
+# Parameters: index - segment index
+#             px, py - arrays of point coordinates
+#             tolerance - search distance
+# Return value: tuple of (point index, segment index, distance) arrays, one entry per (point, segment) pair
+#               within the tolerance, sorted on point index and distance
+#
+def segments_within(index, px, py, tolerance):
+    px = np.asarray(px, dtype=np.float64); py = np.asarray(py, dtype=np.float64)
+    pt, seg = _candidates(index, px, py, np.full(len(px), float(tolerance)))
+    d_sq, t = point_segment_distance(px[pt], py[pt], index['x0'][seg], index['y0'][seg], index['x1'][seg], index['y1'][seg])
+    dist = np.sqrt(d_sq)
+    keep = dist <= tolerance
+    pt = pt[keep]; seg = seg[keep]; dist = dist[keep]
+    order = np.lexsort((seg, dist, pt))
+    return pt[order], seg[order], dist[order]
+# def segments_within()
+
+# nearest_segments: Find the segment nearest to each of a batch of points
+#
+# Parameters: index - segment index
+#             px, py - arrays of point coordinates
+#             tolerance - OPTIONAL maximum search distance; points with no segment within this distance
+#                         are assigned a segment index of -1 (and an infinite distance)
+# Return value: tuple of arrays, one entry per point:
+#               (1) index of nearest segment
+#               (2) distance to the nearest segment
+#               (3) parameter t in [0, 1] of the nearest point along that segment
+#
+# Ties are resolved in favor of the segment with the lowest index.
+# The search starts with a radius of one grid cell, and doubles the radius for those points whose
+# nearest candidate is farther away than the radius searched, until every point is resolved.
+#
+def nearest_segments(index, px, py, tolerance=None):
+    px = np.asarray(px, dtype=np.float64); py = np.asarray(py, dtype=np.float64)
+    n_pts = len(px)
+    best_seg = np.full(n_pts, -1, dtype=np.int64)
+    best_dist = np.full(n_pts, np.inf)
+    best_t = np.zeros(n_pts)
+    # The radius at which the search for each point covers every cell of the grid
+    max_x = index['min_x'] + index['n_cols'] * index['cell_size']
+    max_y = index['min_y'] + index['n_rows'] * index['cell_size']
+    max_radius = np.maximum(np.maximum(np.abs(px - index['min_x']), np.abs(px - max_x)),
+                            np.maximum(np.abs(py - index['min_y']), np.abs(py - max_y)))
+    radius = np.full(n_pts, index['cell_size'])
+    if tolerance is not None:
+        radius = np.minimum(radius, float(tolerance))
+    # end_if
+    pending = np.arange(n_pts)
+    while len(pending) > 0:
+        pt, seg = _candidates(index, px[pending], py[pending], radius[pending])
+        d_sq, t = point_segment_distance(px[pending][pt], py[pending][pt],
+                                         index['x0'][seg], index['y0'][seg], index['x1'][seg], index['y1'][seg])
+        # Nearest candidate for each point: sort on point, distance, and segment, and take the first of each group
+        order = np.lexsort((seg, d_sq, pt))
+        pt = pt[order]; seg = seg[order]; d_sq = d_sq[order]; t = t[order]
+        first = np.ones(len(pt), dtype=bool)
+        first[1:] = pt[1:] != pt[:-1]
+        found_dist = np.full(len(pending), np.inf)
+        found_seg = np.full(len(pending), -1, dtype=np.int64)
+        found_t = np.zeros(len(pending))
+        found_dist[pt[first]] = np.sqrt(d_sq[first])
+        found_seg[pt[first]] = seg[first]
+        found_t[pt[first]] = t[first]
+        # A point is resolved if its nearest candidate lies within the radius searched (no un-searched
+        # segment can be nearer), if the entire grid has been searched, or if the tolerance has been reached
+        done = (found_dist <= radius[pending]) | (radius[pending] >= max_radius[pending])
+        if tolerance is not None:
+            done |= radius[pending] >= tolerance
+            found_seg = np.where(found_dist <= tolerance, found_seg, -1)
+            found_dist = np.where(found_dist <= tolerance, found_dist, np.inf)
+        # end_if
+        resolved = pending[done]
+        best_seg[resolved] = found_seg[done]
+        best_dist[resolved] = found_dist[done]
+        best_t[resolved] = found_t[done]
+        pending = pending[~done]
+        radius[pending] *= 2.0
+        if tolerance is not None:
+            radius[pending] = np.minimum(radius[pending], float(tolerance))
+        # end_if
+    # while
+    return best_seg, best_dist, best_t
+# def nearest_segments()
+
+# build_network_index: Build a single index over the segments of many routes
+#
+# Parameter: segs_by_route - dict mapping route_id to a dict of segment arrays (as returned by tmc_locator.route_segments)
+# Return value: segment index (see build_segment_index) with the following additional entries:
+#               route_ids - list of route_ids, in sorted order
+#               seg_route - array giving, for each segment, the position of its route_id in route_ids
+#               seg_local - array giving, for each segment, its index among the segments of its route
+#
+def build_network_index(segs_by_route):
+    route_ids = sorted(segs_by_route.keys())
+    arrays = { 'x0' : [], 'y0' : [], 'x1' : [], 'y1' : [] }
+    seg_route = []; seg_local = []
+    for route_ix, route_id in enumerate(route_ids):
+        segs = segs_by_route[route_id]
+        for key in arrays:
+            arrays[key].append(segs[key])
+        # for
+        seg_route.append(np.full(len(segs['x0']), route_ix, dtype=np.int64))
+        seg_local.append(np.arange(len(segs['x0']), dtype=np.int64))
+    # for
+    retval = build_segment_index(np.concatenate(arrays['x0']), np.concatenate(arrays['y0']),
+                                 np.concatenate(arrays['x1']), np.concatenate(arrays['y1']))
+    retval['route_ids'] = route_ids
+    retval['seg_route'] = np.concatenate(seg_route)
+    retval['seg_local'] = np.concatenate(seg_local)
+    return retval
+# def build_network_index()
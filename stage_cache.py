@@ -0,0 +1,241 @@
+# stage_cache.py - content-addressed cache of the outputs of the stages of the conflation pipeline
+#
+# The output of each stage (e.g., the TMC events, town events, or speed limit events for a route) is stored
+# in a file whose name is a hash - the "key" - of everything the stage's output depends upon: the route
+# geometry, the TMC selection, a "stamp" identifying the snapshot of each input data source, the parameters
+# of the stage, and the keys of any upstream stages. When a stage is re-run with inputs whose key matches that
+# of a cached output, the cached output is returned and the stage itself is skipped.
+#
+# Cached outputs are stored as pickle files in <cache_dir>\<stage_name>\<key>.pkl.
+# A cache hit updates the file's modification time, so that evict() can discard the least-recently-used
+# entries once the cache exceeds a given size, as well as any entries that haven't been used for a given time.
+#
+# 10/18/2026
+
+import hashlib
+import os
+import pickle
+import time
+
+import numpy as np
+
+# Version of the cache format; bumping this invalidates all existing cache entries
+cache_format_version = 2
+
+# _update_hash: Feed a canonical serialization of a value into a hash object
+#
+def _update_hash(h, value):
+    if isinstance(value, np.ndarray):
+        h.update(b'ndarray:' + str(value.dtype).encode('utf-8') + b':' + str(value.shape).encode('utf-8') + b':')
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b'dict:' + str(len(value)).encode('utf-8') + b':')
+        for key in sorted(value.keys(), key=repr):
+            _update_hash(h, key)
+            _update_hash(h, value[key])
+        # for
+    elif isinstance(value, (list, tuple)):
+        h.update(b'list:' + str(len(value)).encode('utf-8') + b':')
+        for item in value:
+            _update_hash(h, item)
+        # for
+    else:
+        h.update(type(value).__name__.encode('utf-8') + b':' + repr(value).encode('utf-8') + b';')
+    # end_if
+# def _update_hash()
+
+# cache_key: Compute the cache key for a stage
+#
+# Parameters: stage_name - name of the stage
+#             inputs - (possibly nested) list, tuple, or dict of the stage's inputs; may contain
+#                      strings, numbers, NumPy arrays, and the keys of upstream stages
+# Return value: hexadecimal string
+#
+def cache_key(stage_name, inputs):
+    h = hashlib.sha1()
+    _update_hash(h, ['stage_cache', cache_format_version, stage_name, inputs])
+    return h.hexdigest()
+# def cache_key()
+
+# source_stamp: Return a string identifying the current snapshot of an input data source
+#
+# Parameter: path - full path of the data source, e.g., a feature class in a file geodatabase or an SDE database
+# Return value: for a data source in a file geodatabase, the path followed by the latest modification time
+#               of any file in the geodatabase; otherwise (e.g., for an SDE data source), the path alone.
+#
+# Note: The SDE data sources used by the pipeline are dated snapshots (e.g., MASSDOT_LRSN_Routes_19Dec2019,
+#       INRIX_MASSACHUSETTS_TMC_2019), so their paths alone identify their contents.
+#
+def source_stamp(path):
+    lower = path.lower()
+    gdb_end = lower.find('.gdb')
+    if gdb_end == -1:
+        return path
+    # end_if
+    gdb = path[:gdb_end + 4]
+    if not os.path.isdir(gdb):
+        return path
+    # end_if
+    latest = 0.0
+    for name in os.listdir(gdb):
+        latest = max(latest, os.path.getmtime(os.path.join(gdb, name)))
+    # for
+    return path + '@' + repr(latest)
+# def source_stamp()
+
+# _entry_path: Return the full path of the file containing a cache entry
+#
+def _entry_path(cache_dir, stage_name, key):
+    return os.path.join(cache_dir, stage_name, key + '.pkl')
+# def _entry_path()
+
+# load_stage: Load the cached output of a stage, if there is one
+#
+# Parameters: cache_dir - full path of cache directory
+#             stage_name - name of the stage
+#             key - cache key
+# Return value: tuple of (True, cached output) on a cache hit, or (False, None) on a miss
+#
+def load_stage(cache_dir, stage_name, key):
+    fn = _entry_path(cache_dir, stage_name, key)
+    if not os.path.exists(fn):
+        return False, None
+    # end_if
+    try:
+        with open(fn, 'rb') as f:
+            value = pickle.load(f)
+        # with
+    except Exception:
+        # A truncated or otherwise unreadable entry is treated as a miss
+        return False, None
+    # try/except
+    os.utime(fn, None)
+    return True, value
+# def load_stage()
+
+# store_stage: Store the output of a stage in the cache
+#
+# Parameters: cache_dir - full path of cache directory
+#             stage_name - name of the stage
+#             key - cache key
+#             value - output of the stage; must be picklable
+# Return value: none
+#
+def store_stage(cache_dir, stage_name, key, value):
+    fn = _entry_path(cache_dir, stage_name, key)
+    stage_dir = os.path.dirname(fn)
+    if not os.path.isdir(stage_dir):
+        try:
+            os.makedirs(stage_dir)
+        except OSError:
+            # Another process (e.g., a worker of batch_conflate_routes.py) may have created it in the meantime
+            if not os.path.isdir(stage_dir):
+                raise
+            # end_if
+        # try/except
+    # end_if
+    # Write to a temporary file, then rename it over any existing entry, so that a partially-written entry is never
+    # visible. Several processes may store the same entry at once (e.g., 'town_polygons'); since the value of a key
+    # is the same whichever process computed it, losing the race to another process's entry is not an error.
+    tmp_fn = fn + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_fn, 'wb') as f:
+        pickle.dump(value, f, protocol=2)
+    # with
+    try:
+        if hasattr(os, 'replace'):
+            os.replace(tmp_fn, fn)
+        else:
+            # Python 2: os.rename replaces an existing file, except on Windows
+            os.rename(tmp_fn, fn)
+        # end_if
+    except OSError:
+        if not os.path.exists(fn):
+            raise
+        # end_if
+        os.remove(tmp_fn)
+    # try/except
+# def store_stage()
+
+# cached_stage: Return the output of a stage, computing it only if it is not already cached
+#
+# Parameters: cache_dir - full path of cache directory; if None or '', caching is disabled
+#             stage_name - name of the stage
+#             key - cache key, as returned by cache_key
+#             compute - function of no arguments that computes the output of the stage
+#             force - True to re-compute (and re-cache) the output even if it is cached
+#             report - OPTIONAL function used to report whether the stage was computed or taken from the cache
+#             info - OPTIONAL dict in which 'cached' is set to True if the output was taken from the cache, otherwise False
+# Return value: output of the stage
+#
+def cached_stage(cache_dir, stage_name, key, compute, force=False, report=None, info=None):
+    if info is None:
+        info = {}
+    # end_if
+    info['cached'] = False
+    if cache_dir and not force:
+        hit, value = load_stage(cache_dir, stage_name, key)
+        if hit:
+            if report:
+                report("Using cached output of stage '" + stage_name + "'.")
+            # end_if
+            info['cached'] = True
+            return value
+        # end_if
+    # end_if
+    value = compute()
+    if cache_dir:
+        store_stage(cache_dir, stage_name, key, value)
+    # end_if
+    return value
+# def cached_stage()
+
+# evict: Remove entries from the cache
+#
+# Parameters: cache_dir - full path of cache directory
+#             max_bytes - maximum total size of the cache; the least-recently-used entries are removed
+#                         until the total size is no larger than this
+#             max_age_days - OPTIONAL; entries not used for more than this many days are removed
+# Return value: number of entries removed
+#
+def evict(cache_dir, max_bytes, max_age_days=None):
+    if not os.path.isdir(cache_dir):
+        return 0
+    # end_if
+    entries = []
+    for stage_name in os.listdir(cache_dir):
+        stage_dir = os.path.join(cache_dir, stage_name)
+        if not os.path.isdir(stage_dir):
+            continue
+        # end_if
+        for name in os.listdir(stage_dir):
+            if name.endswith('.pkl'):
+                fn = os.path.join(stage_dir, name)
+                try:
+                    entries.append((os.path.getmtime(fn), os.path.getsize(fn), fn))
+                except OSError:
+                    # Removed by a concurrent process
+                    pass
+                # try/except
+            # end_if
+        # for
+    # for
+    # Most recently used first
+    entries.sort(reverse=True)
+    now = time.time()
+    total = 0
+    removed = 0
+    for mtime, size, fn in entries:
+        too_old = max_age_days is not None and (now - mtime) > max_age_days * 86400.0
+        if too_old or total + size > max_bytes:
+            try:
+                os.remove(fn)
+                removed += 1
+            except OSError:
+                pass
+            # try/except
+        else:
+            total += size
+        # end_if
+    # for
+    return removed
+# def evict()
@@ -0,0 +1,663 @@
+# statewide_session.py - conflate INRIX TMCs onto many MassDOT routes in a single session, loading the shared inputs once
+#
+# Usage: python statewide_session.py [--route-list-file <file>] [--tmc-list-dir <dir>] [--merged-file <file>]
+#                                    [--summary-file <file>] [--no-csv-export] [--prefetch-depth <n>]
+#                                    [--tile-size <size> [--tile-halo <width>] [--tile-workers <n>]]
+#
+#     --route-list-file, --tmc-list-dir - the routes to be processed, and their TMC list files (see batch_conflate_routes.py)
+#     --merged-file   - CSV file in which the final records of all routes are written
+#                       (default: statewide_events_final.csv in the csv_final directory)
+#     --summary-file  - CSV file in which the per-route success/failure summary is written
+#                       (default: session_summary.csv in the base directory)
+#     --no-csv-export - don't export each route's intermediate event table as a CSV file (its columnar form is always written)
+#     --prefetch-depth - number of routes whose inputs are loaded ahead, and whose outputs are written behind, on background
+#                       threads while the current route is conflated (default: 2); 0 to do everything on one thread
+#     --tile-size     - locate the TMCs, towns, and LRSE events along all the routes at once, on square tiles of this size
+#                       (in meters; e.g., 20000), in parallel (see tiled_processing.py); default: 0, one route at a time
+#     --tile-halo     - width of the halo around each tile, in meters (default: 250)
+#     --tile-workers  - number of worker processes for the tiles (default: the number of CPUs)
+#
+# generate_tmc_events_for_expressways.conflate_route makes feature layers over the statewide INRIX TMC, LRSN route, and
+# LRSE feature classes, and selects from them, for every route it processes. In a session, each of these inputs is read
+# just once, with a single search cursor, and indexed in memory:
+#     1. the geometry of the requested LRSN routes, by route_id (from the route store, if it is current - see route_store.py)
+#     2. the INRIX TMCs (attributes and first and last points), by TMC ID and by INRIX roadnum and direction
+#     3. the town polygons, prepared for locating along routes (see town_events.py)
+#     4. the current (to_date IS NULL) speed limit and number of lanes LRSE events, by route_id
+# Each route is then conflated against this shared state, so the cost per route is only that of the route-specific work:
+# locating its TMCs and towns, the overlays, and writing its intermediate and final tables. The final records of all
+# the routes are also written to one merged CSV file.
+#
+# NOTE: conflate_route selects the LRSE events that lie WITHIN the route's geometry, and locates them along it.
+#       Here, the events recorded on the route itself are used with their own measures (the regenerated LRSE feature
+#       classes - see regenerate_LRSE_FCs.py - are generated from exactly those measures), and events recorded on
+#       other routes are included if both their first and last points lie within lrse_xy_tolerance of the route,
+#       e.g., where two routes run concurrently; their measures are those of the projections of these points.
+#       Neither the stage cache nor the event table geodatabases are used; the intermediate and final tables
+#       are written to the csv_intermediate and csv_final directories, as usual.
+#
+# 10/18/2026
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+import traceback
+
+import numpy as np
+
+import arcpy
+import batch_conflate_routes
+import generate_tmc_events_for_expressways as driver
+import overlay_events
+import prefetch
+import process_csv_file
+import route_store
+import run_report
+import stage_cache
+import tiled_processing
+import tmc_locator
+import town_events
+
+# XY tolerance (in meters) within which the first and last points of an LRSE event recorded on another route
+# must lie for the event to be located along a route; the same as that used with LocateFeaturesAlongRoutes_lr
+lrse_xy_tolerance = 0.0002
+
+# Names of fields read from the INRIX TMC FC (the same as in conflate_route)
+tmc_fc_fieldnames = ['tmc', 'tmctype', 'roadnum', 'firstnm', 'direction', 'shape@']
+
+# Names of the fields of a TMC event
+et_fieldnames = ['route_id', 'from_meas', 'to_meas', 'tmc', 'tmctype', 'roadnum', 'firstnm', 'direction']
+
+# read_lrse_events: Read the current events of an LRSE feature class
+#
+# Parameters: lrse_fc - full path of LRSE FC
+#             attr_fieldname - name of the attribute field, e.g., 'speed_lim'
+# Return value: dict mapping route_id to dict of arrays, with one entry per event:
+#               from_meas, to_meas, value, and the coordinates of each event's first and last points (x0, y0, x1, y1)
+#               A <Null> attribute value is read as 0, i.e., as if there were no event.
+#
+def read_lrse_events(lrse_fc, attr_fieldname):
+    by_route = {}
+    for row in arcpy.da.SearchCursor(lrse_fc, ['route_id', 'from_measure', 'to_measure', attr_fieldname, 'shape@'], "to_date IS NULL"):
+        shape = row[4]
+        if shape is None:
+            continue
+        # end_if
+        by_route.setdefault(row[0], []).append((row[1], row[2], row[3] or 0, shape.firstPoint.X, shape.firstPoint.Y,
+                                                shape.lastPoint.X, shape.lastPoint.Y))
+    # for
+    retval = {}
+    for route_id, rows in by_route.items():
+        cols = list(zip(*rows))
+        retval[route_id] = { 'from_meas' : np.array(cols[0], dtype=np.float64), 'to_meas' : np.array(cols[1], dtype=np.float64),
+                             'value' : np.array(cols[2], dtype=np.int64),
+                             'x0' : np.array(cols[3], dtype=np.float64), 'y0' : np.array(cols[4], dtype=np.float64),
+                             'x1' : np.array(cols[5], dtype=np.float64), 'y1' : np.array(cols[6], dtype=np.float64) }
+    # for
+    return retval
+# def read_lrse_events()
+
+# tmc_geometry_hash: Return a hash of a TMC's attributes and geometry
+#
+# Parameters: attrs - list of the values of the first 5 of tmc_fc_fieldnames
+#             shape - arcpy Polyline geometry object
+# Return value: hex digest; coordinates are rounded to the nearest millimeter, so that a TMC whose geometry was merely
+#               re-stored (e.g., copied to another database) hashes the same
+#
+def tmc_geometry_hash(attrs, shape):
+    pts = []
+    for part in shape:
+        for pnt in part:
+            if pnt:
+                pts.append((round(pnt.X, 3), round(pnt.Y, 3)))
+            # end_if
+        # for
+    # for
+    return hashlib.sha1(repr((list(attrs), pts)).encode('utf-8')).hexdigest()
+# def tmc_geometry_hash()
+
+# read_tmcs: Read all the TMCs in an INRIX TMC feature class
+#
+# Parameters: tmc_fc - full path of the TMC FC, e.g., INRIX_MASSACHUSETTS_TMC_2019
+#             with_hash - OPTIONAL; True to compute the hash of each TMC's attributes and geometry (see tmc_geometry_hash)
+# Return value: list of TMC records, each a dict with the fields 'attrs' (list of the values of the first 5 of
+#               tmc_fc_fieldnames), 'from_x', 'from_y', 'to_x', 'to_y' (coordinates of its first and last points),
+#               and, if with_hash is True, 'hash'
+#
+def read_tmcs(tmc_fc, with_hash=False):
+    retval = []
+    for tmc_feat in arcpy.da.SearchCursor(tmc_fc, tmc_fc_fieldnames):
+        shape = tmc_feat[5]
+        if shape is None:
+            continue
+        # end_if
+        rec = { 'attrs' : list(tmc_feat[:5]), 'from_x' : shape.firstPoint.X, 'from_y' : shape.firstPoint.Y,
+                'to_x' : shape.lastPoint.X, 'to_y' : shape.lastPoint.Y }
+        if with_hash:
+            rec['hash'] = tmc_geometry_hash(tmc_feat[:5], shape)
+        # end_if
+        retval.append(rec)
+    # for
+    return retval
+# def read_tmcs()
+
+# index_tmcs: Index a list of TMC records
+#
+# Parameter: tmcs - list of TMC records, as returned by read_tmcs
+# Return value: tuple of (dict mapping TMC ID to index in tmcs, dict mapping (roadnum, direction) to list of indices in tmcs)
+#
+def index_tmcs(tmcs):
+    by_id = {}; by_road = {}
+    for i, tmc in enumerate(tmcs):
+        by_id[tmc['attrs'][0]] = i
+        by_road.setdefault((tmc['attrs'][2], tmc['attrs'][4]), []).append(i)
+    # for
+    return by_id, by_road
+# def index_tmcs()
+
+# read_routes: Read the geometry of a list of routes from the LRSN routes FC
+#
+# Parameter: route_ids - list of route_ids
+# Return value: dict mapping route_id to dict of route segment arrays (see tmc_locator.route_segments);
+#               a route with no segments is omitted, so that one degenerate route doesn't abort the loading of the others
+#
+def read_routes(route_ids):
+    retval = {}
+    if len(route_ids) > 0:
+        query_string = "route_id IN (" + ", ".join(["'" + route_id + "'" for route_id in route_ids]) + ")"
+        for route_feat in arcpy.da.SearchCursor(driver.MASSDOT_LRSN_Routes_19Dec2019, ['route_id', 'shape@'], query_string):
+            if route_feat[0] not in retval and route_feat[1] is not None:
+                try:
+                    retval[route_feat[0]] = tmc_locator.route_segments(driver.get_route_parts(route_feat[1]))
+                except ValueError:
+                    # Route geometry contains no segments; reported by load_route_inputs
+                    pass
+                # try/except
+            # end_if
+        # for
+    # end_if
+    return retval
+# def read_routes()
+
+# load_session: Read the inputs shared by all routes, and index them
+#
+# Parameters: route_ids - list of the route_ids of the routes to be conflated
+#             tmc_fc - OPTIONAL full path of the INRIX TMC FC (default: INRIX_MASSACHUSETTS_TMC_2019)
+#             tmcs - OPTIONAL list of TMC records already read from the TMC FC (see read_tmcs)
+#             concurrent - OPTIONAL; if True, the inputs are read at the same time, each on its own thread (see prefetch.py),
+#                          and routes not in the route store are left to be read as each is reached (see load_route_inputs)
+# Return value: session (dict) containing:
+#               routes - dict mapping route_id to dict of route segment arrays (see tmc_locator.route_segments)
+#               tmcs - list of TMC records (see read_tmcs)
+#               tmcs_by_id - dict mapping TMC ID to index in tmcs
+#               tmcs_by_road - dict mapping (roadnum, direction) to list of indices in tmcs
+#               towns - prepared town polygons
+#               speed_limit, num_lanes - dicts mapping route_id to LRSE events (see read_lrse_events)
+#               report - run report for the loading of the session
+#
+def load_session(route_ids, tmc_fc=None, tmcs=None, concurrent=False):
+    rpt = run_report.new_run_report('statewide session')
+    retval = { 'report' : rpt }
+
+    def load_routes():
+        with run_report.timed_stage(rpt, 'read_routes') as st:
+            # Routes are taken from the route store if it is current; any not found there are read from the routes FC
+            routes = route_store.load_route_segments(driver.route_store_dir,
+                                                     stage_cache.source_stamp(driver.MASSDOT_LRSN_Routes_19Dec2019), route_ids) or {}
+            if not concurrent:
+                routes.update(read_routes([route_id for route_id in route_ids if route_id not in routes]))
+            # end_if
+            st['rows_out'] = len(routes)
+        # with
+        return routes
+    # def load_routes()
+    def load_tmcs():
+        with run_report.timed_stage(rpt, 'read_tmcs') as st:
+            retval = tmcs if tmcs is not None else read_tmcs(tmc_fc if tmc_fc else driver.INRIX_MASSACHUSETTS_TMC_2019)
+            st['rows_out'] = len(retval)
+        # with
+        return retval
+    # def load_tmcs()
+    def load_towns():
+        with run_report.timed_stage(rpt, 'prepare_town_polygons') as st:
+            retval = driver.get_prepared_town_polygons(driver.towns_pb_r, driver.stage_cache_dir)
+            st['rows_out'] = len(retval['town_id'])
+        # with
+        return retval
+    # def load_towns()
+    def load_speed_limit():
+        with run_report.timed_stage(rpt, 'read_speed_limit_events'):
+            return read_lrse_events(driver.LRSE_Speed_Limit, 'speed_lim')
+        # with
+    # def load_speed_limit()
+    def load_num_lanes():
+        with run_report.timed_stage(rpt, 'read_num_lanes_events'):
+            return read_lrse_events(driver.LRSE_Number_Travel_Lanes, 'num_lanes')
+        # with
+    # def load_num_lanes()
+
+    loads = { 'routes' : load_routes, 'tmcs' : load_tmcs, 'towns' : load_towns,
+              'speed_limit' : load_speed_limit, 'num_lanes' : load_num_lanes }
+    if concurrent:
+        retval.update(prefetch.run_concurrently(loads))
+    else:
+        for name in ['routes', 'tmcs', 'towns', 'speed_limit', 'num_lanes']:
+            retval[name] = loads[name]()
+        # for
+    # end_if
+    retval['tmcs_by_id'], retval['tmcs_by_road'] = index_tmcs(retval['tmcs'])
+    return retval
+# def load_session()
+
+# load_route_inputs: Load the inputs specific to one route: its geometry, if it hasn't been read, and its TMCs
+#
+# Parameters: session - session
+#             MassDOT_route_id - MassDOT route_id
+#             TMC_list_file - full path of file containing the list of TMCs, or ''
+# Return value: list of the TMC records (see read_tmcs) to be conflated onto the route
+#
+def load_route_inputs(session, MassDOT_route_id, TMC_list_file):
+    if MassDOT_route_id not in session['routes']:
+        session['routes'].update(read_routes([MassDOT_route_id]))
+    # end_if
+    if MassDOT_route_id not in session['routes']:
+        raise ValueError("Route " + MassDOT_route_id + " not found in LRSN routes, or has no geometry.")
+    # end_if
+    return [session['tmcs'][i] for i in select_tmcs(session, MassDOT_route_id, TMC_list_file)]
+# def load_route_inputs()
+
+# select_tmcs: Select the TMCs to be conflated onto a route
+#
+# Parameters: session - session, as returned by load_session
+#             route_id - MassDOT route_id
+#             TMC_list_file - full path of file containing the list of TMCs, or '' to select TMCs using
+#                             the INRIX roadnum and direction corresponding to the route_id
+# Return value: list of indices in session['tmcs'] of the selected TMCs
+#
+def select_tmcs(session, route_id, TMC_list_file):
+    if not TMC_list_file:
+        INRIX_attrs = driver.get_inrix_attrs(route_id)
+        return session['tmcs_by_road'].get((INRIX_attrs['roadnum'], INRIX_attrs['direction']), [])
+    # end_if
+    # The TMC list file contains a comma-separated list of quoted TMC IDs, as used in an SQL "IN" clause
+    with open(TMC_list_file, 'r') as f:
+        tmc_ids = [s.strip().strip("'\"") for s in f.read().replace('\n', '').split(',')]
+    # with
+    return sorted([session['tmcs_by_id'][tmc_id] for tmc_id in set(tmc_ids) if tmc_id in session['tmcs_by_id']])
+# def select_tmcs()
+
+# _nearby_lrse_events: Return the LRSE events recorded on other routes whose first and last points lie within the
+#                      bounding box (widened by lrse_xy_tolerance) of a route
+#
+# Return value: list of (events of the other route, array of the indices of the nearby events among them) tuples
+#
+def _nearby_lrse_events(session, lrse_name, route_id, segs):
+    retval = []
+    min_x = min(segs['x0'].min(), segs['x1'].min()) - lrse_xy_tolerance; max_x = max(segs['x0'].max(), segs['x1'].max()) + lrse_xy_tolerance
+    min_y = min(segs['y0'].min(), segs['y1'].min()) - lrse_xy_tolerance; max_y = max(segs['y0'].max(), segs['y1'].max()) + lrse_xy_tolerance
+    for other_id, evs in session[lrse_name].items():
+        if other_id == route_id:
+            continue
+        # end_if
+        near = np.nonzero((evs['x0'] >= min_x) & (evs['x0'] <= max_x) & (evs['y0'] >= min_y) & (evs['y0'] <= max_y) &
+                          (evs['x1'] >= min_x) & (evs['x1'] <= max_x) & (evs['y1'] >= min_y) & (evs['y1'] <= max_y))[0]
+        if len(near) > 0:
+            retval.append((evs, near))
+        # end_if
+    # for
+    return retval
+# def _nearby_lrse_events()
+
+# locate_lrse_events: Return the LRSE events along a route
+#
+# Parameters: session - session
+#             lrse_name - 'speed_limit' or 'num_lanes'
+#             attr_fieldname - name of the attribute field of the events, e.g., 'speed_lim'
+#             route_id - MassDOT route_id
+#             segs - dict of route segment arrays
+#             project - OPTIONAL function used in place of tmc_locator.project_points (see tmc_locator.locate_tmcs)
+# Return value: list of dicts, with the fields route_id, from_meas, to_meas, and attr_fieldname
+#
+def locate_lrse_events(session, lrse_name, attr_fieldname, route_id, segs, project=None):
+    if project is None:
+        project = lambda px, py : tmc_locator.project_points(segs, px, py)
+    # end_if
+    retval = []
+    own = session[lrse_name].get(route_id)
+    if own is not None:
+        for from_meas, to_meas, value in zip(own['from_meas'].tolist(), own['to_meas'].tolist(), own['value'].tolist()):
+            retval.append({ 'route_id' : route_id, 'from_meas' : from_meas, 'to_meas' : to_meas, attr_fieldname : value })
+        # for
+    # end_if
+    # Events recorded on other routes that lie along this one
+    for evs, near in _nearby_lrse_events(session, lrse_name, route_id, segs):
+        m0, d0, s0 = project(evs['x0'][near], evs['y0'][near])
+        m1, d1, s1 = project(evs['x1'][near], evs['y1'][near])
+        within = (d0 <= lrse_xy_tolerance) & (d1 <= lrse_xy_tolerance)
+        for k in np.nonzero(within)[0].tolist():
+            retval.append({ 'route_id' : route_id, 'from_meas' : float(min(m0[k], m1[k])), 'to_meas' : float(max(m0[k], m1[k])),
+                            attr_fieldname : int(evs['value'][near[k]]) })
+        # for
+    # for
+    return retval
+# def locate_lrse_events()
+
+# route_points: Return all the points that are projected onto a route when it is conflated
+#
+# Parameters: session - session
+#             MassDOT_route_id - MassDOT route_id
+#             selected - list of the TMC records (see read_tmcs) to be located along the route
+# Return value: tuple of (px, py) arrays: the first and last points of the TMCs, and of the LRSE events recorded on
+#               other routes near the route (see locate_lrse_events)
+#
+def route_points(session, MassDOT_route_id, selected):
+    segs = session['routes'][MassDOT_route_id]
+    px = [np.array([t['from_x'] for t in selected] + [t['to_x'] for t in selected], dtype=np.float64)]
+    py = [np.array([t['from_y'] for t in selected] + [t['to_y'] for t in selected], dtype=np.float64)]
+    for lrse_name in ['speed_limit', 'num_lanes']:
+        for evs, near in _nearby_lrse_events(session, lrse_name, MassDOT_route_id, segs):
+            px += [evs['x0'][near], evs['x1'][near]]
+            py += [evs['y0'][near], evs['y1'][near]]
+        # for
+    # for
+    return np.concatenate(px), np.concatenate(py)
+# def route_points()
+
+# generate_route_events: Generate the intermediate (overlaid and tidied) event table of a route, for a set of TMCs
+#
+# Parameters: session - session
+#             MassDOT_route_id - MassDOT route_id
+#             selected - list of the TMC records (see read_tmcs) to be located along the route
+#             prune_empty_tmcs - True to delete the records in which no TMC lies (see overlay_events.tidy_overlay_events)
+#             rpt - run report, in which the timing of each step and the counters are recorded
+#             geom - OPTIONAL tiled route geometry of the route (see tiled_processing.py), computed for the points
+#                    returned by route_points; if None, the TMCs, towns, and LRSE events are located against the route here
+# Return value: list of intermediate records (dicts)
+#
+# Each TMC's records depend only upon its own location and the town, speed limit, and number of lanes events along it,
+# so the records of any subset of a route's TMCs are the same as the records of those TMCs in the route's full table
+# (aside from records in which no TMC lies, which depend upon where all the TMCs lie).
+#
+def generate_route_events(session, MassDOT_route_id, selected, prune_empty_tmcs, rpt, geom=None):
+    segs = session['routes'][MassDOT_route_id]
+    project = tiled_processing.projector(geom, segs) if geom is not None else None
+    with run_report.timed_stage(rpt, 'tmc_events', len(selected)) as st:
+        located = tmc_locator.locate_tmcs(segs, [t['from_x'] for t in selected], [t['from_y'] for t in selected],
+                                          [t['to_x'] for t in selected], [t['to_y'] for t in selected], project)
+        tmc_events = []
+        for i, tmc in enumerate(selected):
+            if located['keep'][i]:
+                roh = [MassDOT_route_id, float(located['from_meas'][i]), float(located['to_meas'][i])] + tmc['attrs']
+                tmc_events.append(dict(zip(et_fieldnames, roh)))
+            # end_if
+        # for
+        st['rows_out'] = len(tmc_events)
+    # with
+    run_report.count(rpt, 'tmcs_selected', len(selected))
+    run_report.count(rpt, 'zero_length_tmc_events_discarded', len(selected) - len(tmc_events))
+    run_report.count(rpt, 'clamped_tmc_measures', int(located['clamped'].sum()))
+
+    with run_report.timed_stage(rpt, 'town_events') as st:
+        town_evs = town_events.locate_towns(session['towns'], segs, MassDOT_route_id,
+                                            crossings=geom['crossings'] if geom is not None else None)
+        st['rows_out'] = len(town_evs)
+    # with
+    with run_report.timed_stage(rpt, 'speed_limit_events') as st:
+        speed_limit_events = locate_lrse_events(session, 'speed_limit', 'speed_lim', MassDOT_route_id, segs, project)
+        st['rows_out'] = len(speed_limit_events)
+    # with
+    with run_report.timed_stage(rpt, 'num_lanes_events') as st:
+        num_lanes_events = locate_lrse_events(session, 'num_lanes', 'num_lanes', MassDOT_route_id, segs, project)
+        st['rows_out'] = len(num_lanes_events)
+    # with
+
+    # Overlay the four sets of events, and tidy the result, as conflate_route does
+    with run_report.timed_stage(rpt, 'overlay') as st:
+        output_stage_output = overlay_events.overlay_route_events(tmc_events, town_evs, speed_limit_events, num_lanes_events,
+                                                                  prune_empty_tmcs)
+        st['rows_out'] = len(output_stage_output['events'])
+    # with
+    driver.count_output_events(rpt, output_stage_output)
+    return output_stage_output['events']
+# def generate_route_events()
+
+# compute_route_outputs: Generate the intermediate event table of one MassDOT route, using the shared inputs of a session
+#
+# Parameters: session - session
+#             MassDOT_route_id - MassDOT route_id
+#             TMC_list_file - full path of file containing the list of TMCs to be conflated onto the route, or ''
+#             selected - OPTIONAL list of the route's TMC records, if already loaded (see load_route_inputs)
+#             geom - OPTIONAL tiled route geometry of the route (see generate_route_events)
+# Return value: route outputs (dict), to be written by write_route_outputs: route_id, the run report ('report'),
+#               and the intermediate records ('events')
+#
+def compute_route_outputs(session, MassDOT_route_id, TMC_list_file, selected=None, geom=None):
+    rpt = run_report.new_run_report(MassDOT_route_id)
+    if selected is None:
+        with run_report.timed_stage(rpt, 'select_tmcs') as st:
+            selected = load_route_inputs(session, MassDOT_route_id, TMC_list_file)
+            st['rows_out'] = len(selected)
+        # with
+    # end_if
+    output_events = generate_route_events(session, MassDOT_route_id, selected, bool(TMC_list_file), rpt, geom)
+    return { 'route_id' : MassDOT_route_id, 'report' : rpt, 'events' : output_events }
+# def compute_route_outputs()
+
+# write_route_outputs: Write the intermediate and final tables of one MassDOT route, and its run report
+#
+# Parameters: outputs - route outputs, as returned by compute_route_outputs
+#             merged_records - list to which the route's final records are appended
+#             export_csv - OPTIONAL; if True (the default), the intermediate event table is also exported as a CSV file
+# Return value: full path of the final CSV file
+#
+def write_route_outputs(outputs, merged_records, export_csv=True):
+    rpt = outputs['report']; output_events = outputs['events']
+    output_csv_dir_1 = driver.base_dir + "\\csv_intermediate"
+    output_csv_dir_2 = driver.base_dir + "\\csv_final"
+    base_table_name = outputs['route_id'].lower().replace(' ','_')
+    output_csv_1 = output_csv_dir_1 + "\\" + base_table_name + "_events_output.csv"
+    output_columnar_name_1 = base_table_name + "_events_output_columns"
+    output_csv_file_name_2 = base_table_name + "_events_final.csv"
+
+    driver.write_output_events(rpt, output_events, output_csv_dir_1 + "\\" + output_columnar_name_1, output_csv_1, export_csv)
+
+    # The route's own list of problem TMCs, rather than the module-level one, since this may run on a writer thread
+    problem_tmcs = []
+    with run_report.timed_stage(rpt, 'post_processing', len(output_events)) as st:
+        st['rows_out'] = process_csv_file.main_routine(output_csv_dir_1, output_columnar_name_1, output_csv_dir_2,
+                                                       output_csv_file_name_2, merged_records, problem_tmcs)
+    # with
+    run_report.count(rpt, 'output_records', st['rows_out'])
+    rpt['details']['problem_tmcs'] = problem_tmcs
+    run_report.count(rpt, 'problem_tmcs', len(set(problem_tmcs)))
+    if driver.run_report_dir:
+        run_report.write_run_report(rpt, driver.run_report_dir)
+    # end_if
+    return output_csv_dir_2 + "\\" + output_csv_file_name_2
+# def write_route_outputs()
+
+# conflate_route_in_session: Conflate the INRIX TMCs, towns, speed limit, and number of lanes events onto one MassDOT route,
+#                            using the shared inputs of a session
+#
+# Parameters: session - session
+#             MassDOT_route_id - MassDOT route_id
+#             TMC_list_file - full path of file containing the list of TMCs to be conflated onto the route, or ''
+#             merged_records - list to which the route's final records are appended
+#             export_csv - OPTIONAL; if True (the default), the intermediate event table is also exported as a CSV file
+# Return value: full path of the final CSV file
+#
+def conflate_route_in_session(session, MassDOT_route_id, TMC_list_file, merged_records, export_csv=True):
+    return write_route_outputs(compute_route_outputs(session, MassDOT_route_id, TMC_list_file), merged_records, export_csv)
+# def conflate_route_in_session()
+
+# _failure_message: Return the message recorded in a route's summary for the exception being handled
+#
+def _failure_message():
+    return traceback.format_exc().strip().split('\n')[-1]
+# def _failure_message()
+
+# run_tiled_routes: Conflate a list of routes in a session, doing the geometric work of all of them at once, tile by tile
+#
+# Parameters: session - session
+#             tasks - list of (route_id, TMC_list_file) tuples
+#             merged_records - list to which the routes' final records are appended
+#             export_csv - True to export each route's intermediate event table as a CSV file
+#             tile_size - size of a tile (see tiled_processing.py)
+#             tile_halo - width of the halo around each tile
+#             tile_workers - number of worker processes, or None for the number of CPUs
+# Return value: list of per-route summary dicts, in the order of tasks
+#
+# The TMCs of every route are selected first; then the TMCs, town boundary crossings, and LRSE events of all the routes
+# are located at once, in parallel, tile by tile; then each route is overlaid, aggregated, and written, in turn.
+# The elapsed_sec of each route doesn't include its share of the tiled work.
+#
+def run_tiled_routes(session, tasks, merged_records, export_csv, tile_size, tile_halo, tile_workers):
+    retval = []
+    selected = {}
+    for route_id, tmc_list_file in tasks:
+        summary = batch_conflate_routes.new_route_summary(route_id, tmc_list_file)
+        start = time.time()
+        try:
+            selected[route_id] = load_route_inputs(session, route_id, tmc_list_file)
+        except BaseException:
+            summary['message'] = _failure_message()
+        # try/except
+        summary['elapsed_sec'] = time.time() - start
+        retval.append(summary)
+    # for
+
+    start = time.time()
+    routes = dict([(route_id, session['routes'][route_id]) for route_id in selected])
+    points = dict([(route_id, route_points(session, route_id, selected[route_id])) for route_id in selected])
+    geoms = tiled_processing.tiled_route_geometry(routes, points, session['towns'], tile_size, tile_halo, tile_workers)
+    arcpy.AddMessage("Located TMCs, towns, and LRSE events along " + str(len(routes)) + " routes, tile by tile, in " +
+                     str(round(time.time() - start, 1)) + " sec.")
+
+    for summary in retval:
+        route_id = summary['route_id']
+        if route_id in selected:
+            start = time.time()
+            try:
+                outputs = compute_route_outputs(session, route_id, summary['tmc_list_file'], selected[route_id], geoms[route_id])
+                summary['output_csv'] = write_route_outputs(outputs, merged_records, export_csv)
+                summary['status'] = 'success'
+            except BaseException:
+                summary['message'] = _failure_message()
+            # try/except
+            summary['elapsed_sec'] += time.time() - start
+        # end_if
+        summary['elapsed_sec'] = round(summary['elapsed_sec'], 3)
+    # for
+    return retval
+# def run_tiled_routes()
+
+# run_session: Conflate a list of routes in a single session
+#
+# Parameters: tasks - list of (route_id, TMC_list_file) tuples, as returned by batch_conflate_routes.get_batch_tasks
+#             merged_file - full path of the merged final CSV file
+#             export_csv - OPTIONAL; True to export each route's intermediate event table as a CSV file
+#             prefetch_depth - OPTIONAL; if greater than 0, the shared inputs are read concurrently, and each route is
+#                              processed in a pipeline (see prefetch.py): the inputs of up to prefetch_depth routes
+#                              ahead are loaded on one background thread, and the outputs of up to prefetch_depth
+#                              routes are written on another, while the current route is conflated
+#             tile_size - OPTIONAL; if greater than 0, the geometric work of all the routes is done at once, on tiles
+#                         of this size, in parallel (see run_tiled_routes); the routes are not pipelined
+#             tile_halo - OPTIONAL width of the halo around each tile
+#             tile_workers - OPTIONAL number of worker processes for the tiles (default: the number of CPUs)
+# Return value: list of per-route summary dicts (see batch_conflate_routes.conflate_one_route), in the order of tasks
+#
+def run_session(tasks, merged_file, export_csv=True, prefetch_depth=0, tile_size=0,
+                tile_halo=tiled_processing.default_halo, tile_workers=None):
+    session = load_session([route_id for route_id, tmc_list_file in tasks], concurrent=prefetch_depth > 0)
+    wall_sec, cpu_sec = run_report.total_time(session['report'])
+    arcpy.AddMessage("Loaded shared inputs in " + str(round(wall_sec, 1)) + " sec.")
+    if driver.run_report_dir:
+        run_report.write_run_report(session['report'], driver.run_report_dir)
+    # end_if
+
+    merged_records = []
+    retval = []
+    if tile_size > 0:
+        retval = run_tiled_routes(session, tasks, merged_records, export_csv, tile_size, tile_halo, tile_workers)
+    elif prefetch_depth > 0:
+        # Note: The final records are appended to merged_records by the writer thread, in order of the routes
+        def write_job(outputs, summary, start):
+            try:
+                summary['output_csv'] = write_route_outputs(outputs, merged_records, export_csv)
+                summary['status'] = 'success'
+            except BaseException:
+                summary['message'] = _failure_message()
+            # try/except
+            summary['elapsed_sec'] = round(time.time() - start, 3)
+        # def write_job()
+        writer = prefetch.start_write_behind(prefetch_depth)
+        load = lambda task : load_route_inputs(session, task[0], task[1])
+        for (route_id, tmc_list_file), selected, error in prefetch.prefetch(tasks, load, prefetch_depth):
+            summary = batch_conflate_routes.new_route_summary(route_id, tmc_list_file)
+            retval.append(summary)
+            start = time.time()
+            try:
+                if error is not None:
+                    raise error
+                # end_if
+                outputs = compute_route_outputs(session, route_id, tmc_list_file, selected)
+            except BaseException:
+                summary['message'] = _failure_message()
+                continue
+            # try/except
+            prefetch.submit(writer, write_job, outputs, summary, start)
+        # for
+        prefetch.finish_write_behind(writer)
+    else:
+        for route_id, tmc_list_file in tasks:
+            summary = batch_conflate_routes.new_route_summary(route_id, tmc_list_file)
+            start = time.time()
+            try:
+                summary['output_csv'] = conflate_route_in_session(session, route_id, tmc_list_file, merged_records, export_csv)
+                summary['status'] = 'success'
+            except BaseException:
+                # Note: BaseException rather than Exception, since get_inrix_attrs calls exit() for unsupported routes
+                summary['message'] = _failure_message()
+            # try/except
+            summary['elapsed_sec'] = round(time.time() - start, 3)
+            retval.append(summary)
+        # for
+    # end_if
+    process_csv_file.write_csv(os.path.dirname(merged_file), os.path.basename(merged_file), merged_records)
+    return retval
+# def run_session()
+
+def main():
+    parser = argparse.ArgumentParser(description='Conflate INRIX TMCs onto many MassDOT routes in a single session.')
+    parser.add_argument('--route-list-file', default='')
+    parser.add_argument('--tmc-list-dir', default='')
+    parser.add_argument('--merged-file', default=driver.base_dir + "\\csv_final\\statewide_events_final.csv")
+    parser.add_argument('--summary-file', default=os.path.join(driver.base_dir, 'session_summary.csv'))
+    parser.add_argument('--no-csv-export', action='store_true')
+    parser.add_argument('--prefetch-depth', type=int, default=2)
+    parser.add_argument('--tile-size', type=float, default=0.0)
+    parser.add_argument('--tile-halo', type=float, default=tiled_processing.default_halo)
+    parser.add_argument('--tile-workers', type=int, default=None)
+    args = parser.parse_args()
+
+    tasks = batch_conflate_routes.get_batch_tasks(args.route_list_file, args.tmc_list_dir)
+    print('Conflating ' + str(len(tasks)) + ' routes in a single session.')
+    start = time.time()
+    summary = run_session(tasks, args.merged_file, not args.no_csv_export, args.prefetch_depth, args.tile_size,
+                          args.tile_halo, args.tile_workers)
+    batch_conflate_routes.write_summary(summary, args.summary_file)
+
+    failures = [rec for rec in summary if rec['status'] != 'success']
+    for rec in summary:
+        print('    ' + rec['route_id'] + ': ' + rec['status'] + ' (' + str(rec['elapsed_sec']) + ' sec) ' + rec['message'])
+    # for
+    print('Finished in ' + str(round(time.time() - start, 1)) + ' sec: ' + str(len(summary) - len(failures)) + ' succeeded, ' +
+          str(len(failures)) + ' failed. Merged final output is in: ' + args.merged_file)
+    return 1 if failures else 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
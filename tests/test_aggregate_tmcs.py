@@ -0,0 +1,82 @@
+# test_aggregate_tmcs.py - check aggregate_tmcs.aggregate_by_tmc against process_csv_file.process_one_tmc_id
+#
+# 10/18/2026
+
+import unittest
+
+import aggregate_tmcs
+import generate_synthetic_data
+import process_csv_file
+import run_benchmarks
+
+class AggregateByTmcTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        dataset = generate_synthetic_data.make_dataset(6, 5, 20.0)
+        cls.intermediate = run_benchmarks.run_overlay(dataset, run_benchmarks.run_locator(dataset))
+    # def setUpClass()
+
+    def setUp(self):
+        # process_csv_file reports on every TMC it processes, and accumulates its problem TMCs in a global list
+        self.saved_report = process_csv_file.report
+        process_csv_file.report = lambda msg: None
+        del process_csv_file.problem_tmcs[:]
+    # def setUp()
+
+    def tearDown(self):
+        process_csv_file.report = self.saved_report
+        del process_csv_file.problem_tmcs[:]
+    # def tearDown()
+
+    # process_records: Compute the output records of a route one TMC at a time, as process_csv_file originally did
+    #
+    def process_records(self, records):
+        del process_csv_file.problem_tmcs[:]
+        output = [process_csv_file.process_one_tmc_id([dict(rec) for rec in recs])
+                  for tmc_id, recs in process_csv_file.group_records_by_tmc(records)]
+        return output, list(process_csv_file.problem_tmcs)
+    # def process_records()
+
+    def test_synthetic_routes(self):
+        num_problems = 0
+        for route_id in sorted(self.intermediate.keys()):
+            records = self.intermediate[route_id]
+            expected, expected_problems = self.process_records(records)
+            output, problems = aggregate_tmcs.aggregate_by_tmc(aggregate_tmcs.records_to_columns(records))
+            self.assertEqual(len(output), len(expected))
+            for rec, expected_rec in zip(output, expected):
+                # Compared exactly: the aggregation is meant to be identical to the last bit
+                self.assertEqual(rec, expected_rec)
+            # for
+            self.assertEqual(problems, expected_problems)
+            num_problems += len(problems)
+        # for
+        # The synthetic gaps and "no value" speed limits leave some TMCs without usable values
+        self.assertTrue(num_problems > 0)
+    # def test_synthetic_routes()
+
+    def test_unusable_attribute_values(self):
+        records = [ { 'tmc' : '129+04567', 'tmctype' : 'P1.11', 'route_id' : 'SYN1 NB', 'roadnum' : 'I-95', 'direction' : 'NORTHBOUND',
+                      'firstnm' : 'X', 'from_meas' : 0.0, 'to_meas' : 0.5, 'calc_len' : 0.5, 'speed_lim' : 99, 'num_lanes' : 0,
+                      'town' : 'Abington', 'town_id' : 1 },
+                    { 'tmc' : '129+04567', 'tmctype' : 'P1.11', 'route_id' : 'SYN1 NB', 'roadnum' : 'I-95', 'direction' : 'NORTHBOUND',
+                      'firstnm' : 'X', 'from_meas' : 0.5, 'to_meas' : 0.75, 'calc_len' : 0.25, 'speed_lim' : 0, 'num_lanes' : 0,
+                      'town' : 'Acton', 'town_id' : 2 },
+                    { 'tmc' : '129+04568', 'tmctype' : 'P1.11', 'route_id' : 'SYN1 NB', 'roadnum' : 'I-95', 'direction' : 'NORTHBOUND',
+                      'firstnm' : 'Y', 'from_meas' : 0.75, 'to_meas' : 1.25, 'calc_len' : 0.5, 'speed_lim' : 55, 'num_lanes' : 3,
+                      'town' : 'Acton', 'town_id' : 2 } ]
+        expected, expected_problems = self.process_records(records)
+        output, problems = aggregate_tmcs.aggregate_by_tmc(aggregate_tmcs.records_to_columns(records))
+        self.assertEqual(output, expected)
+        self.assertEqual(problems, expected_problems)
+        self.assertEqual(problems, ['129+04567', '129+04567'])
+        self.assertEqual(output[0]['speed_limit'], -1)
+        self.assertEqual(output[0]['num_lanes'], -1)
+    # def test_unusable_attribute_values()
+
+# class AggregateByTmcTest
+
+if __name__ == '__main__':
+    unittest.main()
+# end_if
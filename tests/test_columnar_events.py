@@ -0,0 +1,103 @@
+# test_columnar_events.py - check columnar_events.load_csv_columns against process_csv_file.load_csv
+#
+# 10/18/2026
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import columnar_events
+import generate_synthetic_data
+import process_csv_file
+import run_benchmarks
+
+class LoadCsvColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.csv_dir = tempfile.mkdtemp()
+    # def setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.csv_dir, True)
+    # def tearDown()
+
+    # write_file: Write a file in the temporary directory, returning its full path
+    #
+    def write_file(self, name, text):
+        fn = os.path.join(self.csv_dir, name)
+        with open(fn, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        # with
+        return fn
+    # def write_file()
+
+    def test_synthetic_intermediate_files(self):
+        dataset = generate_synthetic_data.make_dataset(6, 11, 20.0)
+        intermediate = run_benchmarks.run_overlay(dataset, run_benchmarks.run_locator(dataset))
+        run_benchmarks.run_csv_write(intermediate, self.csv_dir)
+        names = [name for name, dtype in columnar_events.event_columns]
+        for route_id in sorted(intermediate.keys()):
+            file_name = run_benchmarks.intermediate_csv_file_name(route_id)
+            expected = process_csv_file.load_csv(self.csv_dir, file_name)
+            cols = columnar_events.load_csv_columns(os.path.join(self.csv_dir, file_name))
+            self.assertEqual(sorted(cols.keys()), sorted(names))
+            records = columnar_events.columns_to_records(cols)
+            self.assertEqual(len(records), len(expected))
+            for rec, expected_rec in zip(records, expected):
+                self.assertEqual(rec, dict([(name, expected_rec[name]) for name in names]))
+            # for
+        # for
+    # def test_synthetic_intermediate_files()
+
+    def test_chunk_boundaries(self):
+        # Rows spanning several chunks, with a quoted value (containing a comma and a line break) in one of them
+        saved_chunk_rows = columnar_events.csv_chunk_rows
+        columnar_events.csv_chunk_rows = 4
+        try:
+            lines = ['route_id,from_meas,town_id']
+            for i in range(10):
+                lines.append('R' + str(i) + ',' + str(i * 0.5) + ',' + str(i))
+            # for
+            lines[6] = '"R,5\n(split)",2.5,5'
+            fn = self.write_file('chunks.csv', '\r\n'.join(lines) + '\r\n')
+            cols = columnar_events.load_csv_columns(fn, [('route_id', None), ('from_meas', '<f8'), ('town_id', '<i4')])
+        finally:
+            columnar_events.csv_chunk_rows = saved_chunk_rows
+        # try/finally
+        self.assertEqual(cols['route_id'].tolist(), ['R0', 'R1', 'R2', 'R3', 'R4', 'R,5\n(split)', 'R6', 'R7', 'R8', 'R9'])
+        self.assertEqual(cols['from_meas'].tolist(), [i * 0.5 for i in range(10)])
+        self.assertEqual(cols['town_id'].tolist(), list(range(10)))
+    # def test_chunk_boundaries()
+
+    def test_field_count_errors_report_their_line(self):
+        columns = [('route_id', None), ('from_meas', '<f8'), ('town_id', '<i4')]
+        # One line with an extra field, followed by one missing a field: the total number of values is as expected
+        fn = self.write_file('shifted.csv', 'route_id,from_meas,town_id\nR1,1.0,2,extra\n2.0,3\nR3,4.0,5\n')
+        try:
+            columnar_events.load_csv_columns(fn, columns)
+            self.fail('load_csv_columns accepted a line with an extra field')
+        except ValueError as e:
+            self.assertTrue(', line 2:' in str(e))
+        # try/except
+        fn = self.write_file('short.csv', 'route_id,from_meas,town_id\nR1,1.0,2\nR2,3.0\n')
+        try:
+            columnar_events.load_csv_columns(fn, columns)
+            self.fail('load_csv_columns accepted a line with a missing field')
+        except ValueError as e:
+            self.assertTrue(', line 3:' in str(e))
+        # try/except
+        fn = self.write_file('bad_value.csv', 'route_id,from_meas,town_id\nR1,1.0,2\nR2,x,3\n')
+        try:
+            columnar_events.load_csv_columns(fn, columns)
+            self.fail('load_csv_columns accepted an invalid value')
+        except ValueError as e:
+            self.assertTrue(', line 3:' in str(e) and 'from_meas' in str(e))
+        # try/except
+    # def test_field_count_errors_report_their_line()
+
+# class LoadCsvColumnsTest
+
+if __name__ == '__main__':
+    unittest.main()
+# end_if
@@ -0,0 +1,148 @@
+# test_overlay_events.py - check overlay_events.union_overlay against a brute-force UNION
+#
+# The brute-force UNION cuts each route at every breakpoint of either table, finds the pairs of events covering
+# each elementary interval by testing every event, and merges the runs of consecutive intervals covered by the
+# same pair into one piece - the definition of the ESRI 'Overlay Route Events' (UNION) output, computed directly.
+#
+# 10/18/2026
+
+import random
+import unittest
+
+import generate_synthetic_data
+import overlay_events
+import run_benchmarks
+
+# brute_force_union: Compute the UNION of two event tables by testing every event against every elementary interval
+#
+# Parameters: a_events, b_events - event tables (lists of dicts)
+# Return value: sorted list of (route_id, from_meas, to_meas, a_index, b_index) tuples, one per non-zero-length piece;
+#               a_index or b_index is None where no event of the corresponding table covers the piece
+#
+def brute_force_union(a_events, b_events):
+    retval = []
+    route_ids = sorted(set([ev['route_id'] for ev in a_events + b_events]))
+    for route_id in route_ids:
+        a_lines = [(ix, min(ev['from_meas'], ev['to_meas']), max(ev['from_meas'], ev['to_meas']))
+                   for ix, ev in enumerate(a_events) if ev['route_id'] == route_id]
+        b_lines = [(ix, min(ev['from_meas'], ev['to_meas']), max(ev['from_meas'], ev['to_meas']))
+                   for ix, ev in enumerate(b_events) if ev['route_id'] == route_id]
+        a_lines = [ev for ev in a_lines if ev[1] < ev[2]]; b_lines = [ev for ev in b_lines if ev[1] < ev[2]]
+        breakpoints = sorted(set([ev[1] for ev in a_lines + b_lines] + [ev[2] for ev in a_lines + b_lines]))
+        intervals = list(zip(breakpoints[:-1], breakpoints[1:]))
+        covering = []
+        for lo, hi in intervals:
+            a_ixs = [ix for ix, from_meas, to_meas in a_lines if from_meas <= lo and hi <= to_meas] or [None]
+            b_ixs = [ix for ix, from_meas, to_meas in b_lines if from_meas <= lo and hi <= to_meas] or [None]
+            covering.append(set([(a_ix, b_ix) for a_ix in a_ixs for b_ix in b_ixs if (a_ix, b_ix) != (None, None)]))
+        # for
+        for k, (lo, hi) in enumerate(intervals):
+            for pair in covering[k]:
+                if k > 0 and pair in covering[k - 1]:
+                    continue
+                # end_if
+                end = k
+                while end + 1 < len(intervals) and pair in covering[end + 1]:
+                    end += 1
+                # while
+                retval.append((route_id, lo, intervals[end][1], pair[0], pair[1]))
+            # for
+        # for
+    # for
+    return sorted(retval, key=lambda p: (p[0], p[1], p[2], -1 if p[3] is None else p[3], -1 if p[4] is None else p[4]))
+# def brute_force_union()
+
+# overlay_pieces: Compute the UNION of two event tables with union_overlay, in the form returned by brute_force_union
+#
+def overlay_pieces(a_events, b_events):
+    a_tagged = [dict(ev, a_ix=ix) for ix, ev in enumerate(a_events)]
+    b_tagged = [dict(ev, b_ix=ix) for ix, ev in enumerate(b_events)]
+    a_defaults = dict(overlay_events.default_attrs(a_tagged), a_ix=-1)
+    b_defaults = dict(overlay_events.default_attrs(b_tagged), b_ix=-1)
+    retval = []
+    for ev in overlay_events.union_overlay(a_tagged, b_tagged, False, a_defaults, b_defaults):
+        retval.append((ev['route_id'], ev['from_meas'], ev['to_meas'],
+                       None if ev['a_ix'] < 0 else ev['a_ix'], None if ev['b_ix'] < 0 else ev['b_ix']))
+    # for
+    return sorted(retval, key=lambda p: (p[0], p[1], p[2], -1 if p[3] is None else p[3], -1 if p[4] is None else p[4]))
+# def overlay_pieces()
+
+# random_events: Generate a table of random, overlapping events on a few routes, with many shared breakpoints
+#
+def random_events(rng, num_events, field):
+    retval = []
+    for i in range(num_events):
+        from_meas = rng.randint(0, 40) * 0.25; to_meas = from_meas + rng.randint(0, 12) * 0.25
+        if rng.random() < 0.1:
+            from_meas, to_meas = to_meas, from_meas
+        # end_if
+        retval.append({ 'route_id' : rng.choice(['R1 NB', 'R1 SB', 'R2 EB']), 'from_meas' : from_meas,
+                        'to_meas' : to_meas, field : rng.randint(1, 9) })
+    # for
+    return retval
+# def random_events()
+
+class UnionOverlayTest(unittest.TestCase):
+
+    def test_random_overlapping_events(self):
+        rng = random.Random(7)
+        for trial in range(20):
+            a_events = random_events(rng, rng.randint(0, 30), 'speed_lim')
+            b_events = random_events(rng, rng.randint(0, 30), 'num_lanes')
+            self.assertEqual(overlay_pieces(a_events, b_events), brute_force_union(a_events, b_events))
+        # for
+    # def test_random_overlapping_events()
+
+    def test_synthetic_tmc_and_town_events(self):
+        dataset = generate_synthetic_data.make_dataset(4, 3, 15.0)
+        tmc_events = run_benchmarks.run_locator(dataset)
+        a_events = [ev for route_id in sorted(tmc_events.keys()) for ev in tmc_events[route_id]]
+        b_events = dataset['town_events']
+        self.assertEqual(overlay_pieces(a_events, b_events), brute_force_union(a_events, b_events))
+    # def test_synthetic_tmc_and_town_events()
+
+    def test_nested_events(self):
+        # Events nested within one another, so that many pieces are open at once
+        a_events = [{ 'route_id' : 'R1 NB', 'from_meas' : float(i), 'to_meas' : float(40 - i), 'speed_lim' : i } for i in range(20)]
+        b_events = [{ 'route_id' : 'R1 NB', 'from_meas' : float(2 * i) + 0.5, 'to_meas' : float(39 - 2 * i), 'num_lanes' : i }
+                    for i in range(10)]
+        self.assertEqual(overlay_pieces(a_events, b_events), brute_force_union(a_events, b_events))
+    # def test_nested_events()
+
+    def test_zero_length_events(self):
+        a_events = [{ 'route_id' : 'R1 NB', 'from_meas' : 1.0, 'to_meas' : 1.0, 'tmc' : 'A' },
+                    { 'route_id' : 'R1 NB', 'from_meas' : 5.0, 'to_meas' : 5.0, 'tmc' : 'B' }]
+        b_events = [{ 'route_id' : 'R1 NB', 'from_meas' : 0.0, 'to_meas' : 2.0, 'town_id' : 1 },
+                    { 'route_id' : 'R1 NB', 'from_meas' : 1.0, 'to_meas' : 3.0, 'town_id' : 2 },
+                    { 'route_id' : 'R1 NB', 'from_meas' : 0.5, 'to_meas' : 0.75, 'town_id' : 3 }]
+        zeros = [(ev['from_meas'], ev['tmc'], ev['town_id']) for ev in overlay_events.union_overlay(a_events, b_events, True)
+                 if ev['from_meas'] == ev['to_meas']]
+        self.assertEqual(zeros, [(1.0, 'A', 1), (1.0, 'A', 2), (5.0, 'B', 0)])
+    # def test_zero_length_events()
+
+    def test_tidy_leaves_input_events_unchanged(self):
+        events = [{ 'route_id' : 'R1 NB', 'from_meas' : 1.0, 'to_meas' : 2.0, 'tmc' : 'B', 'town_id' : 1 },
+                  { 'route_id' : 'R1 NB', 'from_meas' : -0.5, 'to_meas' : 1.0, 'tmc' : 'A', 'town_id' : 1 },
+                  { 'route_id' : 'R1 NB', 'from_meas' : 2.0, 'to_meas' : 2.0, 'tmc' : 'C', 'town_id' : 1 }]
+        saved = [dict(ev) for ev in events]
+        counts = {}
+        tidied = overlay_events.tidy_overlay_events(events, True, counts)
+        self.assertEqual(events, saved)
+        self.assertEqual([(ev['tmc'], ev['from_meas'], ev['calc_len']) for ev in tidied], [('A', 0.0, 1.0), ('B', 1.0, 1.0)])
+        self.assertEqual(counts, { 'town_id_0' : 0, 'empty_tmc' : 0, 'negative_from_meas' : 1, 'zero_length' : 1 })
+    # def test_tidy_leaves_input_events_unchanged()
+
+    def test_attributes_and_renamed_fields(self):
+        a_events = [{ 'route_id' : 'R1 NB', 'from_meas' : 0.0, 'to_meas' : 2.0, 'tmc' : 'A', 'town_id' : 5 }]
+        b_events = [{ 'route_id' : 'R1 NB', 'from_meas' : 1.0, 'to_meas' : 3.0, 'town_id' : 7 }]
+        out = overlay_events.union_overlay(a_events, b_events)
+        self.assertEqual(out, [{ 'route_id' : 'R1 NB', 'from_meas' : 0.0, 'to_meas' : 1.0, 'tmc' : 'A', 'town_id' : 5, 'town_id_1' : 0 },
+                               { 'route_id' : 'R1 NB', 'from_meas' : 1.0, 'to_meas' : 2.0, 'tmc' : 'A', 'town_id' : 5, 'town_id_1' : 7 },
+                               { 'route_id' : 'R1 NB', 'from_meas' : 2.0, 'to_meas' : 3.0, 'tmc' : '', 'town_id' : 0, 'town_id_1' : 7 }])
+    # def test_attributes_and_renamed_fields()
+
+# class UnionOverlayTest
+
+if __name__ == '__main__':
+    unittest.main()
+# end_if
@@ -0,0 +1,77 @@
+# test_tiled_processing.py - check the tiled geometry of tiled_processing.py against that computed a route at a time
+#
+# 10/18/2026
+
+import unittest
+
+import numpy as np
+
+import generate_synthetic_data
+import tiled_processing
+import tmc_locator
+import town_events
+
+class TiledRouteGeometryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        dataset = generate_synthetic_data.make_dataset(6, 9, 15.0)
+        cls.routes = dict([(route['route_id'], tmc_locator.route_segments(route['parts'])) for route in dataset['routes']])
+        # Every TMC endpoint is projected onto every route, so that most points lie far beyond the halo of their route
+        px = np.array([t['from_x'] for t in dataset['tmcs']] + [t['to_x'] for t in dataset['tmcs']])
+        py = np.array([t['from_y'] for t in dataset['tmcs']] + [t['to_y'] for t in dataset['tmcs']])
+        cls.points = dict([(route_id, (px, py)) for route_id in cls.routes])
+        polygons = [{ 'town_id' : poly['town_id'], 'town' : poly['town'], 'rings' : [poly['ring']] }
+                    for poly in dataset['towns']['polygons']]
+        cls.towns = town_events.prepare_town_polygons(polygons)
+    # def setUpClass()
+
+    # check_geometry: Check the tiled geometry of every route against the projections and crossings of the whole route
+    #
+    def check_geometry(self, geoms):
+        self.assertEqual(sorted(geoms.keys()), sorted(self.routes.keys()))
+        for route_id, segs in self.routes.items():
+            px, py = self.points[route_id]
+            meas, dist, seg_ix = tmc_locator.project_points(segs, px, py)
+            tiled_meas, tiled_dist, tiled_seg_ix = tiled_processing.projector(geoms[route_id], segs)(px, py)
+            self.assertTrue(np.array_equal(tiled_seg_ix, seg_ix), route_id)
+            self.assertTrue(np.array_equal(tiled_meas, meas), route_id)
+            self.assertTrue(np.array_equal(tiled_dist, dist), route_id)
+            crossings = np.sort(town_events.boundary_crossings(self.towns, segs))
+            self.assertTrue(len(crossings) > 0, route_id)
+            self.assertTrue(np.array_equal(geoms[route_id]['crossings'], crossings), route_id)
+            self.assertEqual(town_events.locate_towns(self.towns, segs, route_id, crossings=geoms[route_id]['crossings']),
+                             town_events.locate_towns(self.towns, segs, route_id))
+        # for
+    # def check_geometry()
+
+    def test_tile_sizes(self):
+        for tile_size, halo in [(2000.0, 100.0), (5000.0, 250.0), (tiled_processing.default_tile_size, tiled_processing.default_halo)]:
+            self.check_geometry(tiled_processing.tiled_route_geometry(self.routes, self.points, self.towns, tile_size, halo, 1))
+        # for
+    # def test_tile_sizes()
+
+    def test_worker_processes(self):
+        self.check_geometry(tiled_processing.tiled_route_geometry(self.routes, self.points, self.towns, 5000.0, 250.0, 2))
+    # def test_worker_processes()
+
+    def test_located_tmcs(self):
+        geoms = tiled_processing.tiled_route_geometry(self.routes, self.points, None, 3000.0, 250.0, 1)
+        for route_id, segs in self.routes.items():
+            px, py = self.points[route_id]
+            n = len(px) // 2
+            expected = tmc_locator.locate_tmcs(segs, px[:n], py[:n], px[n:], py[n:])
+            located = tmc_locator.locate_tmcs(segs, px[:n], py[:n], px[n:], py[n:],
+                                              project=tiled_processing.projector(geoms[route_id], segs))
+            self.assertEqual(sorted(located.keys()), sorted(expected.keys()))
+            for name in expected:
+                self.assertTrue(np.array_equal(located[name], expected[name]), route_id + ': ' + name)
+            # for
+        # for
+    # def test_located_tmcs()
+
+# class TiledRouteGeometryTest
+
+if __name__ == '__main__':
+    unittest.main()
+# end_if
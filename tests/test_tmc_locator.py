@@ -0,0 +1,67 @@
+# test_tmc_locator.py - check the locating of TMCs along a route by tmc_locator.py, without arcpy
+#
+# 10/18/2026
+
+import unittest
+
+import numpy as np
+
+import generate_synthetic_data
+import tmc_locator
+
+class ClampMeasuresTest(unittest.TestCase):
+
+    def test_clamp_to_route(self):
+        clamped, was_clamped = tmc_locator.clamp_measures([-0.25, 0.0, 1.5, 3.0, 3.75], 3.0)
+        self.assertEqual(clamped.tolist(), [0.0, 0.0, 1.5, 3.0, 3.0])
+        self.assertEqual(was_clamped.tolist(), [True, False, False, False, True])
+    # def test_clamp_to_route()
+
+# class ClampMeasuresTest
+
+class LocateTmcsTest(unittest.TestCase):
+
+    def setUp(self):
+        # A route along the X axis whose measures begin below 0 and rise above the measure of its last point
+        self.segs = tmc_locator.route_segments([([0.0, 1.0, 2.0, 3.0], [0.0, 0.0, 0.0, 0.0], [-0.5, 1.0, 4.0, 3.0])])
+    # def setUp()
+
+    def test_measures_clamped_to_zero_and_last_m(self):
+        located = tmc_locator.locate_tmcs(self.segs, [0.0, 1.0], [1.0, -1.0], [1.0, 2.0], [0.5, 0.25])
+        self.assertEqual(located['from_meas'].tolist(), [0.0, 1.0])
+        self.assertEqual(located['to_meas'].tolist(), [1.0, 3.0])
+        self.assertEqual(located['clamped'].tolist(), [True, True])
+        self.assertEqual(located['keep'].tolist(), [True, True])
+    # def test_measures_clamped_to_zero_and_last_m()
+
+    def test_zero_length_events_dropped(self):
+        # A TMC lying wholly before the start of the route, one lying wholly beyond its end (both of which are
+        # clamped to a single measure), and one whose endpoints project onto the same point
+        located = tmc_locator.locate_tmcs(self.segs, [-5.0, 2.5, 1.5, 1.25], [0.0, 3.0, 2.0, 0.0],
+                                          [-1.0, 2.8, 1.5, 1.75], [0.5, 9.0, -2.0, 0.0])
+        self.assertEqual(located['keep'].tolist(), [False, False, False, True])
+    # def test_zero_length_events_dropped()
+
+    def test_synthetic_routes(self):
+        dataset = generate_synthetic_data.make_dataset(4, 2, 10.0)
+        for route in dataset['routes']:
+            tmcs = [t for t in dataset['tmcs'] if t['route_id'] == route['route_id']]
+            segs = tmc_locator.route_segments(route['parts'])
+            located = tmc_locator.locate_tmcs(segs, [t['from_x'] for t in tmcs], [t['from_y'] for t in tmcs],
+                                              [t['to_x'] for t in tmcs], [t['to_y'] for t in tmcs])
+            kept = np.nonzero(located['keep'])[0]
+            # Only the TMC lying wholly beyond the end of the route is located as a zero-length event
+            self.assertEqual(len(tmcs) - len(kept), 1)
+            self.assertTrue((located['from_meas'] >= 0.0).all() and (located['to_meas'] <= segs['last_m']).all())
+            self.assertTrue((located['to_meas'][kept] > located['from_meas'][kept]).all())
+            # The first TMC begins before the route does, and the last kept one ends beyond it
+            self.assertEqual(located['from_meas'][kept[0]], 0.0)
+            self.assertEqual(located['to_meas'][kept[-1]], segs['last_m'])
+        # for
+    # def test_synthetic_routes()
+
+# class LocateTmcsTest
+
+if __name__ == '__main__':
+    unittest.main()
+# end_if
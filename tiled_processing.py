@@ -0,0 +1,269 @@
+# tiled_processing.py - compute the geometric work of conflating many routes tile by tile, in parallel
+#
+# Locating the TMCs and the LRSE events recorded on other routes along a route (projecting their endpoints onto it),
+# and finding where the route crosses the town boundaries, are the geometry-heavy steps of the conflation; for long
+# routes such as I90 or I495 they dominate the time taken. This module splits the state into square tiles, and:
+#     1. Assigns each segment of each route to the tile containing its midpoint (its "core" tile), and to every tile
+#        whose box, widened on all sides by a halo margin, its bounding box overlaps.
+#     2. Assigns each point to be projected onto a route to the tile containing it.
+#     3. For each tile, on a pool of worker processes:
+#            - projects the tile's points onto the segments (core and halo) of their route that the tile holds, and
+#            - finds the town boundary crossings of the route segments whose core tile it is.
+#     4. Stitches the results of all the tiles back together, route by route, in terms of the segments (and hence
+#        the measures) of the whole route: each point and each segment is the core of exactly one tile, so no result
+#        is duplicated by the halos.
+# A point that lies within the halo of its route is projected onto the same segment, at the same distance and
+# position, as it would be against the whole route: every segment within that distance of the point overlaps the
+# widened box of the point's tile. A point farther from the route than the halo (or whose tile holds no segment of
+# its route) is projected against the whole route when the results are stitched. The results are thus the same as
+# those computed a route at a time; the remaining measure-based work (cutting the route into town pieces, the
+# overlays) is done a route at a time, as usual, using them (see statewide_session.generate_route_events).
+#
+# Like tmc_locator.py and town_events.py, nothing here depends upon arcpy, and the tile jobs don't use it.
+#
+# Note: On Windows, worker processes are started afresh: each re-imports the main script (e.g., statewide_session.py),
+#       and with it arcpy and generate_tmc_events_for_expressways.py, before running any tile job, and receives a copy
+#       of the prepared town polygons. This startup cost (several seconds per worker, for importing arcpy) is paid once
+#       per worker, per call to run_tiles, so tiling pays off only for a session with enough geometry to outweigh it;
+#       use fewer workers (or none, --tile-workers 1) for a handful of short routes.
+#
+# 10/18/2026
+
+import multiprocessing
+
+import numpy as np
+
+import segment_index
+import tmc_locator
+import town_events
+
+# Default size of a tile, and of the halo around it (in the units of the coordinates: meters, for Mass State Plane)
+default_tile_size = 20000.0
+default_halo = 250.0
+
+# Prepared town polygons used by the tile jobs run in this process (see _init_worker)
+_worker_towns = None
+
+# _init_worker: Initialize a worker process (or this process) to run tile jobs
+#
+def _init_worker(towns):
+    global _worker_towns
+    _worker_towns = towns
+# def _init_worker()
+
+# tile_of: Return the tile containing each of a batch of points
+#
+# Parameters: px, py - arrays of point coordinates
+#             tile_size - size of a tile
+# Return value: tuple of (column, row) arrays of int64
+#
+def tile_of(px, py, tile_size):
+    return (np.floor(np.asarray(px, dtype=np.float64) / tile_size).astype(np.int64),
+            np.floor(np.asarray(py, dtype=np.float64) / tile_size).astype(np.int64))
+# def tile_of()
+
+# _halo_tiles: Return the (segment, tile) pairs for the tiles whose widened box each segment's bounding box overlaps
+#
+# Return value: tuple of (segment index, column, row) arrays
+#
+def _halo_tiles(segs, tile_size, halo):
+    c0, r0 = tile_of(np.minimum(segs['x0'], segs['x1']) - halo, np.minimum(segs['y0'], segs['y1']) - halo, tile_size)
+    c1, r1 = tile_of(np.maximum(segs['x0'], segs['x1']) + halo, np.maximum(segs['y0'], segs['y1']) + halo, tile_size)
+    widths = c1 - c0 + 1
+    counts = widths * (r1 - r0 + 1)
+    seg = np.repeat(np.arange(len(c0)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return seg, c0[seg] + local % widths[seg], r0[seg] + local // widths[seg]
+# def _halo_tiles()
+
+# plan_tiles: Assign the segments of a set of routes, and the points to be projected onto them, to tiles
+#
+# Parameters: routes - dict mapping route_id to dict of route segment arrays (see tmc_locator.route_segments)
+#             points - dict mapping route_id to a tuple of (px, py) arrays of the points to be projected onto the route
+#             tile_size - size of a tile
+#             halo - width of the halo around each tile
+# Return value: list of tile jobs (dicts), one per tile holding any route segment or point, in order of tile;
+#               each contains 'tile' (column, row), 'halo', and 'routes', a dict mapping route_id to a dict of:
+#               seg_ids - array of the indices (in the whole route) of the route's segments the tile holds, ascending
+#               x0, y0, x1, y1 - arrays of the coordinates of those segments
+#               core - boolean array, True for those of the segments whose core tile this is
+#               point_ids - array of the indices (in the route's points) of the points in the tile
+#               px, py - arrays of the coordinates of those points
+#
+def plan_tiles(routes, points, tile_size, halo):
+    jobs = {}
+    for route_id in sorted(routes.keys()):
+        segs = routes[route_id]
+        core_col, core_row = tile_of((segs['x0'] + segs['x1']) / 2.0, (segs['y0'] + segs['y1']) / 2.0, tile_size)
+        seg, cols, rows = _halo_tiles(segs, tile_size, halo)
+        # Group the (segment, tile) pairs by tile; within a tile, the segments remain in ascending order
+        order = np.lexsort((seg, rows, cols))
+        seg = seg[order]; cols = cols[order]; rows = rows[order]
+        starts = np.nonzero(np.concatenate([[True], (cols[1:] != cols[:-1]) | (rows[1:] != rows[:-1])]))[0]
+        ends = np.concatenate([starts[1:], [len(seg)]])
+        for lo, hi in zip(starts.tolist(), ends.tolist()):
+            key = (int(cols[lo]), int(rows[lo]))
+            ids = seg[lo:hi]
+            job = jobs.setdefault(key, { 'tile' : key, 'halo' : halo, 'routes' : {} })
+            job['routes'][route_id] = { 'seg_ids' : ids, 'x0' : segs['x0'][ids], 'y0' : segs['y0'][ids],
+                                        'x1' : segs['x1'][ids], 'y1' : segs['y1'][ids],
+                                        'core' : (core_col[ids] == key[0]) & (core_row[ids] == key[1]),
+                                        'point_ids' : np.zeros(0, dtype=np.int64), 'px' : np.zeros(0), 'py' : np.zeros(0) }
+        # for
+        px, py = points.get(route_id, (np.zeros(0), np.zeros(0)))
+        px = np.asarray(px, dtype=np.float64); py = np.asarray(py, dtype=np.float64)
+        pt_col, pt_row = tile_of(px, py, tile_size)
+        for key in sorted(set(zip(pt_col.tolist(), pt_row.tolist()))):
+            ids = np.nonzero((pt_col == key[0]) & (pt_row == key[1]))[0]
+            job = jobs.setdefault(key, { 'tile' : key, 'halo' : halo, 'routes' : {} })
+            if route_id not in job['routes']:
+                job['routes'][route_id] = { 'seg_ids' : np.zeros(0, dtype=np.int64), 'x0' : np.zeros(0), 'y0' : np.zeros(0),
+                                            'x1' : np.zeros(0), 'y1' : np.zeros(0), 'core' : np.zeros(0, dtype=bool) }
+            # end_if
+            job['routes'][route_id].update({ 'point_ids' : ids, 'px' : px[ids], 'py' : py[ids] })
+        # for
+    # for
+    return [jobs[key] for key in sorted(jobs.keys())]
+# def plan_tiles()
+
+# run_tile: Do the geometric work of one tile
+#
+# Parameter: job - tile job, as returned by plan_tiles
+# Return value: dict mapping route_id to a dict of:
+#               point_ids - array of the indices of the tile's points
+#               seg_ix, dist, t - arrays giving, for each point, the index (in the whole route) of the segment onto which
+#                                 it was projected (-1 if none lies within the halo), its distance, and the parameter
+#                                 of the projected point along the segment
+#               crossings - array of the town boundary crossings of the route's core segments in the tile, as positions
+#                           along the whole route (see town_events.boundary_crossings)
+#
+def run_tile(job):
+    retval = {}
+    for route_id, work in job['routes'].items():
+        n_pts = len(work['point_ids'])
+        result = { 'point_ids' : work['point_ids'], 'seg_ix' : np.full(n_pts, -1, dtype=np.int64),
+                   'dist' : np.full(n_pts, np.inf), 't' : np.zeros(n_pts), 'crossings' : np.zeros(0) }
+        if len(work['seg_ids']) > 0 and n_pts > 0:
+            index = segment_index.build_segment_index(work['x0'], work['y0'], work['x1'], work['y1'])
+            seg, dist, t = segment_index.nearest_segments(index, work['px'], work['py'], job['halo'])
+            found = seg >= 0
+            result['seg_ix'][found] = work['seg_ids'][seg[found]]
+            result['dist'][found] = dist[found]
+            result['t'][found] = t[found]
+        # end_if
+        if _worker_towns is not None and work['core'].any():
+            core = work['core']
+            core_segs = { 'x0' : work['x0'][core], 'y0' : work['y0'][core], 'x1' : work['x1'][core], 'y1' : work['y1'][core] }
+            result['crossings'] = town_events.boundary_crossings(_worker_towns, core_segs, work['seg_ids'][core])
+        # end_if
+        retval[route_id] = result
+    # for
+    return retval
+# def run_tile()
+
+# run_tiles: Run a list of tile jobs
+#
+# Parameters: jobs - list of tile jobs, as returned by plan_tiles
+#             towns - prepared town polygons (see town_events.prepare_town_polygons), or None to skip the boundary crossings
+#             num_workers - number of worker processes; if 1 or less, the jobs are run in this process
+# Return value: list of the results of run_tile, in the order of jobs
+#
+def run_tiles(jobs, towns, num_workers):
+    if num_workers <= 1 or len(jobs) <= 1:
+        _init_worker(towns)
+        try:
+            return [run_tile(job) for job in jobs]
+        finally:
+            _init_worker(None)
+        # try/finally
+    # end_if
+    pool = multiprocessing.Pool(num_workers, _init_worker, (towns,))
+    try:
+        retval = pool.map(run_tile, jobs, 1)
+    finally:
+        pool.close()
+        pool.join()
+    # try/finally
+    return retval
+# def run_tiles()
+
+# stitch_tiles: Combine the results of the tile jobs into the geometric results of each route
+#
+# Parameters: routes, points - as passed to plan_tiles
+#             results - list of the results of run_tile, one per tile job
+# Return value: dict mapping route_id to route geometry (dict), containing:
+#               px, py - arrays of the coordinates of the route's points
+#               seg_ix, dist, t - arrays giving the projection of each point onto the whole route (see run_tile)
+#               crossings - sorted array of the route's town boundary crossings
+#               lookup - dict mapping the (x, y) coordinates of each point to its index in px and py
+#
+# Points not projected within the halo of any tile are projected onto the whole route here.
+#
+def stitch_tiles(routes, points, results):
+    retval = {}
+    for route_id, segs in routes.items():
+        px, py = points.get(route_id, (np.zeros(0), np.zeros(0)))
+        px = np.asarray(px, dtype=np.float64); py = np.asarray(py, dtype=np.float64)
+        geom = { 'px' : px, 'py' : py, 'seg_ix' : np.full(len(px), -1, dtype=np.int64), 'dist' : np.full(len(px), np.inf),
+                 't' : np.zeros(len(px)) }
+        crossings = []
+        for result in results:
+            if route_id not in result:
+                continue
+            # end_if
+            r = result[route_id]
+            for name in ['seg_ix', 'dist', 't']:
+                geom[name][r['point_ids']] = r[name]
+            # for
+            crossings.append(r['crossings'])
+        # for
+        rest = np.nonzero(geom['seg_ix'] < 0)[0]
+        if len(rest) > 0:
+            seg, dist, t = segment_index.nearest_segments(tmc_locator.route_index(segs), px[rest], py[rest])
+            geom['seg_ix'][rest] = seg; geom['dist'][rest] = dist; geom['t'][rest] = t
+        # end_if
+        geom['crossings'] = np.sort(np.concatenate(crossings)) if len(crossings) > 0 else np.zeros(0)
+        geom['lookup'] = dict([(xy, i) for i, xy in enumerate(zip(px.tolist(), py.tolist()))])
+        retval[route_id] = geom
+    # for
+    return retval
+# def stitch_tiles()
+
+# tiled_route_geometry: Compute the geometric work of conflating a set of routes, tile by tile
+#
+# Parameters: routes - dict mapping route_id to dict of route segment arrays
+#             points - dict mapping route_id to a tuple of (px, py) arrays of the points to be projected onto the route
+#             towns - prepared town polygons, or None
+#             tile_size - OPTIONAL size of a tile
+#             halo - OPTIONAL width of the halo around each tile
+#             num_workers - OPTIONAL number of worker processes (default: the number of CPUs)
+# Return value: dict mapping route_id to route geometry (see stitch_tiles)
+#
+def tiled_route_geometry(routes, points, towns, tile_size=default_tile_size, halo=default_halo, num_workers=None):
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    # end_if
+    jobs = plan_tiles(routes, points, tile_size, halo)
+    return stitch_tiles(routes, points, run_tiles(jobs, towns, num_workers))
+# def tiled_route_geometry()
+
+# projector: Return a function that projects points onto a route using its tiled route geometry
+#
+# Parameters: geom - route geometry, as returned by tiled_route_geometry
+#             segs - dict of route segment arrays
+# Return value: function of (px, py) returning the same tuple as tmc_locator.project_points; points not among those
+#               for which the route geometry was computed are projected onto the route directly
+#
+def projector(geom, segs):
+    def project(px, py):
+        px = np.asarray(px, dtype=np.float64); py = np.asarray(py, dtype=np.float64)
+        ix = np.array([geom['lookup'].get(xy, -1) for xy in zip(px.tolist(), py.tolist())], dtype=np.int64)
+        if (ix < 0).any():
+            return tmc_locator.project_points(segs, px, py)
+        # end_if
+        seg_ix = geom['seg_ix'][ix]; t = geom['t'][ix]
+        meas = segs['m0'][seg_ix] + t * (segs['m1'][seg_ix] - segs['m0'][seg_ix])
+        return meas, geom['dist'][ix], seg_ix
+    # def project()
+    return project
+# def projector()
@@ -0,0 +1,133 @@
+# tmc_locator.py - arcpy-independent replacement for the per-feature queryPointAndDistance loop
+#                  used to locate TMC events along a MassDOT LRSN route.
+#
+# The route is passed in as plain arrays of vertex X, Y and M values (one set of arrays per
+# part of the route polyline), and the TMCs as arrays of the X/Y coordinates of their first
+# and last points. All endpoints are projected onto the route in a single NumPy-vectorized
+# computation; the M-value of each projected point is interpolated along the route segment
+# on which it falls, exactly as queryPointAndDistance does for an M-aware polyline.
+#
+# The measures returned are subject to the same rules as the original code in
+# generate_tmc_events_for_expressways.py:
+#     1. A projected M-value < 0.0 is forced to 0.0 (the beginning of the route)
+#     2. A projected M-value > the M-value of the last point of the route is forced to that value
+#     3. Zero-length events are discarded
+#
+# Because nothing in this module depends upon arcpy, it can be exercised outside of ArcMap.
+#
+# 10/18/2026
+
+import numpy as np
+import segment_index
+
+# route_segments: Build the arrays of segments making up a route polyline
+#
+# Parameter: route_parts - list of (x, y, m) tuples, one per part of the route polyline;
+#                          each of x, y, and m is a sequence of vertex values
+# Return value: dict of NumPy arrays, each with one entry per segment:
+#               x0, y0, m0 - coordinates and M-value of the segment's first vertex
+#               x1, y1, m1 - coordinates and M-value of the segment's last vertex
+#               The dict also contains 'last_m', the M-value of the last point of the route.
+#
+# Note: Segments are NOT generated between the last vertex of one part and the first vertex of the next.
+#
+def route_segments(route_parts):
+    x0 = []; y0 = []; m0 = []; x1 = []; y1 = []; m1 = []
+    last_m = 0.0
+    for part in route_parts:
+        x = np.asarray(part[0], dtype=np.float64)
+        y = np.asarray(part[1], dtype=np.float64)
+        m = np.asarray(part[2], dtype=np.float64)
+        if len(x) == 0:
+            continue
+        # end_if
+        last_m = m[-1]
+        if len(x) < 2:
+            continue
+        # end_if
+        x0.append(x[:-1]); y0.append(y[:-1]); m0.append(m[:-1])
+        x1.append(x[1:]);  y1.append(y[1:]);  m1.append(m[1:])
+    # for
+    if len(x0) == 0:
+        raise ValueError("Route geometry contains no segments.")
+    # end_if
+    retval = { 'x0' : np.concatenate(x0), 'y0' : np.concatenate(y0), 'm0' : np.concatenate(m0),
+               'x1' : np.concatenate(x1), 'y1' : np.concatenate(y1), 'm1' : np.concatenate(m1),
+               'last_m' : float(last_m) }
+    return retval
+# def route_segments()
+
+# route_index: Return the spatial index over the segments of a route, building it on first use
+#
+# Parameter: segs - dict of segment arrays, as returned by route_segments
+# Return value: segment index (see segment_index.py); it is retained in segs['index']
+#
+def route_index(segs):
+    if 'index' not in segs:
+        segs['index'] = segment_index.build_segment_index(segs['x0'], segs['y0'], segs['x1'], segs['y1'])
+    # end_if
+    return segs['index']
+# def route_index()
+
+# project_points: Project a batch of points onto the nearest segment of a route
+#
+# Parameters: segs - dict of segment arrays, as returned by route_segments
+#             px, py - arrays of the X and Y coordinates of the points to be projected
+# Return value: tuple of 3 arrays, each with one entry per point:
+#               (1) M-value of the projected point
+#               (2) distance from the point to the route
+#               (3) index of the segment onto which the point was projected
+#
+# Candidate segments are found using a spatial index over the route's segments, so the cost per point
+# does not grow with the length of the route. Ties (a point equidistant from two segments) are resolved
+# in favor of the segment nearest the beginning of the route, as queryPointAndDistance does.
+#
+def project_points(segs, px, py):
+    seg_ix, dist, t = segment_index.nearest_segments(route_index(segs), px, py)
+    meas = segs['m0'][seg_ix] + t * (segs['m1'][seg_ix] - segs['m0'][seg_ix])
+    return meas, dist, seg_ix
+# def project_points()
+
+# clamp_measures: Force measures into the range [0.0, last_m]
+#
+# Parameters: meas - array of M-values
+#             last_m - M-value of the last point of the route
+# Return value: tuple of (array of clamped M-values, boolean array indicating which values were clamped)
+#
+def clamp_measures(meas, last_m):
+    meas = np.asarray(meas, dtype=np.float64)
+    clamped = np.where(meas >= 0.0, np.where(meas <= last_m, meas, last_m), 0.0)
+    return clamped, clamped != meas
+# def clamp_measures()
+
+# locate_tmcs: Locate a batch of TMCs along a route
+#
+# Parameters: segs - dict of segment arrays, as returned by route_segments
+#             from_x, from_y - arrays of the X and Y coordinates of the first point of each TMC
+#             to_x, to_y - arrays of the X and Y coordinates of the last point of each TMC
+#             project - OPTIONAL function of (px, py) used in place of project_points(segs, px, py), e.g., one that
+#                       looks up projections computed in advance, tile by tile (see tiled_processing.py)
+# Return value: dict of NumPy arrays, each with one entry per TMC:
+#               from_meas, to_meas - located (and clamped) measures of each TMC
+#               keep - True if the event is to be written out, False if it is a zero-length event
+#               clamped - True if either measure was forced to the beginning or end of the route
+#
+def locate_tmcs(segs, from_x, from_y, to_x, to_y, project=None):
+    n = len(from_x)
+    # Project the first and last points of all TMCs in one call
+    px = np.concatenate([np.asarray(from_x, dtype=np.float64), np.asarray(to_x, dtype=np.float64)])
+    py = np.concatenate([np.asarray(from_y, dtype=np.float64), np.asarray(to_y, dtype=np.float64)])
+    if project is None:
+        meas, dist, seg_ix = project_points(segs, px, py)
+    else:
+        meas, dist, seg_ix = project(px, py)
+    # end_if
+    meas, clamped = clamp_measures(meas, segs['last_m'])
+    from_meas = meas[:n]
+    to_meas = meas[n:]
+    # Do not write out zero-length events
+    keep = (from_meas >= 0.0) & (to_meas > 0.0) & (from_meas != to_meas)
+    retval = { 'from_meas' : from_meas, 'to_meas' : to_meas, 'keep' : keep,
+               'clamped' : clamped[:n] | clamped[n:] }
+    return retval
+# def locate_tmcs()
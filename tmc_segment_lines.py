@@ -0,0 +1,105 @@
+# tmc_segment_lines.py - generate the line geometry of the TMC segments of the final tables, without geoprocessing
+#
+# Each record of a final table (see process_csv_file.py) is a linear event: a TMC's (route_id, from_meas, to_meas)
+# along a MassDOT route. Rather than making a route event layer of the records with MakeRouteEventLayer_lr, this script
+# takes the geometry of the routes from the route store (see route_store.py), and:
+#     1. slices each route by the measures of its records, giving each record's polyline (route_measures.slice_events), and
+#     2. locates each record's from_meas and to_meas along its route, giving its endpoints (route_measures.locate_measures).
+# It writes one row per record to a CSV file: the tmc, route_id, from_meas, and to_meas of the record, the coordinates
+# of its endpoints, and its polyline as well-known text (a MULTILINESTRING M), which can be plotted for QA, or loaded
+# into a feature class, without arcpy.
+#
+# Note: The route store's source stamp isn't checked (doing so requires arcpy); rebuild the store after a new MassDOT
+#       data drop (see README.md). The endpoints and polyline of a record on a route not in the store are left empty.
+#
+# Usage: python tmc_segment_lines.py --final <file or dir> --route-store <dir> --out-csv <file>
+#     --final       - final CSV file (e.g., csv_final\statewide_events_final.csv) or directory of final CSV files
+#     --route-store - route store directory (e.g., route_store in the base directory)
+#     --out-csv     - CSV file to which the TMC segment lines are written
+#
+# 10/18/2026
+
+import argparse
+import csv
+import sys
+import time
+
+import cmp_metric_tables
+import process_csv_file
+import route_measures
+import route_store
+
+# Names of the fields of the output CSV file
+line_fieldnames = ['tmc', 'route_id', 'from_meas', 'to_meas', 'from_x', 'from_y', 'to_x', 'to_y', 'wkt']
+
+# geometry_wkt: Return the well-known text of an event's geometry
+#
+# Parameter: parts - list of parts, each a list of (x, y, m) tuples, as returned by route_measures.slice_route
+# Return value: string, 'MULTILINESTRING M (...)', or 'MULTILINESTRING M EMPTY' if there are no parts
+#
+def geometry_wkt(parts):
+    if len(parts) == 0:
+        return 'MULTILINESTRING M EMPTY'
+    # end_if
+    return 'MULTILINESTRING M (' + ', '.join(['(' + ', '.join(['%r %r %r' % pt for pt in part]) + ')' for part in parts]) + ')'
+# def geometry_wkt()
+
+# tmc_segment_lines: Generate the line geometry of a list of final records
+#
+# Parameters: records - list of final records (dicts), with (at least) the fields tmc, route_id, from_meas, and to_meas
+#             route_segs - dict mapping route_id to dict of route segment arrays
+# Return value: list of dicts, one per record, with the line_fieldnames; a coordinate that can't be located is None
+#
+def tmc_segment_lines(records, route_segs):
+    route_ids = [rec['route_id'] for rec in records]
+    from_meas = [rec['from_meas'] for rec in records]; to_meas = [rec['to_meas'] for rec in records]
+    geoms = route_measures.slice_events(route_segs, route_ids, from_meas, to_meas)
+    from_x, from_y = route_measures.locate_measures(route_segs, route_ids, from_meas)
+    to_x, to_y = route_measures.locate_measures(route_segs, route_ids, to_meas)
+    retval = []
+    for i, rec in enumerate(records):
+        line = { 'tmc' : rec['tmc'], 'route_id' : rec['route_id'], 'from_meas' : rec['from_meas'], 'to_meas' : rec['to_meas'],
+                 'wkt' : geometry_wkt(geoms[i]) }
+        for name, values in [('from_x', from_x), ('from_y', from_y), ('to_x', to_x), ('to_y', to_y)]:
+            line[name] = None if values[i] != values[i] else float(values[i])
+        # for
+        retval.append(line)
+    # for
+    return retval
+# def tmc_segment_lines()
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the line geometry of the TMC segments of the final tables.')
+    parser.add_argument('--final', required=True)
+    parser.add_argument('--route-store', required=True)
+    parser.add_argument('--out-csv', required=True)
+    args = parser.parse_args()
+
+    start = time.time()
+    store = route_store.open_route_store(args.route_store)
+    if store is None:
+        print('No route store in: ' + args.route_store)
+        return 1
+    # end_if
+    records = cmp_metric_tables.read_final_records(args.final)
+    route_segs = {}
+    for route_id in set([rec['route_id'] for rec in records]):
+        if route_id in store['route_index']:
+            route_segs[route_id] = route_store.route_segments(store, route_id)
+        # end_if
+    # for
+    lines = tmc_segment_lines(records, route_segs)
+    with process_csv_file.open_csv_for_writing(args.out_csv) as f:
+        w = csv.DictWriter(f, fieldnames=line_fieldnames)
+        w.writeheader()
+        w.writerows(lines)
+    # with
+    missing = len([line for line in lines if line['wkt'].endswith('EMPTY')])
+    print('Wrote ' + str(len(lines)) + ' TMC segment lines (' + str(missing) + ' without geometry) in ' +
+          str(round(time.time() - start, 1)) + ' sec: ' + args.out_csv)
+    return 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
@@ -0,0 +1,220 @@
+# tmc_vintage_delta.py - incremental re-conflation of MassDOT routes when a new vintage of the INRIX TMCs arrives
+#
+# From one vintage of the INRIX TMC network to the next, most TMCs are unchanged. Rather than re-conflating every route
+# from scratch, this script:
+#     1. Reads the old and new vintages of the TMC FC, and classifies each TMC ID as 'unchanged', 'moved' (its geometry
+#        or attributes differ; see statewide_session.tmc_geometry_hash), 'added', or 'removed'.
+#     2. For each route, reads the final CSV file produced for the old vintage, and:
+#            - carries over the final record of each of the route's TMCs that is unchanged,
+#            - locates, overlays, and aggregates only the route's TMCs that were moved or added (or were not
+#              previously conflated onto it), using the shared inputs of a statewide session (see statewide_session.py),
+#            - drops the records of TMCs that were removed, or are no longer selected for the route.
+#     3. Writes the route's new final CSV file, and a CSV file listing the classification of every TMC ID.
+# A TMC's final record depends only upon its own location along the route and the town, speed limit, and number of lanes
+# events along it, so that re-conflating a subset of a route's TMCs gives the same records as re-conflating all of them.
+# The exception is a route whose TMCs are selected by INRIX roadnum and direction (i.e., one with no TMC list file),
+# whose final table includes a record covering the parts of the route on which no TMC lies: that record depends upon
+# where all the TMCs lie, so such a route is re-conflated in full if any of its TMCs is affected.
+#
+# Note: This assumes that the LRSN routes, towns, and LRSE events are those from which the previous final CSV files were
+#       produced; if any of them has changed, re-conflate the routes in full (see statewide_session.py).
+#       The intermediate event tables of routes updated incrementally are not rewritten.
+#
+# Usage: python tmc_vintage_delta.py --old-tmc-fc <old TMC FC> [--new-tmc-fc <new TMC FC>] [--route-list-file <file>]
+#                                    [--tmc-list-dir <dir>] [--delta-file <file>] [--summary-file <file>]
+# The final CSV files in csv_final are read, and replaced by those for the new vintage.
+#
+# 10/18/2026
+
+import argparse
+import csv
+import os
+import sys
+import time
+import traceback
+
+import aggregate_tmcs
+import batch_conflate_routes
+import generate_tmc_events_for_expressways as driver
+import process_csv_file
+import run_report
+import statewide_session
+
+# Classes of TMC IDs
+delta_classes = ['unchanged', 'moved', 'added', 'removed']
+
+# classify_tmcs: Classify the TMC IDs of two vintages of the TMC network
+#
+# Parameters: old_hashes - dict mapping the TMC ID of each TMC of the old vintage to its hash
+#             new_hashes - dict mapping the TMC ID of each TMC of the new vintage to its hash
+# Return value: dict mapping each TMC ID of either vintage to its class (one of delta_classes)
+#
+def classify_tmcs(old_hashes, new_hashes):
+    retval = {}
+    for tmc_id, h in new_hashes.items():
+        if tmc_id not in old_hashes:
+            retval[tmc_id] = 'added'
+        elif old_hashes[tmc_id] != h:
+            retval[tmc_id] = 'moved'
+        else:
+            retval[tmc_id] = 'unchanged'
+        # end_if
+    # for
+    for tmc_id in old_hashes:
+        if tmc_id not in new_hashes:
+            retval[tmc_id] = 'removed'
+        # end_if
+    # for
+    return retval
+# def classify_tmcs()
+
+# tmc_hashes: Return a dict mapping the TMC ID of each of a list of TMC records (see statewide_session.read_tmcs) to its hash
+#
+def tmc_hashes(tmcs):
+    return dict([(tmc['attrs'][0], tmc['hash']) for tmc in tmcs])
+# def tmc_hashes()
+
+# read_final_csv: Read a final CSV file, as written by process_csv_file.write_csv
+#
+# Parameter: open_fn - full path of the final CSV file
+# Return value: list of dicts, one per TMC; all fields but from_meas are left as read, so that carried-over records
+#               are written out exactly as they were
+#
+def read_final_csv(open_fn):
+    with open(open_fn) as csvfile:
+        retval = [row for row in csv.DictReader(csvfile)]
+    # with
+    for row in retval:
+        row['from_meas'] = float(row['from_meas'])
+    # for
+    return retval
+# def read_final_csv()
+
+# reconflate_route_delta: Re-conflate the affected TMCs of one route
+#
+# Parameters: session - statewide session for the new vintage of the TMCs
+#             MassDOT_route_id - MassDOT route_id
+#             TMC_list_file - full path of file containing the list of TMCs to be conflated onto the route, or ''
+#             classes - dict mapping TMC ID to class, as returned by classify_tmcs
+#             previous_final_csv - full path of the route's final CSV file for the old vintage of the TMCs
+# Return value: dict of counts of the route's TMCs: 'carried_over', 'reconflated', 'dropped',
+#               and 'full' (1 if the route was re-conflated in full, otherwise 0)
+#
+def reconflate_route_delta(session, MassDOT_route_id, TMC_list_file, classes, previous_final_csv):
+    retval = { 'carried_over' : 0, 'reconflated' : 0, 'dropped' : 0, 'full' : 0 }
+    if MassDOT_route_id not in session['routes']:
+        raise ValueError("Route " + MassDOT_route_id + " not found in LRSN routes.")
+    # end_if
+    selected = [session['tmcs'][i] for i in statewide_session.select_tmcs(session, MassDOT_route_id, TMC_list_file)]
+    previous = read_final_csv(previous_final_csv) if os.path.isfile(previous_final_csv) else None
+    previous_by_tmc = dict([(rec['tmc'], rec) for rec in previous or [] if rec['tmc']])
+
+    affected = [tmc for tmc in selected
+                if classes.get(tmc['attrs'][0]) != 'unchanged' or tmc['attrs'][0] not in previous_by_tmc]
+    selected_ids = set([tmc['attrs'][0] for tmc in selected])
+    retval['dropped'] = len([tmc_id for tmc_id in previous_by_tmc if tmc_id not in selected_ids])
+
+    # See the note at the top of this file about routes without a TMC list file
+    if previous is None or (not TMC_list_file and (len(affected) > 0 or retval['dropped'] > 0)):
+        statewide_session.conflate_route_in_session(session, MassDOT_route_id, TMC_list_file, [], False)
+        retval['full'] = 1
+        retval['reconflated'] = len(selected)
+        return retval
+    # end_if
+
+    rpt = run_report.new_run_report(MassDOT_route_id + ' (TMC vintage delta)')
+    output_records = [rec for rec in previous if not rec['tmc']] if not TMC_list_file else []
+    for tmc in selected:
+        if tmc['attrs'][0] in previous_by_tmc and classes.get(tmc['attrs'][0]) == 'unchanged':
+            output_records.append(previous_by_tmc[tmc['attrs'][0]])
+        # end_if
+    # for
+    retval['carried_over'] = len(output_records)
+    if len(affected) > 0:
+        output_events = statewide_session.generate_route_events(session, MassDOT_route_id, affected, True, rpt)
+        with run_report.timed_stage(rpt, 'post_processing', len(output_events)) as st:
+            records, problems = aggregate_tmcs.aggregate_by_tmc(aggregate_tmcs.records_to_columns(output_events),
+                                                                process_csv_file.report)
+            st['rows_out'] = len(records)
+        # with
+        rpt['details']['problem_tmcs'] = problems
+        run_report.count(rpt, 'problem_tmcs', len(set(problems)))
+        output_records.extend(records)
+        retval['reconflated'] = len(records)
+    # end_if
+    # Stable sort, as in process_csv_file.main_routine
+    output_records = sorted(output_records, key=lambda x : x['from_meas'])
+    process_csv_file.write_csv(os.path.dirname(previous_final_csv), os.path.basename(previous_final_csv), output_records)
+    for name in ['carried_over', 'reconflated', 'dropped']:
+        run_report.count(rpt, name + '_tmcs', retval[name])
+    # for
+    if driver.run_report_dir:
+        run_report.write_run_report(rpt, driver.run_report_dir)
+    # end_if
+    return retval
+# def reconflate_route_delta()
+
+# write_delta_file: Write the classification of every TMC ID to a CSV file
+#
+def write_delta_file(classes, delta_file):
+    with process_csv_file.open_csv_for_writing(delta_file) as f:
+        w = csv.writer(f)
+        w.writerow(['tmc', 'class'])
+        for tmc_id in sorted(classes.keys()):
+            w.writerow([tmc_id, classes[tmc_id]])
+        # for
+    # with
+# def write_delta_file()
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-conflate only the TMCs changed by a new vintage of the INRIX TMCs.')
+    parser.add_argument('--old-tmc-fc', required=True)
+    parser.add_argument('--new-tmc-fc', default=driver.INRIX_MASSACHUSETTS_TMC_2019)
+    parser.add_argument('--route-list-file', default='')
+    parser.add_argument('--tmc-list-dir', default='')
+    parser.add_argument('--delta-file', default=os.path.join(driver.base_dir, 'tmc_vintage_delta.csv'))
+    parser.add_argument('--summary-file', default=os.path.join(driver.base_dir, 'delta_summary.csv'))
+    args = parser.parse_args()
+
+    start = time.time()
+    print('Reading old TMCs from: ' + args.old_tmc_fc)
+    old_tmcs = statewide_session.read_tmcs(args.old_tmc_fc, True)
+    print('Reading new TMCs from: ' + args.new_tmc_fc)
+    new_tmcs = statewide_session.read_tmcs(args.new_tmc_fc, True)
+    classes = classify_tmcs(tmc_hashes(old_tmcs), tmc_hashes(new_tmcs))
+    write_delta_file(classes, args.delta_file)
+    for cls in delta_classes:
+        print('    ' + cls + ': ' + str(len([c for c in classes.values() if c == cls])))
+    # for
+
+    tasks = batch_conflate_routes.get_batch_tasks(args.route_list_file, args.tmc_list_dir)
+    session = statewide_session.load_session([route_id for route_id, tmc_list_file in tasks], tmcs=new_tmcs)
+    summary = []
+    for route_id, tmc_list_file in tasks:
+        base_table_name = route_id.lower().replace(' ','_')
+        previous_final_csv = driver.base_dir + "\\csv_final\\" + base_table_name + "_events_final.csv"
+        rec = { 'route_id' : route_id, 'tmc_list_file' : tmc_list_file, 'status' : 'failure',
+                'elapsed_sec' : 0.0, 'output_csv' : previous_final_csv, 'message' : '' }
+        route_start = time.time()
+        try:
+            counts = reconflate_route_delta(session, route_id, tmc_list_file, classes, previous_final_csv)
+            rec['status'] = 'success'
+            rec['message'] = ', '.join([name + '=' + str(counts[name]) for name in ['carried_over', 'reconflated', 'dropped', 'full']])
+        except BaseException:
+            # Note: BaseException rather than Exception, since get_inrix_attrs calls exit() for unsupported routes
+            rec['message'] = traceback.format_exc().strip().split('\n')[-1]
+        # try/except
+        rec['elapsed_sec'] = round(time.time() - route_start, 3)
+        summary.append(rec)
+        print('    ' + route_id + ': ' + rec['status'] + ' (' + str(rec['elapsed_sec']) + ' sec) ' + rec['message'])
+    # for
+    batch_conflate_routes.write_summary(summary, args.summary_file)
+    failures = [rec for rec in summary if rec['status'] != 'success']
+    print('Finished in ' + str(round(time.time() - start, 1)) + ' sec: ' + str(len(summary) - len(failures)) + ' succeeded, ' +
+          str(len(failures)) + ' failed.')
+    return 1 if failures else 0
+# def main()
+
+if __name__ == '__main__':
+    sys.exit(main())
+# end_if
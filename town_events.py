@@ -0,0 +1,242 @@
+# town_events.py - generate town events along a route by intersecting it with the town boundary polygons
+#
+# This replaces locating the statewide towns_pb_r polygon layer along each route with
+# arcpy.LocateFeaturesAlongRoutes_lr. The town polygons are "prepared" once - their boundaries are broken
+# into edges, which are indexed by a uniform grid (see segment_index.py), and the polygons' bounding boxes
+# are indexed by a second grid - and the prepared polygons are then used for every route:
+#     1. The measures at which the route crosses a town boundary are computed directly, by intersecting
+#        the route's segments with the boundary edges near them.
+#     2. The route is cut at these crossings (and at the ends of each of its parts) into pieces;
+#        the town containing each piece is found by testing a point in the middle of the piece against
+#        the polygons whose bounding box contains it, counting the crossings of a ray from the point with
+#        the polygon's edges, which are found with the edge index.
+#     3. Adjacent pieces in the same town are merged into a single (from_meas, to_meas, town_id) event.
+# As with LocateFeaturesAlongRoutes_lr (with the "NO_ZERO" option), no zero-length events are generated,
+# and no event is generated for any piece of the route lying outside all the town polygons.
+#
+# 10/18/2026
+
+import numpy as np
+
+import segment_index
+
+# prepare_town_polygons: Prepare town polygons for locating along routes
+#
+# Parameter: polygons - list of dicts, one per town polygon, with the fields:
+#                       town_id, town - MassGIS TOWN_ID and town name
+#                       rings - list of rings (outer boundaries and holes), each a list of (x, y) tuples
+# Return value: dict containing:
+#               town_id, town - list of the town_id and town name of each polygon
+#               min_x, min_y, max_x, max_y - arrays of the bounding box of each polygon
+#               edge_start - offsets of the edges of each polygon in the edge arrays (length: number of polygons + 1)
+#               x0, y0, x1, y1 - arrays of edge endpoint coordinates
+#               edge_poly - array of the index of the polygon of each edge
+#               edge_index - segment index over the edges, or None if there are no edges
+#               bbox_polys - array of the indices of the polygons with at least one edge
+#               bbox_index - segment index over the bounding boxes of the bbox_polys, each box being indexed as the
+#                            segment from its lower left to its upper right corner, or None if there are no edges
+#
+def prepare_town_polygons(polygons):
+    x0 = []; y0 = []; x1 = []; y1 = []
+    edge_start = [0]
+    min_x = []; min_y = []; max_x = []; max_y = []
+    for poly in polygons:
+        num_edges = 0
+        lo_x = np.inf; lo_y = np.inf; hi_x = -np.inf; hi_y = -np.inf
+        for ring in poly['rings']:
+            if len(ring) < 3:
+                continue
+            # end_if
+            rx = np.array([pt[0] for pt in ring], dtype=np.float64)
+            ry = np.array([pt[1] for pt in ring], dtype=np.float64)
+            if rx[0] != rx[-1] or ry[0] != ry[-1]:
+                # Close the ring
+                rx = np.append(rx, rx[0]); ry = np.append(ry, ry[0])
+            # end_if
+            x0.append(rx[:-1]); y0.append(ry[:-1]); x1.append(rx[1:]); y1.append(ry[1:])
+            num_edges += len(rx) - 1
+            lo_x = min(lo_x, rx.min()); lo_y = min(lo_y, ry.min()); hi_x = max(hi_x, rx.max()); hi_y = max(hi_y, ry.max())
+        # for
+        # (A polygon with no usable ring has an empty bounding box, and thus contains nothing)
+        min_x.append(lo_x); min_y.append(lo_y); max_x.append(hi_x); max_y.append(hi_y)
+        edge_start.append(edge_start[-1] + num_edges)
+    # for
+    if len(x0) == 0:
+        x0 = [np.empty(0)]; y0 = [np.empty(0)]; x1 = [np.empty(0)]; y1 = [np.empty(0)]
+    # end_if
+    x0 = np.concatenate(x0); y0 = np.concatenate(y0); x1 = np.concatenate(x1); y1 = np.concatenate(y1)
+    edge_start = np.array(edge_start, dtype=np.int64)
+    min_x = np.array(min_x, dtype=np.float64); min_y = np.array(min_y, dtype=np.float64)
+    max_x = np.array(max_x, dtype=np.float64); max_y = np.array(max_y, dtype=np.float64)
+    bbox_polys = np.nonzero(np.diff(edge_start) > 0)[0]
+    retval = { 'town_id' : [int(poly['town_id']) for poly in polygons], 'town' : [poly['town'] for poly in polygons],
+               'min_x' : min_x, 'min_y' : min_y, 'max_x' : max_x, 'max_y' : max_y,
+               'edge_start' : edge_start, 'x0' : x0, 'y0' : y0, 'x1' : x1, 'y1' : y1,
+               'edge_poly' : np.repeat(np.arange(len(polygons), dtype=np.int64), np.diff(edge_start)),
+               'edge_index' : None, 'bbox_polys' : bbox_polys, 'bbox_index' : None }
+    if len(x0) > 0:
+        retval['edge_index'] = segment_index.build_segment_index(x0, y0, x1, y1)
+        retval['bbox_index'] = segment_index.build_segment_index(min_x[bbox_polys], min_y[bbox_polys],
+                                                                 max_x[bbox_polys], max_y[bbox_polys])
+    # end_if
+    return retval
+# def prepare_town_polygons()
+
+# containing_polygons: Find the polygon containing each of a batch of points
+#
+# Parameters: prepared - prepared town polygons, as returned by prepare_town_polygons
+#             px, py - arrays of point coordinates
+# Return value: array of the index (in the list of polygons) of the polygon containing each point, or -1 if there is none
+#
+# Containment is tested by the even-odd rule, so holes are handled correctly: the candidate polygons of each point are
+# those whose bounding box contains it (found with the bounding box index), and for each candidate, the edges crossed
+# by a ray from the point to the right edge of the bounding box are counted (the edges being found with the edge index).
+# A point lying in more than one polygon (which shouldn't happen with a proper set of town boundaries) is assigned to
+# the first of them.
+#
+def containing_polygons(prepared, px, py):
+    px = np.asarray(px, dtype=np.float64); py = np.asarray(py, dtype=np.float64)
+    retval = np.full(len(px), -1, dtype=np.int64)
+    if prepared['bbox_index'] is None or len(px) == 0:
+        return retval
+    # end_if
+    # Candidate (point, polygon) pairs
+    pt, box = segment_index.segments_in_boxes(prepared['bbox_index'], px, py, px, py)
+    poly = prepared['bbox_polys'][box]
+    inside = (prepared['min_x'][poly] <= px[pt]) & (px[pt] <= prepared['max_x'][poly]) & \
+             (prepared['min_y'][poly] <= py[pt]) & (py[pt] <= prepared['max_y'][poly])
+    pt = pt[inside]; poly = poly[inside]
+    if len(pt) == 0:
+        return retval
+    # end_if
+    # Edges of each candidate polygon near the ray from the point to the right edge of the polygon's bounding box
+    pair, edge = segment_index.segments_in_boxes(prepared['edge_index'], px[pt], py[pt], prepared['max_x'][poly], py[pt])
+    own = prepared['edge_poly'][edge] == poly[pair]
+    pair = pair[own]; edge = edge[own]
+    x = px[pt][pair]; y = py[pt][pair]
+    ex0 = prepared['x0'][edge]; ey0 = prepared['y0'][edge]
+    ex1 = prepared['x1'][edge]; ey1 = prepared['y1'][edge]
+    # Edges straddling the horizontal line through the point, and where they cross it
+    straddle = (ey0 > y) != (ey1 > y)
+    safe = np.where(straddle, ey1 - ey0, 1.0)
+    x_cross = ex0 + (y - ey0) * (ex1 - ex0) / safe
+    crossed = straddle & (x_cross > x)
+    odd = np.bincount(pair[crossed], minlength=len(pt)) % 2 == 1
+    # The pairs are sorted on point and polygon, so the first pair of each point is that of its first containing polygon
+    first_pt, first = np.unique(pt[odd], return_index=True)
+    retval[first_pt] = poly[odd][first]
+    return retval
+# def containing_polygons()
+
+# boundary_crossings: Find the points at which a route crosses the edges of the town polygons
+#
+# Parameters: prepared - prepared town polygons
+#             segs - dict of route segment arrays, as returned by tmc_locator.route_segments
+#             seg_ids - OPTIONAL array of the index of each of the segments in segs among the segments of the whole route,
+#                       when segs holds only some of them (see tiled_processing.py)
+# Return value: array of crossing positions, where the position of a point at parameter t along route segment i is i + t
+#
+def boundary_crossings(prepared, segs, seg_ids=None):
+    if prepared['edge_index'] is None:
+        return np.empty(0, dtype=np.float64)
+    # end_if
+    rx0 = segs['x0']; ry0 = segs['y0']; rx1 = segs['x1']; ry1 = segs['y1']
+    seg, edge = segment_index.segments_in_boxes(prepared['edge_index'], np.minimum(rx0, rx1), np.minimum(ry0, ry1),
+                                                np.maximum(rx0, rx1), np.maximum(ry0, ry1))
+    # Intersect route segment P0 + t * r with edge Q0 + u * s
+    r_x = rx1[seg] - rx0[seg]; r_y = ry1[seg] - ry0[seg]
+    qx0 = prepared['x0'][edge]; qy0 = prepared['y0'][edge]
+    s_x = prepared['x1'][edge] - qx0; s_y = prepared['y1'][edge] - qy0
+    denom = r_x * s_y - r_y * s_x
+    d_x = qx0 - rx0[seg]; d_y = qy0 - ry0[seg]
+    ok = denom != 0.0
+    safe = np.where(ok, denom, 1.0)
+    t = (d_x * s_y - d_y * s_x) / safe
+    u = (d_x * r_y - d_y * r_x) / safe
+    ok &= (t >= 0.0) & (t <= 1.0) & (u >= 0.0) & (u <= 1.0)
+    if seg_ids is not None:
+        return np.asarray(seg_ids, dtype=np.int64)[seg[ok]] + t[ok]
+    # end_if
+    return seg[ok] + t[ok]
+# def boundary_crossings()
+
+# _position_point: Return the coordinates and measures of points given by their positions along a route
+#
+# Parameters: segs - dict of route segment arrays
+#             pos - array of positions (see boundary_crossings)
+#             at_end - True if each position is the END of a piece of the route (so that a position falling exactly
+#                      on a vertex is taken to be the end of the preceding segment), False if it is the start
+# Return value: tuple of (x, y, m) arrays
+#
+def _position_point(segs, pos, at_end):
+    n = len(segs['x0'])
+    if at_end:
+        i = np.clip(np.ceil(pos).astype(np.int64) - 1, 0, n - 1)
+    else:
+        i = np.clip(np.floor(pos).astype(np.int64), 0, n - 1)
+    # end_if
+    t = pos - i
+    x = segs['x0'][i] + t * (segs['x1'][i] - segs['x0'][i])
+    y = segs['y0'][i] + t * (segs['y1'][i] - segs['y0'][i])
+    m = segs['m0'][i] + t * (segs['m1'][i] - segs['m0'][i])
+    return x, y, m
+# def _position_point()
+
+# locate_towns: Generate the town events along a route
+#
+# Parameters: prepared - prepared town polygons, as returned by prepare_town_polygons
+#             segs - dict of route segment arrays, as returned by tmc_locator.route_segments
+#             route_id - route_id of the route
+#             tolerance - OPTIONAL minimum distance, in measure units, between two cuts of the route (default: 1.0e-8)
+#             crossings - OPTIONAL array of the route's boundary crossings, if already computed (see boundary_crossings)
+# Return value: list of dicts, with the fields route_id, from_meas, to_meas, town, and town_id,
+#               sorted in ascending order on from_meas
+#
+def locate_towns(prepared, segs, route_id, tolerance=1.0e-8, crossings=None):
+    n = len(segs['x0'])
+    # The route is cut at its ends, at the ends of each of its parts (i.e., wherever a segment does not begin
+    # where the preceding one ends), and wherever it crosses a town boundary
+    part_breaks = np.nonzero((segs['x1'][:-1] != segs['x0'][1:]) | (segs['y1'][:-1] != segs['y0'][1:]))[0] + 1
+    if crossings is None:
+        crossings = boundary_crossings(prepared, segs)
+    # end_if
+    pos = np.unique(np.concatenate([[0.0, float(n)], part_breaks.astype(np.float64), crossings]))
+    # Cuts closer together than the tolerance (e.g., where the route passes through a vertex shared by several
+    # town boundaries, or grazes a corner of a town) are treated as one, as LocateFeaturesAlongRoutes_lr would
+    # treat them, so that slivers a fraction of a millimeter long don't split a town event in two
+    pos_m = _position_point(segs, pos, False)[2]
+    keep = [0]
+    for k in range(1, len(pos) - 1):
+        if abs(pos_m[k] - pos_m[keep[-1]]) > tolerance:
+            keep.append(k)
+        # end_if
+    # for
+    if len(keep) > 1 and abs(pos_m[-1] - pos_m[keep[-1]]) <= tolerance:
+        keep.pop()
+    # end_if
+    keep.append(len(pos) - 1)
+    pos = pos[keep]
+    start = pos[:-1]; end = pos[1:]
+
+    mid_x, mid_y, mid_m = _position_point(segs, (start + end) / 2.0, False)
+    poly = containing_polygons(prepared, mid_x, mid_y)
+    sx, sy, from_meas = _position_point(segs, start, False)
+    ex, ey, to_meas = _position_point(segs, end, True)
+
+    pieces = []
+    for k in np.nonzero(poly >= 0)[0].tolist():
+        lo = float(min(from_meas[k], to_meas[k])); hi = float(max(from_meas[k], to_meas[k]))
+        pieces.append((lo, hi, int(poly[k])))
+    # for
+    pieces.sort()
+    retval = []
+    for lo, hi, p in pieces:
+        town_id = prepared['town_id'][p]
+        if len(retval) > 0 and retval[-1]['town_id'] == town_id and retval[-1]['to_meas'] == lo:
+            retval[-1]['to_meas'] = hi
+        else:
+            retval.append({ 'route_id' : route_id, 'from_meas' : lo, 'to_meas' : hi, 'town' : prepared['town'][p], 'town_id' : town_id })
+        # end_if
+    # for
+    return [ev for ev in retval if ev['from_meas'] != ev['to_meas']]
+# def locate_towns()